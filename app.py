@@ -1,12 +1,27 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, g, has_request_context, render_template, request, jsonify
 from openai import OpenAI
 import sqlite3
+import hashlib
 import json
 import os
+import time
+from contextlib import contextmanager
 from dotenv import load_dotenv
 from werkzeug.middleware.proxy_fix import ProxyFix
 from create_db import create_and_load_database
-from logging_config import setup_logging
+from logging_config import log_rows, setup_logging
+from schema_cache import SchemaCache
+from query_cache import QueryCache
+from intent_templates import match_template
+from prompts import sql_system_message
+from pagination import NotPageable, PageTokenError, decode_token, encode_token, fetch_page
+from db_pool import ReadOnlyConnectionPool
+from query_log import QueryLog
+from name_search import rewrite_substring_search
+from metrics import Metrics
+from tracing import Trace, TraceExporter
+from query_guard import (QUERY_MAX_ROWS, QUERY_TIMEOUT_MS, QueryRejected, check_plan, fetch_limited,
+                         is_interrupted, start_budget, time_budget)
 
 # Load environment variables
 load_dotenv()
@@ -21,8 +36,13 @@ app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_prefix=1)
 app.config['ENV'] = 'production'
 app.config['DEBUG'] = False
 
-# Configure OpenAI
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+# Configure OpenAI. Bound the request time so a slow API response fails the
+# query instead of holding the worker until gunicorn's 120 s timeout
+client = OpenAI(
+    api_key=os.getenv('OPENAI_API_KEY'),
+    timeout=float(os.getenv('OPENAI_TIMEOUT', '30')),
+    max_retries=int(os.getenv('OPENAI_MAX_RETRIES', '2'))
+)
 
 # Set paths based on environment
 if os.environ.get('RENDER'):
@@ -48,8 +68,15 @@ if os.environ.get('RENDER'):
 else:
     excel_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hardware_data.xlsx')
 
+# Executed SQL with timings and plans, and the index advice drawn from it
+QUERY_LOG_PATH = os.getenv('QUERY_LOG_PATH', os.path.join(os.path.dirname(os.path.abspath(DATABASE_PATH)), 'query_log.db'))
+query_log = QueryLog(QUERY_LOG_PATH)
+# Build the indexes proposed by the advisor into the next database
+QUERY_ADVISOR_AUTO_CREATE = os.getenv('QUERY_ADVISOR_AUTO_CREATE', 'false').lower() in ('1', 'true', 'yes')
+
 logger.info(f"Initializing database from {excel_path}")
-success = create_and_load_database(excel_path, DATABASE_PATH)
+success = create_and_load_database(excel_path, DATABASE_PATH,
+                                   extra_indexes=query_log.advised_indexes() if QUERY_ADVISOR_AUTO_CREATE else None)
 if success:
     logger.info("Database initialized successfully")
     # Print all tables in the database
@@ -61,41 +88,128 @@ if success:
 else:
     logger.error("Failed to initialize database")
 
+# Schema and prompt context, rebuilt only when hardware.db changes
+schema_cache = SchemaCache(DATABASE_PATH)
+
+# Read-only connections reused across requests, reopened when hardware.db is swapped
+db_pool = ReadOnlyConnectionPool(DATABASE_PATH, row_factory=sqlite3.Row)
+
+# Time the sample queries of advised indexes that this build created
+if success and QUERY_ADVISOR_AUTO_CREATE:
+    try:
+        with db_pool.connection() as conn:
+            query_log.record_created(conn)
+    except sqlite3.Error as e:
+        logger.warning(f"Could not measure advised indexes: {str(e)}")
+
+# Question -> SQL cache shared by all workers, kept next to hardware.db
+QUERY_CACHE_PATH = os.getenv('QUERY_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(DATABASE_PATH)), 'query_cache.db'))
+query_cache = QueryCache(QUERY_CACHE_PATH)
+
+# Per-stage latency histograms and counters, added up across workers for /metrics
+METRICS_PATH = os.getenv('METRICS_PATH', os.path.join(os.path.dirname(os.path.abspath(DATABASE_PATH)), 'metrics.db'))
+metrics = Metrics(METRICS_PATH)
+# One JSON line per /query request with its spans, in logs/traces.jsonl
+tracer = TraceExporter()
+
+# Rows fetched per fetchmany() call when streaming results
+STREAM_CHUNK_SIZE = int(os.getenv('STREAM_CHUNK_SIZE', '500'))
+
+# Rows per page of JSON results; clients may ask for up to QUERY_MAX_PAGE_SIZE
+QUERY_PAGE_SIZE = int(os.getenv('QUERY_PAGE_SIZE', '100'))
+QUERY_MAX_PAGE_SIZE = int(os.getenv('QUERY_MAX_PAGE_SIZE', '1000'))
+# Continuation tokens are signed so clients cannot make the server run SQL
+# of their choosing; the key must be the same in every worker
+PAGE_TOKEN_SECRET = (os.getenv('SECRET_KEY') or
+                     hashlib.sha256(('page-token:' + os.getenv('OPENAI_API_KEY')).encode()).hexdigest()).encode()
+
 def get_db_connection():
-    """Get a connection to the database"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Get a pooled read-only connection to the database; hand it back with release_db_connection()"""
+    return db_pool.acquire()
+
+def release_db_connection(conn):
+    db_pool.release(conn)
 
 def get_table_schema():
     """Get the schema of all tables in the database"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    schema = {}
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
-    tables = cursor.fetchall()
-    
-    for table in tables:
-        table_name = table[0]
-        cursor.execute(f"PRAGMA table_info({table_name});")
-        columns = cursor.fetchall()
-        schema[table_name] = [col[1] for col in columns]
-    
-    conn.close()
-    return schema
+    return schema_cache.get()["schema"]
+
+def resolve_sql(user_query, context, generate):
+    """Find the SQL for a question: local template, then cache, then the model"""
+    template = match_template(user_query, context["schema"])
+    if template:
+        logger.info(f"Template '{template['name']}' matched: {template['sql']} {template['params']}")
+        metrics.inc('query_template_hits_total')
+        return {"sql": template["sql"], "params": template["params"], "source": "template"}
+
+    cached = query_cache.find(user_query, context["fingerprint"])
+    if cached:
+        logger.info(f"Query cache {cached['match']} hit: {cached['sql']}")
+        metrics.inc('query_cache_hits_total', match=cached["match"])
+        return {"sql": use_name_search(cached["sql"], context), "params": (), "source": cached["match"]}
+
+    metrics.inc('query_cache_misses_total')
+    return {"sql": use_name_search(generate(), context), "params": (), "source": "llm"}
+
+def use_name_search(sql_query, context):
+    """Point LIKE '%name%' predicates at the trigram name index"""
+    rewritten = rewrite_substring_search(sql_query, context["name_search"], context["schema"])
+    if rewritten != sql_query:
+        logger.info(f"Substring name search rewritten to use the trigram index: {rewritten}")
+    return rewritten
+
+def current_trace():
+    """The trace of the request being handled, if any"""
+    return g.get('trace') if has_request_context() else None
+
+@contextmanager
+def stage(name, **attrs):
+    """Time a stage of answering a question, for /metrics and the request's trace"""
+    trace = current_trace()
+    with metrics.timer('query_stage_seconds', stage=name):
+        if trace is None:
+            yield attrs
+        else:
+            with trace.span(name, **attrs) as span:
+                yield span
+
+def chat_completion(messages):
+    """Ask the model, timing the call and counting failures"""
+    try:
+        with stage('llm', model="gpt-3.5-turbo") as span:
+            response = client.chat.completions.create(model="gpt-3.5-turbo", messages=messages, temperature=0)
+            usage = getattr(response, 'usage', None)
+            if usage is not None:
+                span.update(prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens,
+                            total_tokens=usage.total_tokens)
+            return response
+    except Exception:
+        metrics.inc('llm_errors_total')
+        raise
+
+def count_sqlite_error(error):
+    """Count a sqlite3 error, telling time budget interruptions apart"""
+    metrics.inc('sqlite_errors_total', reason='timeout' if is_interrupted(error) else 'error')
+
+def json_response(body):
+    """jsonify() a response body, timing the serialization"""
+    with stage('serialize'):
+        return jsonify(body)
+
+def remember_sql(user_query, context, resolved):
+    """Cache SQL that had to be generated or adapted, once it ran successfully"""
+    if resolved["source"] in ("llm", "fuzzy"):
+        query_cache.put(user_query, context["fingerprint"], resolved["sql"])
 
 def process_natural_language_query(query):
     """Process natural language query using GPT and convert to SQL"""
     try:
-        schema = get_table_schema()
+        with stage('schema'):
+            context = schema_cache.get()
+        schema_context = context["schema_text"]
         
-        schema_context = "Database tables and their columns:\n"
-        for table_name, columns in schema.items():
-            schema_context += f"\nTable '{table_name}':\n"
-            schema_context += "Columns: " + ", ".join(columns) + "\n"
-        
-        prompt = f"""Given this database schema:
+        with stage('prompt'):
+            prompt = f"""Given this database schema:
 {schema_context}
 
 Convert this natural language query to SQL:
@@ -128,40 +242,55 @@ Important notes:
     WHERE c.Hardware LIKE 'Unit 5%'
     ORDER BY c.Channel;"""
 
-        # Make the API call
-        try:
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are a SQL expert. Generate only SQL queries without any explanations or comments."},
-                    {"role": "user", "content": prompt},
-                    {"role": "user", "content": query}
-                ],
-                temperature=0
-            )
+        def ask_model():
+            response = chat_completion([
+                {"role": "system", "content": "You are a SQL expert. Generate only SQL queries without any explanations or comments."},
+                {"role": "user", "content": prompt},
+                {"role": "user", "content": query}
+            ])
             sql_query = response.choices[0].message.content.strip()
             logger.info(f"Generated SQL query: {sql_query}")  # Debug print
+            return sql_query
+
+        # Make the API call unless a template or the cache answers the question
+        try:
+            resolved = resolve_sql(query, context, ask_model)
+            sql_query = resolved["sql"]
             
-            # Execute the query
+            # Execute the query within the time budget and row cap
             conn = get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute(sql_query)
-            columns = [description[0] for description in cursor.description]
-            results = cursor.fetchall()
-            conn.close()
+            try:
+                with stage('plan'):
+                    check_plan(conn, sql_query, resolved["params"], context["row_counts"])
+                with stage('execute') as span, time_budget(conn):
+                    cursor = conn.cursor()
+                    cursor.execute(sql_query, resolved["params"])
+                    columns = [description[0] for description in cursor.description]
+                    results, truncated = fetch_limited(cursor)
+                    span.update(rows=len(results), **truncation_flags(truncated))
+            finally:
+                release_db_connection(conn)
+            remember_sql(query, context, resolved)
             
             # Format results
-            formatted_results = []
-            for row in results:
-                formatted_results.append(dict(zip(columns, row)))
+            with stage('format'):
+                formatted_results = []
+                for row in results:
+                    formatted_results.append(dict(zip(columns, row)))
                 
             return {
                 "status": "success",
                 "query": sql_query,
-                "results": formatted_results
+                "results": formatted_results,
+                **truncation_flags(truncated)
             }
             
+        except QueryRejected as e:
+            logger.warning(str(e))
+            metrics.inc('query_rejected_total')
+            return {"status": "error", "message": str(e)}
         except sqlite3.Error as e:
+            count_sqlite_error(e)
             logger.error(f"Database error: {str(e)}")
             return {"status": "error", "message": f"Database error: {str(e)}"}
         except Exception as e:
@@ -172,94 +301,302 @@ Important notes:
         logger.error(f"Query processing error: {str(e)}")
         return {"status": "error", "message": f"Query processing error: {str(e)}"}
 
+def generate_sql(user_query, schema_context):
+    """Ask the model to translate a question into SQL for the given schema"""
+    # Create the system message with schema context
+    with stage('prompt'):
+        system_message = sql_system_message(schema_context)
+
+    logger.info("\nGenerating SQL query...")
+    completion = chat_completion([
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": user_query}
+    ])
+
+    sql_query = completion.choices[0].message.content.strip()
+    logger.info(f"Generated SQL: {sql_query}")
+    return sql_query
+
+def stream_results(conn, cursor, sql_query, params=(), started=None, source=None, trace=None, version=None,
+                   on_complete=None):
+    """Yield query results as NDJSON: a header line, one line per row, a trailer line.
+
+    ``on_complete`` runs once every row has been read without error. The
+    connection is released by close_stream() when the response is closed.
+    """
+    try:
+        columns = [col[0] for col in cursor.description] if cursor.description else []
+        yield json.dumps({"query": sql_query, "columns": columns}) + "\n"
+        row_count = 0
+        truncated = None
+        # Fetching and encoding interleave, so their times are summed per request
+        fetch_seconds = encode_seconds = 0.0
+        stream_started = time.perf_counter()
+        while True:
+            fetch_started = time.perf_counter()
+            try:
+                rows = cursor.fetchmany(STREAM_CHUNK_SIZE)
+            except sqlite3.OperationalError as e:
+                if not is_interrupted(e):
+                    raise
+                truncated = 'timeout'
+                break
+            finally:
+                fetch_seconds += time.perf_counter() - fetch_started
+            if not rows:
+                break
+            if row_count + len(rows) > QUERY_MAX_ROWS:
+                rows = rows[:QUERY_MAX_ROWS - row_count]
+                truncated = 'max_rows'
+            row_count += len(rows)
+            if rows:
+                encode_started = time.perf_counter()
+                chunk = "".join(json.dumps(dict(zip(columns, row))) + "\n" for row in rows)
+                encode_seconds += time.perf_counter() - encode_started
+                yield chunk
+            if truncated:
+                break
+        metrics.observe('query_stage_seconds', fetch_seconds, stage='execute')
+        metrics.observe('query_stage_seconds', encode_seconds, stage='serialize')
+        if trace is not None:
+            trace.add('fetch', fetch_seconds, stream_started, rows=row_count, **truncation_flags(truncated))
+            trace.add('serialize', encode_seconds, stream_started)
+        logger.info(f"Streamed {row_count} results{f' (truncated: {truncated})' if truncated else ''}")
+        conn.set_progress_handler(None, 0)
+        if started is not None:
+            query_log.record(conn, sql_query, params, (time.perf_counter() - started) * 1000, row_count, source,
+                             version)
+        if on_complete is not None:
+            on_complete()
+        yield json.dumps({"done": True, "row_count": row_count, **truncation_flags(truncated)}) + "\n"
+    except sqlite3.Error as e:
+        count_sqlite_error(e)
+        error_msg = f"Database error: {str(e)}"
+        logger.error(error_msg, exc_info=True)
+        if trace is not None:
+            trace.set(error=error_msg)
+        yield json.dumps({"error": error_msg}) + "\n"
+
+def close_stream(conn, cursor, trace=None):
+    """Hand back what a streamed response holds.
+
+    Registered with call_on_close(), so it also runs when the client went
+    away before the generator was started.
+    """
+    cursor.close()
+    release_db_connection(conn)
+    # The request returned before the rows were sent; the trace ends here
+    if trace is not None:
+        tracer.export(trace)
+
+def truncation_flags(reason):
+    """Response fields telling the client whether rows were cut off, and why"""
+    if reason is None:
+        return {"truncated": False}
+    return {"truncated": True, "truncated_reason": reason}
+
+def page_size_requested():
+    """Page size asked for by the client, clamped to QUERY_MAX_PAGE_SIZE"""
+    try:
+        page_size = int(request.json.get('page_size') or QUERY_PAGE_SIZE)
+    except (TypeError, ValueError):
+        page_size = QUERY_PAGE_SIZE
+    return max(1, min(page_size, QUERY_MAX_PAGE_SIZE))
+
+def page_response(conn, sql_query, params, context, page_size, after=None, seen=0):
+    """Run one page of a query and return the JSON body with the next page's token"""
+    with stage('execute') as span:
+        columns, rows, state, truncated = fetch_page(conn, sql_query, params, page_size, after, seen)
+        span.update(rows=len(rows), **truncation_flags(truncated))
+    with stage('format'):
+        formatted_results = [dict(zip(columns, row)) for row in rows]
+    logger.info(f"Query returned {len(formatted_results)} results{' (more pages follow)' if state else ''}"
+                f"{f' (truncated: {truncated})' if truncated else ''}")
+    log_rows(logger, formatted_results)
+    next_page = None
+    if state:
+        state["fingerprint"] = context["fingerprint"]
+        next_page = encode_token(state, PAGE_TOKEN_SECRET)
+    return {"query": sql_query, "results": formatted_results, "next_page": next_page, **truncation_flags(truncated)}
+
+def wants_stream():
+    """Whether the client asked for NDJSON instead of a single JSON document"""
+    return bool(request.json.get('stream')) or 'application/x-ndjson' in request.headers.get('Accept', '')
+
 @app.route('/')
 def home():
     """Render the home page"""
     return render_template('index.html')
 
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    if request.endpoint == 'query':
+        metrics.inc('query_requests_total')
+        metrics.observe('query_duration_seconds', time.perf_counter() - g.request_started)
+    trace = g.get('trace')
+    if trace is not None:
+        response.headers['X-Request-ID'] = trace.request_id
+        trace.set(status=response.status_code)
+        # Streamed responses are exported by close_stream() once the rows are sent
+        if not response.is_streamed:
+            tracer.export(trace)
+    return response
+
 @app.route('/query', methods=['POST'])
 def query():
+    trace = g.trace = Trace(request.headers.get('X-Request-ID'))
+    # The SQL being run, for the error log, whichever path supplied it
+    sql_query = None
     try:
         user_query = request.json.get('query', '')
-        logger.info(f"\nProcessing query: {user_query}")
+        logger.info(f"\nProcessing query [{trace.request_id}]: {user_query}")
+        trace.set(question=user_query)
 
-        # Get current database schema and data samples
-        with sqlite3.connect(DATABASE_PATH) as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
-            tables = cursor.fetchall()
-            schema_context = []
-            logger.info("\nCurrent Database Schema and Samples:")
-            for table in tables:
-                table_name = table[0]
-                cursor.execute(f"PRAGMA table_info({table_name})")
-                columns = cursor.fetchall()
-                column_names = [col[1] for col in columns]
-                
-                # Get row count and sample data
-                cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-                row_count = cursor.fetchone()[0]
-                cursor.execute(f"SELECT * FROM {table_name} LIMIT 3")
-                sample_rows = cursor.fetchall()
-                
-                logger.info(f"\nTable '{table_name}':")
-                logger.info(f"  Columns: {', '.join(column_names)}")
-                logger.info(f"  Total rows: {row_count}")
-                logger.info("  Sample data:")
-                for row in sample_rows:
-                    logger.info(f"    {dict(zip(column_names, row))}")
-                
-                schema_context.append(f"Table '{table_name}' ({row_count} rows) with columns: {', '.join(column_names)}")
+        # Get current database schema (cached until hardware.db changes)
+        with stage('schema'):
+            context = schema_cache.get()
 
-        # Create the system message with schema context
-        system_message = f"""You are a SQL query generator. Convert natural language queries into SQL based on this schema:
-{chr(10).join(schema_context)}
+        # Follow-up page: the token carries the SQL, so neither the model nor
+        # the cache is consulted again
+        page_token = request.json.get('page_token')
+        if page_token:
+            state = decode_token(page_token, PAGE_TOKEN_SECRET)
+            if state.get("fingerprint") != context["fingerprint"]:
+                raise PageTokenError("Page token no longer matches the database, please rerun the query")
+            sql_query = state["sql"]
+            trace.set(sql=sql_query, source="page_token")
+            with db_pool.connection() as conn, time_budget(conn):
+                body = page_response(conn, state["sql"], state["params"], context,
+                                     state["page_size"], state["after"], state["seen"])
+            return json_response(body)
 
-Important notes:
-- Return ONLY the SQL query, no explanations
-- Make column names case-sensitive
-- Use LIKE with wildcards for partial matches
-- For name searches, use LIKE '%name%' to match partial names
-"""
-
-        logger.info("\nGenerating SQL query...")
-        completion = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": user_query}
-            ],
-            temperature=0
-        )
-        
-        sql_query = completion.choices[0].message.content.strip()
-        logger.info(f"Generated SQL: {sql_query}")
+        resolved = resolve_sql(user_query, context, lambda: generate_sql(user_query, context["query_context"]))
+        sql_query = resolved["sql"]
+        trace.set(sql=sql_query, source=resolved["source"])
+
+        # Stream the rows straight from the cursor so memory stays flat
+        if wants_stream():
+            conn = get_db_connection()
+            try:
+                with stage('plan'):
+                    check_plan(conn, resolved["sql"], resolved["params"], context["row_counts"])
+                with stage('execute'):
+                    # The budget covers streaming the rows too; stream_results()
+                    # and the pool clear it
+                    started = time.perf_counter()
+                    start_budget(conn)
+                    cursor = conn.execute(resolved["sql"], resolved["params"])
+            except (sqlite3.Error, QueryRejected):
+                release_db_connection(conn)
+                raise
+            response = Response(stream_results(conn, cursor, resolved["sql"], resolved["params"], started,
+                                               resolved["source"], trace, context["data_version"],
+                                               lambda: remember_sql(user_query, context, resolved)),
+                                mimetype='application/x-ndjson',
+                                headers={'X-Accel-Buffering': 'no'})
+            response.call_on_close(lambda: close_stream(conn, cursor, trace))
+            return response
+
+        # Execute the query, one page at a time when it is a plain SELECT
+        with db_pool.connection() as conn:
+            # Refuse plans that would visit far too many rows before running them
+            with stage('plan'):
+                check_plan(conn, resolved["sql"], resolved["params"], context["row_counts"])
+            started = time.perf_counter()
+            try:
+                with time_budget(conn):
+                    body = page_response(conn, resolved["sql"], resolved["params"], context, page_size_requested())
+            except (sqlite3.Error, NotPageable) as e:
+                if is_interrupted(e):
+                    raise
+                # Statements that cannot be wrapped in a subquery, or whose
+                # order the pages could not keep, run as is
+                logger.info(f"Query cannot be paged ({str(e)}), running it unpaged")
+            else:
+                query_log.record(conn, resolved["sql"], resolved["params"], (time.perf_counter() - started) * 1000,
+                                 len(body["results"]), resolved["source"], context["data_version"])
+                remember_sql(user_query, context, resolved)
+                return json_response(body)
 
-        # Execute the query
-        with sqlite3.connect(DATABASE_PATH) as conn:
             cursor = conn.cursor()
-            cursor.execute(sql_query)
-            results = cursor.fetchall()
+            started = time.perf_counter()
+            with stage('execute') as span, time_budget(conn):
+                cursor.execute(resolved["sql"], resolved["params"])
+                results, truncated = fetch_limited(cursor)
+                span.update(rows=len(results), **truncation_flags(truncated))
+            query_log.record(conn, resolved["sql"], resolved["params"], (time.perf_counter() - started) * 1000,
+                             len(results), resolved["source"], context["data_version"])
+            remember_sql(user_query, context, resolved)
             if cursor.description:  # If we have results
                 columns = [col[0] for col in cursor.description]
-                formatted_results = [dict(zip(columns, row)) for row in results]
-                logger.info(f"Query returned {len(formatted_results)} results:")
-                for result in formatted_results:
-                    logger.info(f"  {result}")
-                return jsonify({"results": formatted_results})
+                with stage('format'):
+                    formatted_results = [dict(zip(columns, row)) for row in results]
+                logger.info(f"Query returned {len(formatted_results)} results"
+                            f"{f' (truncated: {truncated})' if truncated else ''}")
+                log_rows(logger, formatted_results)
+                return json_response({"results": formatted_results, **truncation_flags(truncated)})
             else:
                 logger.info("Query executed successfully but returned no results")
                 return jsonify({"message": "Query executed successfully but returned no results"})
 
+    except PageTokenError as e:
+        logger.warning(f"Rejected page token: {str(e)}")
+        trace.set(error=str(e))
+        return jsonify({"error": str(e)}), 200
+    except QueryRejected as e:
+        logger.warning(str(e))
+        metrics.inc('query_rejected_total')
+        trace.set(error=str(e))
+        return jsonify({"error": str(e)}), 200
     except sqlite3.Error as e:
-        error_msg = f"Database error: {str(e)}"
-        logger.error(error_msg, exc_info=True)
+        count_sqlite_error(e)
+        if is_interrupted(e):
+            error_msg = f"Query stopped after exceeding the {QUERY_TIMEOUT_MS} ms time budget"
+            logger.warning(f"{error_msg}: {sql_query}")
+        else:
+            error_msg = f"Database error: {str(e)}"
+            logger.error(error_msg, exc_info=True)
+        trace.set(error=error_msg)
         return jsonify({"error": error_msg}), 200
     except Exception as e:
         error_msg = f"Error: {str(e)}"
         logger.error(error_msg, exc_info=True)
+        trace.set(error=error_msg)
         return jsonify({"error": error_msg}), 200
 
+@app.route('/query-cache/stats')
+def query_cache_stats():
+    """Cache hit rates, used to tune QUERY_CACHE_FUZZY_THRESHOLD"""
+    return jsonify(query_cache.stats())
+
+@app.route('/query-log/slow')
+def query_log_slow():
+    """Most recent queries slower than SLOW_QUERY_MS, with their plans"""
+    return jsonify(query_log.slow_queries(request.args.get('limit', 50, type=int)))
+
+@app.route('/query-log/advice')
+def query_log_advice():
+    """Index proposals made so far, with their timings"""
+    return jsonify(query_log.advice())
+
+@app.route('/query-log/advice', methods=['POST'])
+def query_log_advise():
+    """Propose indexes for columns the logged queries keep scanning for.
+
+    Times the sample query of each new proposal, so it can take a while.
+    """
+    with db_pool.connection() as conn:
+        return jsonify(query_log.advise(conn))
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Latency histograms and counters of all workers in Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 10000))
     app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,104 @@
+import argparse
+import hashlib
+import os
+import random
+import tempfile
+import time
+import pandas as pd
+from flask import Flask
+from sqlalchemy import text
+from models import db
+from load_excel import bulk_load_excel_to_db, load_excel_to_db
+
+def generate_workbook(path, sheets=3, rows=2000, seed=42):
+    """Write a workbook shaped like the hardware export: text names, flags, numbers and gaps"""
+    rng = random.Random(seed)
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        for s in range(sheets):
+            data = {
+                "Name": [f"Site {rng.randint(1, 50)} Camera {i}" for i in range(rows)],
+                "Hardware": [f"Device {i // 4} (10.0.{i // 250}.{i % 250})" for i in range(rows)],
+                "Enabled": [rng.random() < 0.9 for _ in range(rows)],
+                "Channel": [i % 4 for i in range(rows)],
+                "FrameRate": [rng.choice([None, 10, 15, 30]) for _ in range(rows)],
+                "Threshold": [round(rng.uniform(0, 100), 2) for _ in range(rows)],
+                "Description": [rng.choice([None, "", "Entrance", "Parking lot"]) for _ in range(rows)],
+                "LastModified": pd.date_range("2024-01-01", periods=rows, freq="min"),
+            }
+            pd.DataFrame(data).to_excel(writer, sheet_name=f"Sheet{s + 1}", index=False)
+
+def make_app(db_path):
+    flask_app = Flask(__name__)
+    flask_app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{db_path}"
+    flask_app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(flask_app)
+    return flask_app
+
+def contents_digest(flask_app):
+    """Row/cell counts and a digest of every (sheet, row index, column, value) loaded"""
+    with flask_app.app_context():
+        counts = {table: db.session.execute(text(f"SELECT COUNT(*) FROM {table}")).scalar()
+                  for table in ('sheets', 'columns', 'rows', 'cells')}
+        digest = hashlib.sha256()
+        result = db.session.execute(text(
+            "SELECT s.name, r.row_index, c.name, c.data_type, cl.value FROM cells cl "
+            "JOIN rows r ON r.id = cl.row_id JOIN columns c ON c.id = cl.column_id "
+            "JOIN sheets s ON s.id = r.sheet_id ORDER BY s.name, r.row_index, c.id"
+        ))
+        for row in result:
+            digest.update(repr(tuple(row)).encode())
+        return counts, digest.hexdigest()
+
+def parse_seconds(excel_path):
+    """Time both loaders spend in pandas reading the sheets"""
+    started = time.perf_counter()
+    excel_file = pd.ExcelFile(excel_path)
+    for sheet_name in excel_file.sheet_names:
+        pd.read_excel(excel_file, sheet_name)
+    return time.perf_counter() - started
+
+def run(loader, excel_path, db_path):
+    flask_app = make_app(db_path)
+    started = time.perf_counter()
+    if not loader(excel_path, flask_app=flask_app):
+        raise RuntimeError(f"{loader.__name__} failed")
+    return time.perf_counter() - started, flask_app
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the ORM and bulk EAV loaders on a generated workbook")
+    parser.add_argument('--sheets', type=int, default=3)
+    parser.add_argument('--rows', type=int, default=2000, help="rows per sheet")
+    parser.add_argument('--workbook', help="benchmark this workbook instead of a generated one")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        excel_path = args.workbook or os.path.join(tmp, 'benchmark.xlsx')
+        if not args.workbook:
+            print(f"Generating workbook with {args.sheets} sheets of {args.rows} rows...")
+            generate_workbook(excel_path, args.sheets, args.rows)
+
+        read_seconds = parse_seconds(excel_path)
+        old_seconds, old_app = run(load_excel_to_db, excel_path, os.path.join(tmp, 'orm.db'))
+        new_seconds, new_app = run(bulk_load_excel_to_db, excel_path, os.path.join(tmp, 'bulk.db'))
+
+        old_counts, old_digest = contents_digest(old_app)
+        new_counts, new_digest = contents_digest(new_app)
+        with old_app.app_context():
+            db.engine.dispose()
+        with new_app.app_context():
+            db.engine.dispose()
+
+    cells = new_counts['cells']
+    print("\n=== Loader benchmark ===")
+    print(f"Rows: {new_counts['rows']}, cells: {cells}")
+    print(f"ORM loader:  {old_seconds:8.2f}s ({cells / old_seconds:,.0f} cells/s)")
+    print(f"Bulk loader: {new_seconds:8.2f}s ({cells / new_seconds:,.0f} cells/s)")
+    print(f"Speedup: {old_seconds / new_seconds:.1f}x")
+    # Both read the workbook with pandas; the rest is database writes
+    old_write, new_write = old_seconds - read_seconds, max(new_seconds - read_seconds, 1e-6)
+    print(f"Excluding {read_seconds:.2f}s of Excel parsing: ORM {old_write:.2f}s, bulk {new_write:.2f}s, "
+          f"speedup {old_write / new_write:.1f}x")
+    print(f"Same contents: {old_counts == new_counts and old_digest == new_digest}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import tempfile
+import time
+import pandas as pd
+from flask import Flask, jsonify
+from create_db import create_and_load_database
+from db_pool import ReadOnlyConnectionPool
+from prompts import sql_system_message
+from query_tests import queries
+from schema_cache import SchemaCache
+
+DEFAULT_BASELINE = 'benchmark_baseline.json'
+
+# Columns naming an entity or referring to one in another sheet; copies of
+# the workbook get the same suffix in all of them, so references still match
+KEY_COLUMNS = {'name', 'shortname', 'hardware', 'camera', 'relatedhardwarename'}
+
+def scaled_workbook(excel_path, factor, out_path):
+    """Write a copy of the workbook with every sheet's rows repeated factor times"""
+    sheets = pd.read_excel(excel_path, sheet_name=None)
+    with pd.ExcelWriter(out_path, engine='openpyxl') as writer:
+        for sheet_name, df in sheets.items():
+            copies = [df]
+            for k in range(1, factor):
+                copy = df.copy()
+                for column in copy.columns:
+                    if str(column).strip().lower() in KEY_COLUMNS:
+                        copy[column] = copy[column].map(lambda v: f"{v} #{k}" if isinstance(v, str) else v)
+                copies.append(copy)
+            pd.concat(copies, ignore_index=True).to_excel(writer, sheet_name=sheet_name, index=False)
+
+def run_query(conn, sql):
+    cursor = conn.execute(sql)
+    return [col[0] for col in cursor.description], cursor.fetchall()
+
+def measure(fn, repeat):
+    """Run fn repeat times and summarize the durations in milliseconds"""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - started) * 1000)
+    times.sort()
+    return {
+        "median_ms": round(statistics.median(times), 4),
+        "p95_ms": round(times[min(len(times) - 1, int(len(times) * 0.95))], 4),
+        "min_ms": round(times[0], 4),
+        "runs": repeat,
+    }
+
+def run_benchmarks(db_path, excel_path, repeat, build=True):
+    """Time each pipeline stage on db_path; returns {benchmark name: timings}"""
+    results = {}
+
+    # Schema introspection: rebuilt from scratch, then served from the cache
+    results["schema.cold"] = measure(lambda: SchemaCache(db_path).get(), repeat)
+    cache = SchemaCache(db_path)
+    context = cache.get()
+    results["schema.warm"] = measure(cache.get, repeat)
+
+    results["prompt"] = measure(lambda: sql_system_message(context["query_context"]), repeat)
+
+    # The canned queries, on the read-only pooled connections the app uses
+    pool = ReadOnlyConnectionPool(db_path)
+    outputs = []
+    with pool.connection() as conn:
+        for i, (sql, description) in enumerate(queries, 1):
+            try:
+                outputs.append(run_query(conn, sql))
+            except sqlite3.Error as e:
+                print(f"Skipping query {i} ({description}): {str(e)}")
+                continue
+            results[f"execute.q{i:02d}"] = measure(lambda: run_query(conn, sql), repeat)
+        # The widest table in full stands in for a large unpaged response
+        outputs.append(run_query(conn, "SELECT * FROM cameras"))
+    pool.close()
+    results["execute.total"] = {
+        "median_ms": round(sum(r["median_ms"] for name, r in results.items() if name.startswith("execute.q")), 4)
+    }
+
+    def format_rows():
+        return [[dict(zip(columns, row)) for row in rows] for columns, rows in outputs]
+    results["format"] = measure(format_rows, repeat)
+
+    formatted = format_rows()
+    flask_app = Flask(__name__)
+    with flask_app.app_context():
+        results["serialize"] = measure(
+            lambda: [jsonify({"results": rows}).get_data() for rows in formatted], repeat)
+
+    if build:
+        with tempfile.TemporaryDirectory() as tmp:
+            build_path = os.path.join(tmp, 'build.db')
+            started = time.perf_counter()
+            if not create_and_load_database(excel_path, build_path, force=True):
+                raise RuntimeError("create_and_load_database failed")
+            results["build"] = {"median_ms": round((time.perf_counter() - started) * 1000, 4), "runs": 1}
+    return results
+
+def compare(results, baseline, tolerance, min_delta_ms=0.05):
+    """Print current vs baseline medians; returns the names that got slower than tolerance allows.
+
+    Slowdowns under min_delta_ms are timer noise on sub-millisecond
+    benchmarks and are not counted.
+    """
+    regressions = []
+    print(f"\n{'Benchmark':<16}{'Baseline ms':>14}{'Current ms':>14}{'Change':>10}")
+    for name, current in results.items():
+        before = baseline["results"].get(name)
+        if before is None:
+            print(f"{name:<16}{'-':>14}{current['median_ms']:>14.3f}{'new':>10}")
+            continue
+        change = (current["median_ms"] - before["median_ms"]) / max(before["median_ms"], 1e-9)
+        flag = ""
+        if change > tolerance and current["median_ms"] - before["median_ms"] >= min_delta_ms:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<16}{before['median_ms']:>14.3f}{current['median_ms']:>14.3f}{change:>+10.1%}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Time each stage of the query pipeline and compare with a baseline")
+    parser.add_argument('--workbook', default='hardware_data.xlsx', help="workbook the benchmark database is built from")
+    parser.add_argument('--scale', type=int, default=1, help="repeat every sheet's rows this many times")
+    parser.add_argument('--repeat', type=int, default=20, help="runs per benchmark")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save', action='store_true', help="write the results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="slowdown reported as a regression (0.2 = 20%%)")
+    parser.add_argument('--min-delta-ms', type=float, default=0.05,
+                        help="ignore slowdowns smaller than this many milliseconds")
+    parser.add_argument('--check', action='store_true', help="exit with status 1 on a regression")
+    parser.add_argument('--skip-build', action='store_true', help="do not time create_and_load_database()")
+    parser.add_argument('--database', help="benchmark an existing database, e.g. one from generate_workbook.py, "
+                                           "instead of building one (implies --skip-build)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        excel_path = args.workbook
+        if args.database:
+            db_path = args.database
+        else:
+            if args.scale > 1:
+                excel_path = os.path.join(tmp, 'scaled.xlsx')
+                print(f"Writing {args.workbook} scaled {args.scale}x...")
+                scaled_workbook(args.workbook, args.scale, excel_path)
+            db_path = os.path.join(tmp, 'benchmark.db')
+            if not create_and_load_database(excel_path, db_path, force=True):
+                raise RuntimeError(f"Could not build a database from {excel_path}")
+        with sqlite3.connect(db_path) as conn:
+            cameras = conn.execute("SELECT COUNT(*) FROM cameras").fetchone()[0]
+        results = run_benchmarks(db_path, excel_path, args.repeat, build=not (args.skip_build or args.database))
+
+    report = {
+        "meta": {
+            "workbook": os.path.basename(args.database or args.workbook),
+            "scale": args.scale,
+            "cameras": cameras,
+            "repeat": args.repeat,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "created_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        "results": results,
+    }
+
+    print(f"\n=== Pipeline benchmark ({cameras} cameras, {args.repeat} runs each) ===")
+    regressions = []
+    if os.path.exists(args.baseline) and not args.save:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline["meta"].get("cameras") != cameras:
+            print(f"Note: baseline was recorded with {baseline['meta'].get('cameras')} cameras")
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressions) or 'none'}")
+    else:
+        for name, result in results.items():
+            print(f"{name:<16}{result['median_ms']:>14.3f} ms")
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nBaseline written to {args.baseline}")
+
+    if args.check and regressions:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,223 @@
-import pandas as pd
 import sqlite3
+import glob
+import hashlib
+import json
 import os
-from logging_config import setup_logging
+import shutil
+import sys
+import time
+from contextlib import contextmanager
+from logging_config import LOG_ROWS, setup_logging
+from excel_reader import LOADER_BATCH_SIZE, LOADER_WORKERS, parse_workbook
+from name_search import NAME_SEARCH_COLUMNS, create_name_search
+from settings_pivot import PIVOT_TABLES, create_pivot_tables
+
+try:
+    import fcntl
+except ImportError:  # Windows: builds are not serialized across processes
+    fcntl = None
 
 logger = setup_logging('database.log')
 
-def create_and_load_database(excel_path, db_path='hardware.db'):
+# Bump whenever the way sheets are turned into tables changes, so databases
+# built by an older loader are rebuilt even if the workbook is the same
+LOADER_VERSION = 2
+
+# Bulk-load mode builds every table in one transaction with journaling and
+# synchronous writes turned off for the shadow file; set LOADER_BULK_MODE=0
+# to commit table by table with SQLite's defaults instead
+LOADER_BULK_MODE = os.getenv('LOADER_BULK_MODE', '1') != '0'
+# Page cache for the build connection, in KiB
+LOADER_CACHE_KB = int(os.getenv('LOADER_CACHE_KB', str(64 * 1024)))
+
+# Secondary indexes, built after the data is loaded: name -> (table, columns).
+# Generated SQL joins on the plain columns and matches names with LIKE 'x%',
+# which SQLite can only answer from an index if it is case-insensitive, hence
+# the NOCASE twins. Indexes on columns missing from the workbook are skipped.
+TABLE_INDEXES = {
+    'idx_hardware_name': ('hardware', ['name']),
+    'idx_hardware_name_nocase': ('hardware', ['name COLLATE NOCASE']),
+    'idx_hardware_model': ('hardware', ['model']),
+    'idx_hardware_recordingserver': ('hardware', ['recordingserver']),
+    'idx_cameras_hardware': ('cameras', ['hardware']),
+    'idx_cameras_hardware_nocase': ('cameras', ['hardware COLLATE NOCASE']),
+    'idx_cameras_name_nocase': ('cameras', ['name COLLATE NOCASE']),
+    'idx_cameras_recordingserver': ('cameras', ['recordingserver']),
+    'idx_hardwareptzsettings_hardware': ('hardwareptzsettings', ['hardware']),
+    'idx_hardwaregeneralsettings_hardware': ('hardwaregeneralsettings', ['hardware', 'setting']),
+    'idx_camerastreams_camera': ('camerastreams', ['camera']),
+    'idx_camerastreamsettings_camera': ('camerastreamsettings', ['camera', 'setting']),
+    'idx_camerageneralsettings_camera': ('camerageneralsettings', ['camera', 'setting']),
+    'idx_camerageneralsettings_setting': ('camerageneralsettings', ['setting']),
+    'idx_cameraevents_camera': ('cameraevents', ['camera']),
+    'idx_cameraevents_eventname': ('cameraevents', ['eventname']),
+    'idx_cameragroups_group': ('cameragroups', ['"group"']),
+    'idx_cameragroups_camera': ('cameragroups', ['camera']),
+    'idx_camerarelateddevices_type': ('camerarelateddevices', ['relateddevicetype']),
+}
+
+# Table holding the hash and parameters of the last successful build
+BUILD_META_TABLE = '_build_meta'
+
+def workbook_hash(excel_path):
+    """SHA-256 of the workbook contents"""
+    digest = hashlib.sha256()
+    with open(excel_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def table_indexes(extra_indexes=None):
+    """TABLE_INDEXES plus any extra indexes asked for by the caller"""
+    indexes = dict(TABLE_INDEXES)
+    indexes.update(extra_indexes or {})
+    return indexes
+
+def build_params(extra_indexes=None):
+    """Parameters that change the database built from a given workbook"""
+    return {
+        "loader_version": LOADER_VERSION,
+        "indexes": {name: [table, list(columns)] for name, (table, columns) in sorted(table_indexes(extra_indexes).items())},
+        "name_search": {table: list(columns) for table, columns in sorted(NAME_SEARCH_COLUMNS.items())},
+        "pivots": {table: [source, keys, setting, value] for table, (source, keys, setting, value) in sorted(PIVOT_TABLES.items())},
+    }
+
+def read_build_meta(db_path):
+    """Build metadata stored in the database, or None if it has none"""
+    if not os.path.exists(db_path):
+        return None
+    try:
+        with sqlite3.connect(db_path) as conn:
+            rows = conn.execute(f"SELECT key, value FROM {BUILD_META_TABLE}").fetchall()
+            tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    except sqlite3.Error:
+        return None
+    meta = {key: json.loads(value) for key, value in rows}
+    # A table dropped since the build means the database is incomplete
+    if not set(meta.get("tables", [])) <= tables:
+        return None
+    return meta
+
+def write_build_meta(conn, meta):
+    conn.execute(f"DROP TABLE IF EXISTS {BUILD_META_TABLE}")
+    conn.execute(f"CREATE TABLE {BUILD_META_TABLE} (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    conn.executemany(f"INSERT INTO {BUILD_META_TABLE} (key, value) VALUES (?, ?)",
+                     [(key, json.dumps(value)) for key, value in meta.items()])
+
+def is_up_to_date(excel_path, db_path, workbook_sha256=None, extra_indexes=None):
+    """Whether db_path was built from this exact workbook with the current parameters"""
+    meta = read_build_meta(db_path)
+    if meta is None:
+        return False
+    workbook_sha256 = workbook_sha256 or workbook_hash(excel_path)
+    return meta.get("workbook_sha256") == workbook_sha256 and meta.get("build_params") == build_params(extra_indexes)
+
+@contextmanager
+def build_lock(db_path):
+    """Exclusive lock on db_path's lock file for the duration of a build"""
+    with open(f"{db_path}.lock", 'a') as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def remove_database_file(path):
+    """Remove a database file together with its journal files"""
+    for suffix in ('', '-journal', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+def verify_database(conn, expected_counts):
+    """Raise if the freshly built database is corrupt or missing rows"""
+    result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+    if result != 'ok':
+        raise sqlite3.DatabaseError(f"Integrity check failed: {result}")
+    for table_name, expected in expected_counts.items():
+        count = conn.execute(f'SELECT COUNT(*) FROM "{table_name}"').fetchone()[0]
+        if count != expected:
+            raise sqlite3.DatabaseError(f"Table '{table_name}' has {count} rows, expected {expected}")
+
+def swap_in(build_path, db_path):
+    """Atomically replace db_path with the finished build"""
+    with open(build_path, 'rb') as f:
+        os.fsync(f.fileno())
+    os.replace(build_path, db_path)
+    # Persist the rename itself
+    if hasattr(os, 'O_DIRECTORY'):
+        dir_fd = os.open(os.path.dirname(os.path.abspath(db_path)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+def load_table(conn, sheet, batch_size=LOADER_BATCH_SIZE):
+    """Create the sheet's table with its inferred column types and copy its part file in.
+
+    Returns the number of rows written.
+    """
+    table_name = sheet["table_name"]
+    column_defs = ",\n  ".join(f'"{col}" {col_type}' for col, col_type in zip(sheet["columns"], sheet["types"]))
+    conn.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+    conn.execute(f'CREATE TABLE "{table_name}" (\n  {column_defs}\n)')
+    select_list = ", ".join(
+        (expression or '{col}').format(col=f'"{col}"')
+        for col, expression in zip(sheet["columns"], sheet["expressions"])
+    )
+    insert = f'INSERT INTO "{table_name}" VALUES ({", ".join("?" * len(sheet["columns"]))})'
+
+    written = 0
+    part = sqlite3.connect(sheet["part_path"])
+    try:
+        rows = part.execute(f'SELECT {select_list} FROM "{table_name}"')
+        while True:
+            batch = rows.fetchmany(batch_size)
+            if not batch:
+                break
+            conn.executemany(insert, batch)
+            written += len(batch)
+    finally:
+        part.close()
+    os.remove(sheet["part_path"])
+    return written
+
+def rows_per_second(rows, seconds):
+    return f"{rows / seconds:,.0f}" if seconds > 0 else "-"
+
+def create_indexes(conn, indexes):
+    """Create the secondary indexes, once all rows are in, and gather planner statistics"""
+    for index_name, (table_name, columns) in indexes.items():
+        existing = {row[1] for row in conn.execute(f'PRAGMA table_info("{table_name}")')}
+        needed = {col.split()[0].strip('"') for col in columns}
+        if not needed <= existing:
+            logger.info(f"Skipping index {index_name}: {table_name} has no column(s) {sorted(needed - existing)}")
+            continue
+        column_list = ", ".join(columns)
+        logger.info(f"Creating index {index_name} on {table_name} ({column_list})")
+        conn.execute(f'CREATE INDEX IF NOT EXISTS "{index_name}" ON "{table_name}" ({column_list})')
+    conn.execute("ANALYZE")
+
+def configure_build_connection(conn, bulk):
+    """Pragmas for the shadow database being built"""
+    if not bulk:
+        return
+    # The build file is thrown away if anything fails and only swapped in
+    # after it has been verified and fsynced, so it needs neither a journal
+    # nor synchronous writes
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA locking_mode=EXCLUSIVE")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute(f"PRAGMA cache_size=-{LOADER_CACHE_KB}")
+
+def create_and_load_database(excel_path, db_path='hardware.db', force=False, extra_indexes=None):
+    """Load every sheet of the workbook into db_path, unless it is already up to date.
+
+    ``extra_indexes`` are created in addition to TABLE_INDEXES, in the same
+    name -> (table, columns) form; changing them triggers a rebuild.
+    """
     print("\n=== Database Creation Process ===")
     print(f"Reading Excel file from: {excel_path}")
     logger.info("=== Database Creation Process ===")
@@ -31,91 +243,130 @@ def create_and_load_database(excel_path, db_path='hardware.db'):
     print(f"Excel file exists, size: {os.path.getsize(excel_path)} bytes")
     logger.info(f"Excel file exists, size: {os.path.getsize(excel_path)} bytes")
     
+    # Every gunicorn worker and prestart.sh call this; skip the rebuild when
+    # the database was already built from the same workbook
+    workbook_sha256 = workbook_hash(excel_path)
+    if not force and is_up_to_date(excel_path, db_path, workbook_sha256, extra_indexes):
+        print(f"Database {db_path} is up to date with the workbook, skipping rebuild")
+        logger.info(f"Database {db_path} is up to date with workbook {workbook_sha256[:12]}, skipping rebuild")
+        return True
+    
+    # Only one process builds at a time; the others wait for it and then
+    # find the database up to date
+    with build_lock(db_path):
+        if not force and is_up_to_date(excel_path, db_path, workbook_sha256, extra_indexes):
+            logger.info(f"Database {db_path} was rebuilt by another process, skipping rebuild")
+            return True
+        return build_database(excel_path, db_path, workbook_sha256, extra_indexes=extra_indexes)
+
+def build_database(excel_path, db_path, workbook_sha256, bulk=LOADER_BULK_MODE, extra_indexes=None,
+                   read_sheets=None):
+    """Build the database in a shadow file and atomically swap it in for db_path.
+
+    Readers keep using the old file until the rename, and connections opened
+    afterwards see the complete new one, so there is never a partial state.
+    ``read_sheets(part_prefix)`` replaces reading the workbook: it yields
+    sheet descriptions like excel_reader.write_part() returns, with their
+    part files named <part_prefix>.part-<n>.
+    """
+    build_path = f"{db_path}.build-{os.getpid()}"
+    remove_database_file(build_path)
+    if fcntl is not None:
+        # We hold the build lock, so other build files are left over from
+        # builds that were killed
+        for stale in glob.glob(f"{glob.escape(db_path)}.build-*"):
+            os.remove(stale)
+    logger.info(f"Building into shadow database {build_path}")
+
     try:
-        # Create/connect to database
-        conn = sqlite3.connect(db_path)
+        # Create the shadow database; the live one is left alone until the swap.
+        # Transactions are managed explicitly: one for the whole build in bulk
+        # mode, one per table otherwise
+        conn = sqlite3.connect(build_path, isolation_level=None)
+        configure_build_connection(conn, bulk)
         cursor = conn.cursor()
+        expected_counts = {}
+        build_started = time.perf_counter()
+        if bulk:
+            conn.execute("BEGIN")
         
-        # Drop all existing tables
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        tables = cursor.fetchall()
-        for table in tables:
-            cursor.execute(f"DROP TABLE IF EXISTS {table[0]}")
-        conn.commit()
-        
-        # Read Excel file
+        # Parse the sheets in parallel, each streamed into its own part file,
+        # then copy them into the build in workbook order
         print("\nReading Excel file...")
-        excel_file = pd.ExcelFile(excel_path)
-        print("\nAvailable sheets in Excel:")
-        for sheet in excel_file.sheet_names:
-            print(f"  - {sheet}")
-        logger.info("\nAvailable sheets in Excel:")
-        for sheet in excel_file.sheet_names:
-            logger.info(f"  - {sheet}")
-        
-        # Process each sheet
-        for sheet_name in excel_file.sheet_names:
+        logger.info(f"Parsing sheets with up to {LOADER_WORKERS} processes")
+        sheets = read_sheets(build_path) if read_sheets else parse_workbook(excel_path, build_path)
+        for sheet in sheets:
+            sheet_name, table_name = sheet["sheet_name"], sheet["table_name"]
             print(f"\nProcessing sheet: {sheet_name}")
             logger.info(f"\nProcessing sheet: {sheet_name}")
-            df = pd.read_excel(excel_file, sheet_name)
             
             # Print data info
             print(f"\nDataset Info for {sheet_name}:")
-            print(f"Total rows: {len(df)}")
-            print(f"Total columns: {len(df.columns)}")
-            print("\nColumns and sample values:")
-            for col in df.columns:
-                sample_values = df[col].head(3).tolist()
-                print(f"  - {col}: {sample_values}")
+            print(f"Total rows: {sheet['row_count']}")
+            print(f"Total columns: {len(sheet['columns'])}")
             logger.info(f"\nDataset Info for {sheet_name}:")
-            logger.info(f"Total rows: {len(df)}")
-            logger.info(f"Total columns: {len(df.columns)}")
-            logger.info("\nColumns and sample values:")
-            for col in df.columns:
-                sample_values = df[col].head(3).tolist()
-                logger.info(f"  - {col}: {sample_values}")
-            
-            # Print first few rows
-            print("\nFirst few rows:")
-            print(df.head().to_string())
-            logger.debug("\nFirst few rows:")
-            logger.debug(df.head().to_string())
-            
-            # Clean column names (remove spaces, special chars)
-            original_columns = list(df.columns)
-            df.columns = [col.strip().lower().replace(' ', '_').replace('-', '_') for col in df.columns]
+            logger.info(f"Total rows: {sheet['row_count']}")
+            logger.info(f"Total columns: {len(sheet['columns'])}")
+            # Sample values only with LOG_ROWS, they dominate the output of wide sheets
+            if LOG_ROWS:
+                print("\nColumns and sample values:")
+                for i, col in enumerate(sheet["original_columns"]):
+                    sample_values = [row[i] for row in sheet["samples"]]
+                    print(f"  - {col}: {sample_values}")
+                logger.debug("\nColumns and sample values:")
+                for i, col in enumerate(sheet["original_columns"]):
+                    sample_values = [row[i] for row in sheet["samples"]]
+                    logger.debug(f"  - {col}: {sample_values}")
             
             # Log column name changes
-            for orig, new in zip(original_columns, df.columns):
+            for orig, new in zip(sheet["original_columns"], sheet["columns"]):
                 if orig != new:
                     print(f"Column renamed: '{orig}' -> '{new}'")
                     logger.info(f"Column renamed: '{orig}' -> '{new}'")
             
-            # Clean table name
-            table_name = sheet_name.strip().lower().replace(' ', '_').replace('-', '_')
             print(f"\nCreating table '{table_name}' with columns:")
-            for col in df.columns:
-                print(f"  - {col}")
+            for col, col_type in zip(sheet["columns"], sheet["types"]):
+                print(f"  - {col} ({col_type})")
             logger.info(f"\nCreating table '{table_name}' with columns:")
-            for col in df.columns:
-                logger.info(f"  - {col}")
+            for col, col_type in zip(sheet["columns"], sheet["types"]):
+                logger.info(f"  - {col} ({col_type})")
             
             # Save to database
-            df.to_sql(table_name, conn, if_exists='replace', index=False)
+            write_started = time.perf_counter()
+            if not bulk:
+                conn.execute("BEGIN")
+            row_count = load_table(conn, sheet)
+            if not bulk:
+                conn.execute("COMMIT")
+            write_seconds = time.perf_counter() - write_started
+            expected_counts[table_name] = sheet["row_count"]
             
-            # Verify table creation
-            cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-            row_count = cursor.fetchone()[0]
-            print(f"\nVerified table '{table_name}' with {row_count} rows")
-            logger.info(f"\nVerified table '{table_name}' with {row_count} rows")
+            # Report throughput; the row count is checked against the sheet in verify_database()
+            rate = f"parsed at {rows_per_second(row_count, sheet['parse_seconds'])} rows/s, " \
+                   f"written at {rows_per_second(row_count, write_seconds)} rows/s"
+            print(f"\nLoaded table '{table_name}' with {row_count} rows ({rate})")
+            logger.info(f"\nLoaded table '{table_name}' with {row_count} rows ({rate})")
+        
+        # Indexes are cheaper to build over the loaded data than to maintain row by row
+        if not bulk:
+            conn.execute("BEGIN")
+        # Wide per-camera settings tables (see settings_pivot.py), before
+        # create_indexes() so ANALYZE covers their indexes too
+        for table_name, row_count in create_pivot_tables(conn).items():
+            expected_counts[table_name] = row_count
+            logger.info(f"Created pivoted table '{table_name}' with {row_count} rows")
+        create_indexes(conn, table_indexes(extra_indexes))
+        # Trigram indexes for LIKE '%name%' searches (see name_search.py)
+        for table_name, columns in create_name_search(conn).items():
+            logger.info(f"Created name search index on {table_name} ({', '.join(columns)})")
         
         # Print final database state
         print("\nFinal Database Tables:")
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'")
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' "
+                       "AND name NOT LIKE '\\_%' ESCAPE '\\'")
         tables = cursor.fetchall()
         for table in tables:
-            cursor.execute(f"SELECT COUNT(*) FROM {table[0]}")
-            count = cursor.fetchone()[0]
+            count = expected_counts.get(table[0])
             print(f"  - {table[0]} ({count} rows)")
             logger.info(f"  - {table[0]} ({count} rows)")
             
@@ -125,14 +376,32 @@ def create_and_load_database(excel_path, db_path='hardware.db'):
             print(f"    Columns: {', '.join(col[1] for col in columns)}")
             logger.info(f"    Columns: {', '.join(col[1] for col in columns)}")
         
-        # Create backup of database
+        # Recorded last, so an interrupted build is never mistaken for a complete one
+        write_build_meta(conn, {
+            "workbook_sha256": workbook_sha256,
+            "build_params": build_params(extra_indexes),
+            "tables": [table[0] for table in tables],
+        })
+        conn.execute("COMMIT")
+        
+        verify_database(conn, expected_counts)
+        total_rows = sum(expected_counts.values())
+        total_seconds = time.perf_counter() - build_started
+        logger.info(f"Loaded {total_rows} rows in {total_seconds:.2f}s "
+                    f"({rows_per_second(total_rows, total_seconds)} rows/s, bulk mode {'on' if bulk else 'off'})")
+        conn.close()
+        
+        # Create backup of database; the build file is complete and closed,
+        # so a plain file copy does it
         backup_path = f"{db_path}.backup"
-        with sqlite3.connect(backup_path) as backup:
-            conn.backup(backup)
+        shutil.copyfile(build_path, f"{backup_path}.tmp")
+        os.replace(f"{backup_path}.tmp", backup_path)
         print(f"\nCreated backup at: {backup_path}")
         logger.info(f"\nCreated backup at: {backup_path}")
         
-        conn.close()
+        swap_in(build_path, db_path)
+        print(f"\nSwapped {build_path} in as {db_path}")
+        logger.info(f"Swapped {build_path} in as {db_path}")
         print("\nDatabase creation completed successfully!")
         logger.info("\nDatabase creation completed successfully!")
         return True
@@ -143,7 +412,11 @@ def create_and_load_database(excel_path, db_path='hardware.db'):
         logger.error(error_msg, exc_info=True)
         if 'conn' in locals():
             conn.close()
+        remove_database_file(build_path)
         return False
+    finally:
+        for part in glob.glob(f"{glob.escape(build_path)}.part-*"):
+            os.remove(part)
 
 if __name__ == "__main__":
     # In production (Render), use the deployed Excel file
@@ -168,4 +441,4 @@ if __name__ == "__main__":
                 print(f"  - {path}")
             exit(1)
     
-    create_and_load_database(excel_path)
+    create_and_load_database(excel_path, force='--force' in sys.argv[1:])
@@ -1,86 +1,262 @@
-import pandas as pd
 import sqlite3
+import glob
 import os
+import sys
+from create_db import remove_database_file, swap_in
+from excel_reader import LOADER_BATCH_SIZE, parse_workbook
 
-# Get the absolute path to the database
-DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hardware.db')
+# Get the absolute path to the database; the linked schema is built next to
+# hardware.db rather than over it, since the app queries the sheet layout
+DB_PATH = os.getenv('LINKED_DB_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hardware_linked.db'))
 EXCEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'hardware_data.xlsx')
 
-def create_database():
-    # Create a new database connection
-    conn = sqlite3.connect(DB_PATH)
-    
+# Tables whose rows belong to a camera: table -> whether every row must name
+# a known camera. PTZ settings also list channels that have no camera, so
+# they keep the camera name and only link it when there is a match.
+CAMERA_CHILDREN = {
+    'camerastreams': True,
+    'camerastreamsettings': True,
+    'camerageneralsettings': True,
+    'camerarelateddevices': True,
+    'cameraevents': True,
+    'cameragroups': True,
+    'hardwareptzsettings': False,
+}
+# Tables whose rows belong to a hardware device (besides the camera children)
+HARDWARE_CHILDREN = {'cameras', 'hardwaregeneralsettings'}
+
+# Kinds of cell value (see excel_reader.convert_value) -> STRICT column type
+STRICT_TYPES = {
+    'int': 'INTEGER',
+    'float': 'REAL',
+    'datetime': 'TEXT',
+    'date': 'TEXT',
+    'time': 'TEXT',
+    'text': 'TEXT',
+}
+
+def strict_type(kinds):
+    """STRICT column type for the kinds of value seen in a column, and whether it is a flag.
+
+    Unlike the pandas-compatible types of hardware.db, integers stay INTEGER
+    when some cells are empty and text flags become 0/1 integers.
+    """
+    kinds = set(kinds)
+    if not kinds:
+        return 'TEXT', False
+    if kinds <= {'bool', 'text_bool'}:
+        return 'INTEGER', True
+    if kinds <= {'int', 'text_int'}:
+        return 'INTEGER', False
+    if kinds <= {'int', 'float', 'text_int', 'text_float'}:
+        return 'REAL', False
+    if len(kinds) == 1:
+        return STRICT_TYPES.get(next(iter(kinds)), 'TEXT'), False
+    return 'TEXT', False
+
+def table_layout(sheet):
+    """Key columns, copied sheet columns and constraints of a sheet's linked table"""
+    table_name = sheet["table_name"]
+    keys = []
+    dropped = set()
+    if table_name == 'hardware':
+        keys.append('"hardware_id" INTEGER PRIMARY KEY')
+    elif table_name == 'cameras':
+        keys.append('"camera_id" INTEGER PRIMARY KEY')
+    if table_name in HARDWARE_CHILDREN or table_name in CAMERA_CHILDREN:
+        keys.append('"hardware_id" INTEGER NOT NULL REFERENCES "hardware" ("hardware_id")')
+        dropped.add('hardware')
+    if table_name in CAMERA_CHILDREN:
+        required = CAMERA_CHILDREN[table_name]
+        keys.append(f'"camera_id" INTEGER{" NOT NULL" if required else ""} REFERENCES "cameras" ("camera_id")')
+        if required:
+            dropped.add('camera')
+
+    columns, definitions = [], []
+    for col, kinds, expression in zip(sheet["columns"], sheet["kinds"], sheet["expressions"]):
+        if col in dropped:
+            continue
+        col_type, is_flag = strict_type(kinds)
+        definition = f'"{col}" {col_type}'
+        if is_flag:
+            definition += f' CHECK ("{col}" IN (0, 1))'
+        if table_name in ('hardware', 'cameras') and col == 'name':
+            definition += ' NOT NULL'
+        columns.append((col, expression))
+        definitions.append(definition)
+
+    constraints = []
+    if table_name == 'hardware':
+        constraints.append('UNIQUE ("name")')
+    elif table_name == 'cameras':
+        constraints.append('UNIQUE ("hardware_id", "name")')
+    return keys, columns, definitions + constraints
+
+def load_linked_table(conn, sheet, hardware_ids, camera_ids, batch_size=LOADER_BATCH_SIZE):
+    """Create a sheet's linked table and copy its rows in with their foreign keys resolved.
+
+    Returns the number of rows written.
+    """
+    table_name = sheet["table_name"]
+    keys, columns, definitions = table_layout(sheet)
+    conn.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+    conn.execute(f'CREATE TABLE "{table_name}" (\n  ' + ",\n  ".join(keys + definitions) + '\n) STRICT')
+
+    links_hardware = table_name in HARDWARE_CHILDREN or table_name in CAMERA_CHILDREN
+    links_camera = table_name in CAMERA_CHILDREN
+    key_columns = (['hardware_id'] if links_hardware else []) + (['camera_id'] if links_camera else [])
+    insert_columns = key_columns + [col for col, _ in columns]
+    column_list = ", ".join(f'"{col}"' for col in insert_columns)
+    insert = f'INSERT INTO "{table_name}" ({column_list}) VALUES ({", ".join("?" * len(insert_columns))})'
+
+    # The natural keys are read alongside the copied columns
+    select_list = ['"hardware"' if links_hardware else 'NULL', '"camera"' if links_camera else 'NULL']
+    select_list += [(expression or '{col}').format(col=f'"{col}"') for col, expression in columns]
+
+    written = 0
+    unmatched = []
+    part = sqlite3.connect(sheet["part_path"])
+    try:
+        rows = part.execute(f'SELECT {", ".join(select_list)} FROM "{table_name}"')
+        while True:
+            batch = rows.fetchmany(batch_size)
+            if not batch:
+                break
+            values = []
+            for hardware, camera, *copied in batch:
+                linked = []
+                if links_hardware:
+                    hardware_id = hardware_ids.get(hardware)
+                    if hardware_id is None:
+                        unmatched.append(('hardware', hardware))
+                        continue
+                    linked.append(hardware_id)
+                if links_camera:
+                    camera_id = camera_ids.get((hardware, camera))
+                    if camera_id is None and CAMERA_CHILDREN[table_name]:
+                        unmatched.append(('camera', camera))
+                        continue
+                    linked.append(camera_id)
+                values.append(linked + copied)
+            conn.executemany(insert, values)
+            written += len(values)
+    finally:
+        part.close()
+    if unmatched:
+        kind, name = unmatched[0]
+        raise sqlite3.IntegrityError(f"{len(unmatched)} row(s) of '{table_name}' refer to unknown "
+                                     f"{kind}s, e.g. '{name}'")
+
+    if table_name == 'hardware':
+        hardware_ids.update(conn.execute('SELECT "name", "hardware_id" FROM "hardware"').fetchall())
+    elif table_name == 'cameras':
+        names = {hardware_id: name for name, hardware_id in hardware_ids.items()}
+        for camera_id, hardware_id, name in conn.execute('SELECT "camera_id", "hardware_id", "name" FROM "cameras"'):
+            camera_ids[(names[hardware_id], name)] = camera_id
+    for key in key_columns:
+        conn.execute(f'CREATE INDEX "idx_{table_name}_{key}" ON "{table_name}" ("{key}")')
+    return written
+
+def create_database(excel_path=EXCEL_PATH, db_path=DB_PATH):
+    """Build the linked schema from the workbook into a shadow file and swap it in for db_path.
+
+    Hardware and cameras get integer surrogate keys, every table that names
+    a device or camera gets foreign keys to them in place of the free-text
+    names, and all tables are STRICT so flags and numbers have one type.
+    """
+    build_path = f"{db_path}.build-{os.getpid()}"
+    remove_database_file(build_path)
     try:
-        # Read all sheets from Excel file
-        excel_file = pd.ExcelFile(EXCEL_PATH)
-        
-        # Create tables for each sheet
-        for sheet_name in excel_file.sheet_names:
-            # Read the sheet
-            df = pd.read_excel(excel_file, sheet_name=sheet_name)
-            
-            # Clean column names (remove spaces, special characters)
-            df.columns = [col.strip().replace(' ', '_').replace('(', '').replace(')', '') for col in df.columns]
-            
-            # Create table in SQLite
-            df.to_sql(sheet_name, conn, if_exists='replace', index=False)
-            print(f"Created table: {sheet_name}")
-            
+        sheets = {sheet["table_name"]: sheet for sheet in parse_workbook(excel_path, build_path)}
+        conn = sqlite3.connect(build_path, isolation_level=None)
+        conn.execute("PRAGMA foreign_keys=ON")
+        conn.execute("BEGIN")
+
+        # Parents before the tables that refer to them
+        order = [name for name in ('hardware', 'cameras') if name in sheets]
+        order += [name for name in sheets if name not in order]
+        hardware_ids, camera_ids = {}, {}
+        for table_name in order:
+            sheet = sheets[table_name]
+            if (table_name in HARDWARE_CHILDREN or table_name in CAMERA_CHILDREN) and 'hardware' not in sheets:
+                raise ValueError(f"Sheet for '{table_name}' needs the Hardware sheet to link to")
+            row_count = load_linked_table(conn, sheet, hardware_ids, camera_ids)
+            print(f"Created table: {table_name} ({row_count} rows)")
+
             # Print the schema
             cursor = conn.cursor()
-            cursor.execute(f"PRAGMA table_info({sheet_name})")
+            cursor.execute(f'PRAGMA table_info("{table_name}")')
             columns = cursor.fetchall()
             print("Columns:")
             for col in columns:
                 print(f"  {col[1]} ({col[2]})")
             print()
-    
+
+        conn.execute("ANALYZE")
+        conn.execute("COMMIT")
+        violations = conn.execute("PRAGMA foreign_key_check").fetchall()
+        if violations:
+            raise sqlite3.IntegrityError(f"Foreign key check failed: {violations[:5]}")
+        result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+        if result != 'ok':
+            raise sqlite3.DatabaseError(f"Integrity check failed: {result}")
+        conn.close()
+        swap_in(build_path, db_path)
+
     except Exception as e:
         print(f"Error: {str(e)}")
-        conn.close()
+        if 'conn' in locals():
+            conn.close()
+        remove_database_file(build_path)
         return False
-    
+
     finally:
-        conn.close()
-    
+        for part in glob.glob(f"{glob.escape(build_path)}.part-*"):
+            os.remove(part)
+
     return True
 
-def verify_database():
-    conn = sqlite3.connect(DB_PATH)
+def verify_database(db_path=DB_PATH):
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
-    
+
     try:
         # Get all tables
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';")
         tables = cursor.fetchall()
-        
+
         print("\nVerifying database contents:")
         for table in tables:
             table_name = table[0]
-            cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+            cursor.execute(f'SELECT COUNT(*) FROM "{table_name}"')
             count = cursor.fetchone()[0]
             print(f"Table {table_name}: {count} rows")
-            
+
+            # Foreign keys
+            for fk in cursor.execute(f'PRAGMA foreign_key_list("{table_name}")').fetchall():
+                print(f"  {fk[3]} -> {fk[2]}.{fk[4]}")
+
             # Sample data
-            cursor.execute(f"SELECT * FROM {table_name} LIMIT 1")
+            cursor.execute(f'SELECT * FROM "{table_name}" LIMIT 1')
             sample = cursor.fetchone()
             if sample:
                 print("Sample row:")
-                cursor.execute(f"PRAGMA table_info({table_name})")
+                cursor.execute(f'PRAGMA table_info("{table_name}")')
                 columns = [col[1] for col in cursor.fetchall()]
                 for col, val in zip(columns, sample):
                     print(f"  {col}: {val}")
             print()
-    
+
     except Exception as e:
         print(f"Error during verification: {str(e)}")
-    
+
     finally:
         conn.close()
 
 if __name__ == "__main__":
-    print("Creating database from Excel workbook...")
-    if create_database():
+    excel_path = sys.argv[1] if len(sys.argv) > 1 else EXCEL_PATH
+    print("Creating linked database from Excel workbook...")
+    if create_database(excel_path):
         print("\nDatabase created successfully!")
         verify_database()
     else:
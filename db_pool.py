@@ -0,0 +1,104 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from urllib.parse import quote
+from logging_config import setup_logging
+
+logger = setup_logging('app.log')
+
+# Idle connections kept per worker process
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '8'))
+# Page cache per connection in KiB, and bytes of the file to memory-map
+DB_CACHE_KB = int(os.getenv('DB_CACHE_KB', str(16 * 1024)))
+DB_MMAP_SIZE = int(os.getenv('DB_MMAP_SIZE', str(256 * 1024 * 1024)))
+
+
+class ReadOnlyConnectionPool:
+    """Pool of read-only connections to a SQLite database, one pool per worker.
+
+    Connections are opened with ``mode=ro`` and ``query_only`` so generated
+    SQL can never modify the data, and are reused across requests instead of
+    being opened per query. The loader replaces the database file rather than
+    writing to it, so each connection remembers the file it was opened on and
+    is discarded once that file has been swapped out.
+
+    A plain list guarded by a lock works the same for threads and gevent
+    greenlets, which a thread-local would not.
+    """
+
+    def __init__(self, db_path, max_idle=DB_POOL_SIZE, row_factory=None):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self.row_factory = row_factory
+        self._idle = []
+        self._lock = threading.Lock()
+        self._file_ids = {}
+
+    def _file_identity(self):
+        stat = os.stat(self.db_path)
+        return (stat.st_dev, stat.st_ino)
+
+    def _open(self, file_id):
+        uri = f"file:{quote(os.path.abspath(self.db_path))}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.execute("PRAGMA query_only=ON")
+        conn.execute(f"PRAGMA cache_size=-{DB_CACHE_KB}")
+        conn.execute(f"PRAGMA mmap_size={DB_MMAP_SIZE}")
+        if self.row_factory is not None:
+            conn.row_factory = self.row_factory
+        self._file_ids[id(conn)] = file_id
+        return conn
+
+    def _discard(self, conn):
+        self._file_ids.pop(id(conn), None)
+        conn.close()
+
+    def acquire(self):
+        """Take a connection to the current database file from the pool"""
+        file_id = self._file_identity()
+        stale = []
+        conn = None
+        with self._lock:
+            while self._idle:
+                candidate = self._idle.pop()
+                if self._file_ids.get(id(candidate)) == file_id:
+                    conn = candidate
+                    break
+                stale.append(candidate)
+        for old in stale:
+            self._discard(old)
+        if stale:
+            logger.info(f"Database file {self.db_path} was replaced, reopened pooled connections")
+        return conn if conn is not None else self._open(file_id)
+
+    def release(self, conn):
+        """Hand a connection back, closing it if the file was replaced or the pool is full"""
+        try:
+            # Drop any time budget a request left on the connection
+            conn.set_progress_handler(None, 0)
+            if conn.in_transaction:
+                conn.rollback()
+            current = self._file_ids.get(id(conn)) == self._file_identity()
+        except (sqlite3.Error, OSError):
+            current = False
+        with self._lock:
+            if current and len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        self._discard(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        """Close all idle connections"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
@@ -0,0 +1,236 @@
+import datetime
+import multiprocessing
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Rows handed to executemany() at a time while streaming a sheet
+LOADER_BATCH_SIZE = int(os.getenv('LOADER_BATCH_SIZE', '5000'))
+# Processes used to parse sheets; 1 parses them one after another in-process
+LOADER_WORKERS = int(os.getenv('LOADER_WORKERS', str(os.cpu_count() or 1)))
+
+# Declared column types, matching what pandas.to_sql picked for the same data
+SQL_TYPES = {
+    'bool': 'INTEGER',
+    'int': 'INTEGER',
+    'float': 'REAL',
+    'datetime': 'TIMESTAMP',
+    'date': 'DATE',
+    'time': 'TIME',
+    'text': 'TEXT',
+}
+
+
+# Cell text read as missing, true or false by pandas.read_excel's defaults
+NA_STRINGS = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+}
+TRUE_STRINGS = {'True', 'TRUE', 'true'}
+FALSE_STRINGS = {'False', 'FALSE', 'false'}
+INT_RE = re.compile(r'^\s*[-+]?\d+\s*$')
+FLOAT_RE = re.compile(r'^\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?\s*$')
+
+
+def clean_name(name):
+    """Table/column name as created by the loader"""
+    return name.strip().lower().replace(' ', '_').replace('-', '_')
+
+
+def header_names(row):
+    """Column names from the header row, named and de-duplicated like pandas does"""
+    values = list(row)
+    while values and values[-1] is None:
+        values.pop()
+    names = []
+    seen = {}
+    for i, value in enumerate(values):
+        name = f"Unnamed: {i}" if value is None else str(value)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def convert_value(value):
+    """Cell value as stored in SQLite, plus the kind used to pick the column type"""
+    if value is None:
+        return None, None
+    if isinstance(value, bool):
+        return value, 'bool'
+    if isinstance(value, int):
+        return value, 'int'
+    if isinstance(value, float):
+        # Whole numbers come back from Excel as floats
+        if value.is_integer():
+            return int(value), 'int'
+        return value, 'float'
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(' '), 'datetime'
+    if isinstance(value, datetime.date):
+        return value.isoformat(), 'date'
+    if isinstance(value, datetime.time):
+        return value.strftime('%H:%M:%S.%f'), 'time'
+    if isinstance(value, datetime.timedelta):
+        return str(value), 'text'
+    value = str(value)
+    if value in NA_STRINGS:
+        return None, None
+    # Text that pandas would turn into booleans or numbers if the whole
+    # column reads that way
+    if value in TRUE_STRINGS or value in FALSE_STRINGS:
+        return value, 'text_bool'
+    if INT_RE.match(value):
+        return value, 'text_int'
+    if FLOAT_RE.match(value):
+        return value, 'text_float'
+    return value, 'text'
+
+
+def column_type(kinds, has_nulls):
+    """Declared type and copy expression for a column given the kinds of values seen in it"""
+    if not kinds:
+        # All empty: pandas reads these as float NaN
+        return 'REAL', None
+    if kinds <= {'bool', 'text_bool'}:
+        if 'text_bool' in kinds:
+            true_list = ", ".join(f"'{v}'" for v in sorted(TRUE_STRINGS))
+            false_list = ", ".join(f"'{v}'" for v in sorted(FALSE_STRINGS))
+            return 'INTEGER', f"CASE WHEN {{col}} IN ({true_list}) THEN 1 WHEN {{col}} IN ({false_list}) THEN 0 ELSE {{col}} END"
+        return 'INTEGER', None
+    # Numeric text is converted by the column's affinity
+    if kinds <= {'int', 'text_int'}:
+        # Integer columns with gaps become floats in pandas
+        return ('REAL' if has_nulls else 'INTEGER'), None
+    if kinds <= {'int', 'float', 'text_int', 'text_float'}:
+        return 'REAL', None
+    if len(kinds) == 1:
+        return SQL_TYPES.get(next(iter(kinds)), 'TEXT'), None
+    return 'TEXT', None
+
+
+def write_part(sheet_name, original_columns, rows, part_path, batch_size=LOADER_BATCH_SIZE):
+    """Convert rows of cell values into a sheet's part file and describe the sheet.
+
+    ``rows`` yields tuples of cell values as openpyxl returns them. Rows are
+    written in batches, so memory stays bounded by the batch size rather
+    than the sheet size. Returns a dict describing the sheet: table and
+    column names, declared column types, the kinds of values seen in each
+    column, row count and a few sample rows.
+    """
+    columns = [clean_name(col) for col in original_columns]
+    table_name = clean_name(sheet_name)
+    width = len(columns)
+
+    kinds = [set() for _ in columns]
+    nulls = [False] * width
+    samples = []
+    row_count = 0
+
+    if os.path.exists(part_path):
+        os.remove(part_path)
+    conn = sqlite3.connect(part_path)
+    # Scratch file, thrown away after it is copied into the build
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    column_list = ", ".join(f'"{col}"' for col in columns)
+    conn.execute(f'CREATE TABLE "{table_name}" ({column_list})')
+    insert = f'INSERT INTO "{table_name}" VALUES ({", ".join("?" * width)})'
+
+    batch = []
+    for row in rows:
+        values = list(row[:width]) + [None] * (width - len(row))
+        # pandas skips rows without any value
+        if all(value is None for value in values):
+            continue
+        converted = []
+        for i, value in enumerate(values):
+            value, kind = convert_value(value)
+            if kind is None:
+                nulls[i] = True
+            else:
+                kinds[i].add(kind)
+            converted.append(value)
+        batch.append(converted)
+        if len(samples) < 3:
+            samples.append(converted)
+        if len(batch) >= batch_size:
+            conn.executemany(insert, batch)
+            row_count += len(batch)
+            batch = []
+    if batch:
+        conn.executemany(insert, batch)
+        row_count += len(batch)
+    conn.commit()
+    conn.close()
+
+    return {
+        "sheet_name": sheet_name,
+        "table_name": table_name,
+        "original_columns": original_columns,
+        "columns": columns,
+        "types": [column_type(k, n)[0] for k, n in zip(kinds, nulls)],
+        "expressions": [column_type(k, n)[1] for k, n in zip(kinds, nulls)],
+        "kinds": [sorted(k) for k in kinds],
+        "row_count": row_count,
+        "samples": samples,
+        "part_path": part_path,
+    }
+
+
+def parse_sheet(excel_path, sheet_name, part_path, batch_size=LOADER_BATCH_SIZE):
+    """Stream one sheet into its own SQLite file.
+
+    Rows are read with openpyxl's read-only mode and handed to write_part().
+    """
+    from openpyxl import load_workbook
+
+    started = time.perf_counter()
+    workbook = load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet_name].iter_rows(values_only=True)
+        original_columns = header_names(next(rows, ()))
+        sheet = write_part(sheet_name, original_columns, rows, part_path, batch_size)
+    finally:
+        workbook.close()
+    sheet["parse_seconds"] = time.perf_counter() - started
+    return sheet
+
+
+def sheet_names(excel_path):
+    """Names of the workbook's sheets, in workbook order"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(excel_path, read_only=True)
+    try:
+        return list(workbook.sheetnames)
+    finally:
+        workbook.close()
+
+
+def parse_workbook(excel_path, part_prefix, workers=LOADER_WORKERS):
+    """Parse every sheet into its own part file, several sheets at a time.
+
+    Yields the sheet descriptions from parse_sheet() in workbook order.
+    """
+    names = sheet_names(excel_path)
+    parts = [f"{part_prefix}.part-{i}" for i in range(len(names))]
+    workers = max(1, min(workers, len(names)))
+    if workers == 1:
+        for name, part in zip(names, parts):
+            yield parse_sheet(excel_path, name, part)
+        return
+
+    # fork where available: spawn re-imports __main__ in every child, which
+    # for `python app.py` would start another database build
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = [pool.submit(parse_sheet, excel_path, name, part) for name, part in zip(names, parts)]
+        for future in futures:
+            yield future.result()
@@ -0,0 +1,398 @@
+import argparse
+import datetime
+import hashlib
+import json
+import multiprocessing
+import os
+import random
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from create_db import build_database, build_lock
+from excel_reader import LOADER_WORKERS, write_part
+
+# Rows per worksheet Excel can hold, header included
+XLSX_MAX_ROWS = 1048576
+# Hardware per recording server
+HARDWARE_PER_SERVER = 100
+
+SITES = ['Camp East', 'Camp West', 'Unit 1', 'Unit 2', 'Unit 3', 'Unit 4', 'Unit 5', 'Unit 6',
+         'Intake', 'Medical', 'Kitchen', 'Gym', 'Admin', 'Visiting', 'Laundry', 'Yard']
+AREAS = ['Dayroom', 'Classroom Door', 'Hallway', 'Entrance', 'Sallyport', 'Control', 'Recreation',
+         'Stairwell', 'Fence Line', 'Lobby']
+
+# model -> (weight, channels, vendor, ptz, related device types)
+MODELS = {
+    'Pelco IME229': (60, 1, 'Pelco', False, []),
+    'Pelco IMM12027': (17, 4, 'Pelco', False, []),
+    'Pelco Spectra Enhanced 7': (4, 1, 'Pelco', True, []),
+    'AXIS P3247-LVE Network Camera': (6, 1, 'Axis', False, ['Metadata', 'Microphone', 'Speaker']),
+    'AXIS M3058-PLVE Fixed Dome Network Camera': (3, 4, 'Axis', False, ['Metadata']),
+    'AXIS P3717-PLE Network Camera': (3, 4, 'Axis', False, []),
+    'AXIS P3807-PVE Network Camera': (3, 1, 'Axis', False, ['Metadata', 'Microphone']),
+    'Oncam Grandeye EVO-12NxD': (2, 1, 'Oncam', False, []),
+    'pelco IMP331-1ERS': (2, 1, 'Pelco', False, []),
+}
+VENDORS = {
+    # vendor -> (MAC prefix, serial prefix, firmware, driver number, driver group)
+    'Pelco': ('00047D', 'K', '2.10.0.13.8360-A0.0', 407, 'ONVIF'),
+    'Axis': ('B8A44F', 'ACCC', '10.12.114', 806, 'Axis'),
+    'Oncam': ('001A3E', 'T0', 'Version V4.2/055(160711)', 407, 'ONVIF'),
+}
+DRIVER_VERSION = 'DevicePack: 11.7a, Device Pack, Build: 11.7a.34'
+PASSWORDS = ['1234'] * 12 + ['pass', 'root']
+PRIVACY_MASK_XML = '<privacymask><region x="0" y="0" width="0.25" height="0.25" /></privacymask>'
+
+EVENT_NAMES = [
+    'Motion Started (HW)', 'Motion Stopped (HW)', 'Tampering', 'Loitering detection event started',
+    'Loitering detection event stopped', 'Intrusion started', 'Intrusion stopped',
+    'Temperature Detection Started', 'Temperature Detection Stopped', 'Abandoned object event started',
+    'Abandoned object event stopped', 'Auto tracker event started', 'Auto tracker event stopped',
+    'Object counting event started', 'Object removal event started', 'Object removal event stopped',
+    'Video Loss', 'Video Resumed', 'Brute Force Attack', 'Crowd Detection Falling event',
+    'Crowd Detection Rising event', 'Cyber Attack', 'Defocus Start', 'Defocus Stop', 'Face Appearing',
+    'Face Disappearing', 'Fire Detection Started event', 'Fire Detection Stopped event',
+    'IP conflict start event', 'IP conflict stop event', 'Illegal Access', 'Line cross started',
+    'Quarantine', 'Recordings Available Event', 'Running Detection Falling event',
+    'Running Detection Rising event', 'SD Card Error', 'SD Card Mounted', 'SD Card Removed',
+    'Scene Change Stop', 'Scene change', 'Tampering Started', 'Tampering Stopped', 'Status', 'Action failed',
+]
+# Events per camera in the production export
+DEFAULT_EVENTS_PER_CAMERA = 35
+
+# Columns of each sheet, as in hardware_data.xlsx
+SHEET_COLUMNS = {
+    'Hardware': ['Name', 'Address', 'UserName', 'Password', 'Enabled', 'Description', 'Model', 'MACAddress',
+                 'SerialNumber', 'FirmwareVersion', 'DriverNumber', 'DriverGroup', 'DriverDriverType',
+                 'DriverVersion', 'DriverRevision', 'RecordingServer', 'PasswordLastModified', 'LastModified', 'Id'],
+    'HardwareGeneralSettings': ['RecordingServer', 'Hardware', 'Setting', 'Value', 'DisplayValue', 'ReadOnly'],
+    'HardwarePtzSettings': ['RecordingServer', 'Hardware', 'Camera', 'Channel', 'PTZEnabled', 'PTZDeviceID',
+                            'PTZCOMPort', 'PTZProtocol'],
+    'Cameras': ['Name', 'ShortName', 'Enabled', 'Channel', 'Address', 'Hardware', 'RecordingServer', 'Coordinates',
+                'CoverageDepth', 'CoverageDirection', 'CoverageFieldOfView', 'Description', 'EdgeStorageEnabled',
+                'EdgeStoragePlaybackEnabled', 'Shortcut', 'MulticastEnabled', 'ManualRecordingTimeoutEnabled',
+                'ManualRecordingTimeoutMinutes', 'ManualPTZTimeout', 'PausePatrollingTimeout',
+                'ReservedPTZTimeout', 'PrebufferEnabled', 'PrebufferInMemory', 'PrebufferSeconds',
+                'RecordingEnabled', 'RecordingFramerate', 'PrivacyMaskEnabled', 'PrivacyMaskXml', 'Storage',
+                'RecordKeyframesOnly', 'RecordOnRelatedDevices', 'MotionEnabled', 'MotionManualSensitivityEnabled',
+                'MotionManualSensitivity', 'MotionThreshold', 'MotionKeyframesOnly', 'MotionProcessTime',
+                'MotionDetectionMethod', 'MotionGenerateMotionMetadata', 'MotionUseExcludeRegions',
+                'MotionGridSize', 'MotionExcludeRegions', 'MotionHardwareAccelerationMode', 'LastModified', 'Id'],
+    'CameraGeneralSettings': ['RecordingServer', 'Hardware', 'Camera', 'Channel', 'Setting', 'Value',
+                              'DisplayValue', 'ReadOnly'],
+    'CameraStreams': ['RecordingServer', 'Hardware', 'Camera', 'Channel', 'Name', 'DisplayName', 'LiveMode',
+                      'LiveDefault', 'PlaybackDefault', 'RecordingTrack', 'UseEdge'],
+    'CameraStreamSettings': ['RecordingServer', 'Hardware', 'Camera', 'Channel', 'Stream', 'Setting', 'Value',
+                             'DisplayValue'],
+    'CameraRelatedDevices': ['RecordingServer', 'Hardware', 'Camera', 'Channel', 'RelatedDeviceType',
+                             'RelatedRecordingServerName', 'RelatedRecordingServerHostName', 'RelatedHardwareName',
+                             'RelatedHardwareAddress', 'RelatedDeviceName', 'RelatedDeviceChannel', 'Shortcut',
+                             'MulticastEnabled'],
+    'CameraEvents': ['RecordingServer', 'Hardware', 'Camera', 'EventName', 'Used', 'Enabled', 'EventIndex',
+                     'IndexName'],
+    'CameraGroups': ['RecordingServer', 'Hardware', 'Camera', 'Group'],
+}
+
+EXPORT_TIME = datetime.datetime(2022, 12, 22, 14, 43, 38)
+
+
+def parse_count(text):
+    """Camera count from the command line: 5000, 1k, 100k, 1M"""
+    text = str(text).strip().lower()
+    multiplier = {'k': 1000, 'm': 1000 * 1000}.get(text[-1:], 1)
+    return int(float(text[:-1] if multiplier > 1 else text) * multiplier)
+
+
+def devices(cameras, seed=42):
+    """Hardware with their cameras, covering exactly ``cameras`` cameras.
+
+    Deterministic for a seed: every sheet walks this sequence again, so the
+    names one sheet refers to are the ones the others define. Values that
+    differ per device are drawn here; the sheets derive the rest from the
+    device and camera numbers.
+    """
+    rng = random.Random(seed)
+    names = list(MODELS)
+    weights = [MODELS[name][0] for name in names]
+    h = camera_number = 0
+    while camera_number < cameras:
+        model = rng.choices(names, weights)[0]
+        _, channels, vendor, ptz, related = MODELS[model]
+        channels = min(channels, cameras - camera_number)
+        site, area = SITES[h % len(SITES)], AREAS[(h // len(SITES)) % len(AREAS)]
+        ip = f"10.{101 + h // 65024}.{(h // 254) % 256}.{h % 254 + 1}"
+        number = h + 100
+        name = f"{site} {area} {number} ({ip})"
+        device = {
+            "index": h,
+            "name": name,
+            "ip": ip,
+            "address": f"http://{ip}/",
+            "model": model,
+            "vendor": vendor,
+            "ptz": ptz,
+            "related": related,
+            "site": site,
+            "server": f"NVR-{h // HARDWARE_PER_SERVER + 1}",
+            "id": str(uuid.UUID(int=rng.getrandbits(128))).upper(),
+            "cameras": [],
+        }
+        for channel in range(1, channels + 1):
+            device["cameras"].append({
+                "index": camera_number,
+                "name": f"{site} {area} {number}" if channels == 1 else f"{site} {area} {number} - Camera {channel}",
+                "channel": channel,
+                "framerate": rng.choice([5, 5, 10, 15, 30]),
+                "threshold": rng.randint(100, 300),
+                "id": str(uuid.UUID(int=rng.getrandbits(128))).upper(),
+            })
+            camera_number += 1
+        yield device
+        h += 1
+
+
+def hardware_rows(device):
+    vendor = VENDORS[device["vendor"]]
+    h = device["index"]
+    yield [device["name"], device["address"], 'admin', PASSWORDS[h % len(PASSWORDS)], h % 40 != 0, '', device["model"],
+           f"{vendor[0]}{h:06X}", f"{vendor[1]}{h:06d}", vendor[2], vendor[3], vendor[4], 'DevicePack',
+           DRIVER_VERSION, 1.91, device["server"], datetime.time(0, 0),
+           EXPORT_TIME + datetime.timedelta(seconds=h), device["id"]]
+
+
+def hardware_general_settings_rows(device):
+    vendor = VENDORS[device["vendor"]]
+    h = device["index"]
+    product = 'ONVIF Conformant Device (2-16 channels)' if vendor[4] == 'ONVIF' else None
+    settings = [
+        ('SerialNumber', f"{vendor[1]}{h:06d}", True), ('ProductID', device["vendor"], True, product),
+        ('MacAddress', f"{vendor[0]}{h:06X}", True), ('FirmwareVersion', vendor[2], True),
+        ('PasswordChangeSupported', 'Yes', True), ('PasswordChangeMinLength', '1', True),
+        ('PasswordChangeMaxLength', '64', True), ('FirmwareUpgradeSupported', 'Yes', True),
+        ('DetectedModelName', device["model"], True), ('HTTPSPort', '443', False),
+        ('HTTPSEnabled', 'No' if h % 3 else 'Yes', False), ('HTTPSValidateHostname', 'No', False),
+        ('HTTPSValidateCertificate', 'No', False), ('VSCOrder', '0,1,2,3,4', False),
+        ('UserHandlingSupported', 'Yes', True), ('NetworkSettingsManagementSupported', 'Yes', True),
+        ('MediaService', '2', False, 'Media2'),
+    ]
+    for setting, value, read_only, *display in settings:
+        yield [device["server"], device["name"], setting, value, display[0] if display else None, read_only]
+
+
+def hardware_ptz_settings_rows(device):
+    for camera in device["cameras"]:
+        yield [device["server"], device["name"], camera["name"], camera["channel"] - 1,
+               'true' if device["ptz"] else 'false', 1, 1, 0]
+
+
+def camera_rows(device):
+    for camera in device["cameras"]:
+        c = camera["index"]
+        ptz_timeout = 15 if device["ptz"] else None
+        yield [camera["name"], '', c % 50 != 0, camera["channel"], device["address"], device["name"],
+               device["server"], 'Unknown', 0, 0, 0, '', c % 20 == 0, c % 20 == 0,
+               float(device["index"] * 100 + camera["channel"]) if c % 5 < 3 else None, c % 13 == 0, True, 5,
+               ptz_timeout, ptz_timeout, ptz_timeout, True, True, 3, c % 17 != 0, camera["framerate"],
+               c % 100 == 0, PRIVACY_MASK_XML if c % 100 == 0 else None,
+               'Local default' if c % 4 else 'Archive 1', False, True, c % 9 != 0, False, 100,
+               camera["threshold"], True, 'Ms500', 'Fast', True, False, 'Grid16X16', '0' * 256, 'Off',
+               EXPORT_TIME + datetime.timedelta(seconds=device["index"]), camera["id"]]
+
+
+def camera_general_settings_rows(device):
+    for camera in device["cameras"]:
+        c = camera["index"]
+        osd = 'LowerLeft' if c % 3 else 'Disabled'
+        # The Axis driver leaves the channel of these settings empty
+        channel = None if device["vendor"] == 'Axis' else camera["channel"]
+        settings = [
+            ('EdgeStorageEnabled', 'True' if c % 20 == 0 else 'False'), ('EdgeStorageStreamIndex', '0'),
+            ('Brightness', str(50 + c % 3)), ('Contrast', str(25 + (c * 7) % 36)), ('Sharpness', str(50 + c % 11)),
+        ]
+        if device["model"] == 'Pelco IME229':
+            # The Pelco driver exposes recorder, multicast and image settings per camera
+            settings += [
+                ('OSDDateTime', osd, 'Down Left' if osd == 'LowerLeft' else None),
+                ('BlackAndWhiteMode', 'Yes', 'Color'), ('EdgeStorageRecording', 'Continuous'),
+                ('MulticastAddress', f"239.{193 + c % 56}.{c // 256 % 256}.{c % 256}"),
+                ('MulticastForceSSM', 'no'), ('MulticastTTL', '5'), ('MulticastVideoPort', '0'),
+                ('OSDDateTimePosX', '50'), ('OSDDateTimePosY', '50'), ('RecorderRetentionTime', '336'),
+                ('RecorderStreamIndex', '1' if c % 6 else 'Disabled'), ('WhiteBalanceCbGain', '50'),
+                ('WhiteBalanceCrGain', '50'), ('WhiteBalanceMode', 'Auto'), ('MirrorImage', 'No'), ('Rotation', '0'),
+            ]
+        else:
+            settings += [('ColorSaturation', '50'), ('PTZZoomStep', '10'), ('OSDDateTime', osd)]
+        for setting, value, *display in settings:
+            yield [device["server"], device["name"], camera["name"], channel, setting, value,
+                   display[0] if display else None, False]
+
+
+def camera_streams_rows(device):
+    for camera in device["cameras"]:
+        yield [device["server"], device["name"], camera["name"], camera["channel"], 'Video stream 01',
+               'Video stream 01', 'Always' if camera["index"] % 8 == 0 else 'WhenNeeded', True, True, 'Primary',
+               False]
+
+
+def camera_stream_settings_rows(device):
+    for camera in device["cameras"]:
+        c = camera["index"]
+        settings = [
+            ('FPS', str(camera["framerate"])), ('Resolution', ['1920x1080', '2560x1440', '1280x720'][c % 3]),
+            ('MaxGOPSize', '30'), ('MaxGOPMode', 'default'), ('EdgeStorageSupported', 'True' if c % 2 else 'False'),
+            ('Codec', 'h264'), ('Quality', str(30 + c % 50)), ('Protocol', '2'),
+            ('ProfileName', f"profile_{camera['channel']}"), ('KeepAliveMethod', '0'),
+            ('Bitrate', str(2000 + (c % 9) * 1000)), ('MulticastTTL', '10'), ('MulticastPort', str(2000 + c % 60000)),
+            ('MulticastForceSSM', 'no'), ('MulticastAddress', f"239.{101 + c // 65024 % 150}.{c // 254 % 256}.{c % 254 + 1}"),
+            ('StreamingMode', 'UDP' if c % 2 else 'HTTP'),
+        ]
+        for setting, value in settings:
+            yield [device["server"], device["name"], camera["name"], camera["channel"], 'Video stream 01', setting,
+                   value, None]
+
+
+def camera_related_devices_rows(device):
+    for device_type in device["related"]:
+        for camera in device["cameras"][:1]:
+            yield [device["server"], device["name"], camera["name"], 0, device_type, device["server"],
+                   f"10.101.113.{device['index'] // HARDWARE_PER_SERVER % 254 + 1}", device["name"],
+                   device["address"], f"{device['model']} ({device['ip']}) - {device_type} 1", 0, 0, False]
+
+
+def camera_events_rows(device, events_per_camera=DEFAULT_EVENTS_PER_CAMERA):
+    for camera in device["cameras"]:
+        c = camera["index"]
+        for j in range(events_per_camera):
+            used = (c + j) % 11 == 0
+            yield [device["server"], device["name"], camera["name"], EVENT_NAMES[j % len(EVENT_NAMES)],
+                   used, used, None, None]
+
+
+def camera_groups_rows(device):
+    for camera in device["cameras"]:
+        yield [device["server"], device["name"], camera["name"], '/All Cameras']
+        yield [device["server"], device["name"], camera["name"], f"/{device['site']}"]
+        if device["model"] == 'Pelco IMM12027':
+            yield [device["server"], device["name"], camera["name"], '/Pelco 270']
+
+
+SHEET_ROWS = {
+    'Hardware': hardware_rows,
+    'HardwareGeneralSettings': hardware_general_settings_rows,
+    'HardwarePtzSettings': hardware_ptz_settings_rows,
+    'Cameras': camera_rows,
+    'CameraGeneralSettings': camera_general_settings_rows,
+    'CameraStreams': camera_streams_rows,
+    'CameraStreamSettings': camera_stream_settings_rows,
+    'CameraRelatedDevices': camera_related_devices_rows,
+    'CameraEvents': camera_events_rows,
+    'CameraGroups': camera_groups_rows,
+}
+
+
+def sheet_rows(sheet_name, cameras, seed=42, events_per_camera=DEFAULT_EVENTS_PER_CAMERA):
+    """Rows of one sheet, without the header"""
+    make_rows = SHEET_ROWS[sheet_name]
+    for device in devices(cameras, seed):
+        if sheet_name == 'CameraEvents':
+            yield from make_rows(device, events_per_camera)
+        else:
+            yield from make_rows(device)
+
+
+def too_many_rows(detail):
+    return (f"{detail}, but an xlsx sheet holds at most {XLSX_MAX_ROWS - 1:,}; "
+            f"use --format sqlite or fewer --events-per-camera")
+
+
+def write_xlsx(path, cameras, seed=42, events_per_camera=DEFAULT_EVENTS_PER_CAMERA):
+    """Write the workbook sheet by sheet with openpyxl's write-only mode; returns {sheet: rows}"""
+    from openpyxl import Workbook
+
+    # CameraEvents and the settings sheets grow fastest; fail before writing anything
+    largest = cameras * max(events_per_camera, 16)
+    if largest >= XLSX_MAX_ROWS:
+        raise ValueError(too_many_rows(f"{cameras:,} cameras need sheets of about {largest:,} rows"))
+    workbook = Workbook(write_only=True)
+    counts = {}
+    for sheet_name, columns in SHEET_COLUMNS.items():
+        worksheet = workbook.create_sheet(sheet_name)
+        worksheet.append(columns)
+        count = 0
+        for row in sheet_rows(sheet_name, cameras, seed, events_per_camera):
+            count += 1
+            if count >= XLSX_MAX_ROWS:
+                raise ValueError(too_many_rows(f"{sheet_name} needs more rows"))
+            worksheet.append(row)
+        counts[sheet_name] = count
+        print(f"  {sheet_name}: {count:,} rows")
+    workbook.save(path)
+    return counts
+
+
+def generate_part(sheet_name, part_path, cameras, seed, events_per_camera):
+    """Generate one sheet straight into a loader part file"""
+    started = time.perf_counter()
+    sheet = write_part(sheet_name, SHEET_COLUMNS[sheet_name],
+                       sheet_rows(sheet_name, cameras, seed, events_per_camera), part_path)
+    sheet["parse_seconds"] = time.perf_counter() - started
+    return sheet
+
+
+def generated_sheets(part_prefix, cameras, seed=42, events_per_camera=DEFAULT_EVENTS_PER_CAMERA,
+                     workers=LOADER_WORKERS):
+    """Sheet descriptions for build_database(), generated several sheets at a time"""
+    names = list(SHEET_COLUMNS)
+    parts = [f"{part_prefix}.part-{i}" for i in range(len(names))]
+    workers = max(1, min(workers, len(names)))
+    if workers == 1:
+        for name, part in zip(names, parts):
+            yield generate_part(name, part, cameras, seed, events_per_camera)
+        return
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in methods else 'spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = [pool.submit(generate_part, name, part, cameras, seed, events_per_camera)
+                   for name, part in zip(names, parts)]
+        for future in futures:
+            yield future.result()
+
+
+def write_sqlite(path, cameras, seed=42, events_per_camera=DEFAULT_EVENTS_PER_CAMERA):
+    """Build a database like create_and_load_database() would from the generated workbook.
+
+    The rows go through the loader's own typing, tables, indexes, name
+    search and pivots, without the detour through an xlsx file.
+    """
+    spec = {"synthetic": True, "cameras": cameras, "seed": seed, "events_per_camera": events_per_camera}
+    spec_sha256 = hashlib.sha256(json.dumps(spec, sort_keys=True).encode()).hexdigest()
+    with build_lock(path):
+        return build_database(None, path, spec_sha256,
+                              read_sheets=lambda prefix: generated_sheets(prefix, cameras, seed, events_per_camera))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a hardware_data.xlsx-shaped workbook or database for scale testing")
+    parser.add_argument('--cameras', default='1k', help="number of cameras, e.g. 1k, 100k, 1M")
+    parser.add_argument('--format', choices=['xlsx', 'sqlite'], default='xlsx')
+    parser.add_argument('--output', help="file to write (default synthetic_<cameras>.xlsx or .db)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--events-per-camera', type=int, default=DEFAULT_EVENTS_PER_CAMERA)
+    args = parser.parse_args()
+
+    cameras = parse_count(args.cameras)
+    output = args.output or f"synthetic_{args.cameras}.{'xlsx' if args.format == 'xlsx' else 'db'}"
+    started = time.perf_counter()
+    print(f"Generating {cameras:,} cameras into {output} ({args.format})...")
+    if args.format == 'xlsx':
+        try:
+            write_xlsx(output, cameras, args.seed, args.events_per_camera)
+        except ValueError as e:
+            raise SystemExit(str(e))
+    elif not write_sqlite(output, cameras, args.seed, args.events_per_camera):
+        raise SystemExit(f"Could not build {output}")
+    print(f"Done in {time.perf_counter() - started:.1f}s: {output} ({os.path.getsize(output):,} bytes)")
+
+
+if __name__ == "__main__":
+    main()
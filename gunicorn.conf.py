@@ -1,4 +1,5 @@
 # Gunicorn configuration file
+import importlib.util
 import os
 
 # Get port from environment variable
@@ -8,7 +9,21 @@ port = os.getenv("PORT", "10000")
 bind = f"0.0.0.0:{port}"
 
 # Number of worker processes
-workers = 4
+workers = int(os.getenv("GUNICORN_WORKERS", "4"))
+
+# Worker class. Requests spend most of their time waiting on the OpenAI API,
+# so the default gevent worker keeps up to worker_connections of them in
+# flight per process while still serving / and cached queries. gthread is
+# the fallback when gevent is not installed; "sync" restores one request
+# per worker.
+default_worker_class = "gevent" if importlib.util.find_spec("gevent") else "gthread"
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", default_worker_class)
+
+# Concurrent requests per gevent worker
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "1000"))
+
+# Threads per gthread worker
+threads = int(os.getenv("GUNICORN_THREADS", "32"))
 
 # Timeout in seconds
 timeout = 120
@@ -1,6 +1,7 @@
 bind = "0.0.0.0:10000"
 workers = 2
-worker_class = "sync"
+worker_class = "gevent"
+worker_connections = 1000
 timeout = 120
 accesslog = "-"
 errorlog = "-"
@@ -6,6 +6,7 @@ import json
 import os
 from dotenv import load_dotenv
 import pandas as pd
+from db_pool import ReadOnlyConnectionPool
 
 # Load environment variables
 load_dotenv()
@@ -44,10 +45,15 @@ def init_db():
         conn.commit()
         conn.close()
 
+# Read-only connections reused across requests, reopened when hardware.db is replaced
+db_pool = ReadOnlyConnectionPool(DATABASE_PATH, row_factory=sqlite3.Row)
+
 def get_db_connection():
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Get a pooled read-only connection; hand it back with release_db_connection()"""
+    return db_pool.acquire()
+
+def release_db_connection(conn):
+    db_pool.release(conn)
 
 def get_table_schema():
     """Get the schema of all tables in the database"""
@@ -55,7 +61,9 @@ def get_table_schema():
     cursor = conn.cursor()
     
     schema = {}
-    cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
+    # Skip SQLite's own tables and the loader's bookkeeping (_build_meta)
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' "
+                   "AND name NOT LIKE 'sqlite\\_%' ESCAPE '\\' AND name NOT LIKE '\\_%' ESCAPE '\\';")
     tables = cursor.fetchall()
     
     for table in tables:
@@ -64,7 +72,7 @@ def get_table_schema():
         columns = cursor.fetchall()
         schema[table_name] = [col[1] for col in columns]
     
-    conn.close()
+    release_db_connection(conn)
     return schema
 
 def process_natural_language_query(query):
@@ -96,11 +104,13 @@ Important notes:
         sql_query = response.choices[0].message.content.strip()
         
         conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(sql_query)
-        columns = [description[0] for description in cursor.description]
-        results = cursor.fetchall()
-        conn.close()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(sql_query)
+            columns = [description[0] for description in cursor.description]
+            results = cursor.fetchall()
+        finally:
+            release_db_connection(conn)
         
         formatted_results = []
         for row in results:
@@ -0,0 +1,81 @@
+import re
+
+# The device or site a template question is about. A clause word after it
+# ("cameras in Camp East with motion enabled") adds a condition the
+# template's SQL does not have, so such questions go to the model instead.
+CLAUSE_WORDS = ['with', 'without', 'that', 'where', 'and', 'or', 'which', 'whose', 'who', 'having',
+                'but', 'except', 'excluding', 'not', 'when', 'while', 'sorted', 'ordered', 'grouped']
+ENTITY = r"(?P<entity>(?:(?!\b(?:" + "|".join(CLAUSE_WORDS) + r")\b).)+)"
+
+# Canonical question shapes from the prompt examples, answered without the
+# model. Each template lists the columns it needs so it is skipped when the
+# loaded workbook has a different layout.
+TEMPLATES = [
+    {
+        "name": "device_ip",
+        "pattern": re.compile(
+            r"^(?:what(?:'s|\s+is)\s+)?(?:the\s+)?ip(?:\s+address)?\s+(?:of|for)\s+" + ENTITY + "$",
+            re.IGNORECASE
+        ),
+        "sql": "SELECT REPLACE(REPLACE(Address, 'http://', ''), '/', '') as IP "
+               "FROM Hardware WHERE Name LIKE ? ESCAPE '\\'",
+        "requires": {"hardware": ["name", "address"]},
+    },
+    {
+        "name": "device_firmware",
+        "pattern": re.compile(
+            r"^(?:what(?:'s|\s+is)\s+)?(?:the\s+)?firmware(?:\s+version)?\s+(?:of|for|on)\s+" + ENTITY + "$",
+            re.IGNORECASE
+        ),
+        "sql": "SELECT FirmwareVersion FROM Hardware WHERE Name LIKE ? ESCAPE '\\'",
+        "requires": {"hardware": ["name", "firmwareversion"]},
+    },
+    {
+        "name": "site_cameras",
+        "pattern": re.compile(
+            r"^(?:(?:show|give)(?:\s+me)?\s+|list\s+|get\s+|display\s+|what\s+are\s+)?(?:all\s+)?(?:of\s+)?(?:the\s+)?"
+            r"cameras\s+(?:in|at|on|for|from)\s+" + ENTITY + "$",
+            re.IGNORECASE
+        ),
+        "sql": "SELECT c.Name, c.Channel FROM Cameras c WHERE c.Hardware LIKE ? ESCAPE '\\' ORDER BY c.Channel",
+        "requires": {"cameras": ["name", "channel", "hardware"]},
+    },
+]
+
+
+def _like_prefix(entity):
+    """Bind value matching names that start with the entity"""
+    escaped = entity.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"{escaped}%"
+
+
+def _supported(template, schema):
+    columns = {table.lower(): {c.lower() for c in cols} for table, cols in schema.items()}
+    return all(
+        table in columns and set(required) <= columns[table]
+        for table, required in template["requires"].items()
+    )
+
+
+def match_template(question, schema):
+    """Match a question against the canonical templates.
+
+    Returns a dict with ``name``, ``sql`` and bound ``params``, or None when
+    the question has to go to the model.
+    """
+    text = re.sub(r'\s+', ' ', question).strip().rstrip('?.! ')
+    for template in TEMPLATES:
+        match = template["pattern"].match(text)
+        if not match:
+            continue
+        entity = match.group("entity").strip().strip('"\'')
+        if entity.lower().startswith("the "):
+            entity = entity[4:]
+        if not entity or not _supported(template, schema):
+            continue
+        return {
+            "name": template["name"],
+            "sql": template["sql"],
+            "params": (_like_prefix(entity),),
+        }
+    return None
@@ -1,6 +1,9 @@
 from flask import Flask
 from models import db, Workbook, Sheet, Column, Row, Cell
+from query_data import materialize_wide_tables
+from sqlalchemy import func, insert, select
 import pandas as pd
+import time
 from pathlib import Path
 
 # Create Flask app
@@ -11,14 +14,18 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 # Initialize database
 db.init_app(app)
 
-def load_excel_to_db(file_path):
+# Cells inserted per executemany() call by the bulk loader
+BULK_BATCH_SIZE = 50000
+
+def load_excel_to_db(file_path, flask_app=app):
     """
-    Load an Excel file into the database
+    Load an Excel file into the database, one ORM object per row and cell
     
     Args:
         file_path (str): Path to the Excel file
+        flask_app (Flask): App whose database to load into
     """
-    with app.app_context():
+    with flask_app.app_context():
         # Create database tables if they don't exist
         db.create_all()
         
@@ -88,7 +95,95 @@ def load_excel_to_db(file_path):
             print(f"Error loading workbook: {str(e)}")
             return False
 
+def next_id(model):
+    """First free primary key of a model's table"""
+    return (db.session.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+def column_values(series):
+    """A column's values as stored in cells: text, or None for missing values"""
+    return [str(value) if pd.notna(value) else None for value in series.tolist()]
+
+def bulk_load_excel_to_db(file_path, flask_app=app, batch_size=BULK_BATCH_SIZE):
+    """
+    Load an Excel file into the database with bulk inserts
+    
+    Produces the same workbook/sheet/column/row/cell records as
+    load_excel_to_db(), but assigns the ids up front instead of flushing
+    each new object to learn its id, and writes rows and cells with Core
+    executemany() inserts of batch_size records, one transaction per sheet.
+    
+    Args:
+        file_path (str): Path to the Excel file
+        flask_app (Flask): App whose database to load into
+        batch_size (int): Records per executemany() call
+    """
+    with flask_app.app_context():
+        db.create_all()
+        
+        try:
+            excel_file = pd.ExcelFile(file_path)
+            workbook_name = Path(file_path).name
+            
+            print(f"Bulk loading workbook: {workbook_name}")
+            started = time.perf_counter()
+            
+            workbook = Workbook(name=workbook_name)
+            db.session.add(workbook)
+            db.session.flush()
+            
+            for sheet_name in excel_file.sheet_names:
+                df = pd.read_excel(excel_file, sheet_name)
+                
+                sheet = Sheet(name=sheet_name, workbook_id=workbook.id)
+                db.session.add(sheet)
+                db.session.flush()
+                
+                # Columns are few; ids for the many rows and cells are
+                # handed out locally, continuing from the current maximum
+                column_ids = []
+                for col_name in df.columns:
+                    column = Column(name=col_name, data_type=str(df[col_name].dtype), sheet_id=sheet.id)
+                    db.session.add(column)
+                    db.session.flush()
+                    column_ids.append(column.id)
+                
+                first_row_id = next_id(Row)
+                first_cell_id = next_id(Cell)
+                row_ids = range(first_row_id, first_row_id + len(df))
+                
+                rows = [{"id": row_id, "row_index": row_index, "sheet_id": sheet.id}
+                        for row_id, row_index in zip(row_ids, df.index.tolist())]
+                for start in range(0, len(rows), batch_size):
+                    db.session.execute(insert(Row.__table__), rows[start:start + batch_size])
+                
+                # Cells row by row, in column order, like the ORM loader
+                values = [column_values(df[col_name]) for col_name in df.columns]
+                batch = []
+                cell_id = first_cell_id
+                for position, row_id in enumerate(row_ids):
+                    for column_id, column in zip(column_ids, values):
+                        batch.append({"id": cell_id, "value": column[position],
+                                      "row_id": row_id, "column_id": column_id})
+                        cell_id += 1
+                    if len(batch) >= batch_size:
+                        db.session.execute(insert(Cell.__table__), batch)
+                        batch = []
+                if batch:
+                    db.session.execute(insert(Cell.__table__), batch)
+                
+                db.session.commit()
+                print(f"Processed sheet: {sheet_name} ({len(df)} rows, {cell_id - first_cell_id} cells)")
+            
+            print(f"Excel file successfully loaded into database in {time.perf_counter() - started:.2f}s!")
+            return True
+            
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error loading workbook: {str(e)}")
+            return False
+
 if __name__ == "__main__":
     # Replace this with your Excel file path
     excel_file_path = input("Enter the path to your Excel file: ")
-    load_excel_to_db(excel_file_path)
+    if bulk_load_excel_to_db(excel_file_path):
+        materialize_wide_tables(app)
@@ -1,27 +1,68 @@
+import atexit
 import logging
+import logging.handlers
+import queue
+import random
 import sys
 import os
 
+# Levels for the logger and for each destination (DEBUG, INFO, WARNING, ...)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_FILE_LEVEL = os.getenv('LOG_FILE_LEVEL', LOG_LEVEL).upper()
+LOG_CONSOLE_LEVEL = os.getenv('LOG_CONSOLE_LEVEL', LOG_LEVEL).upper()
+# Row-level dumps (query results, sample rows) are off unless LOG_ROWS is set;
+# then at most LOG_ROW_SAMPLE rows are written for LOG_ROW_SAMPLE_RATE of the results
+LOG_ROWS = os.getenv('LOG_ROWS', 'false').lower() in ('1', 'true', 'yes')
+LOG_ROW_SAMPLE = int(os.getenv('LOG_ROW_SAMPLE', '5'))
+LOG_ROW_SAMPLE_RATE = float(os.getenv('LOG_ROW_SAMPLE_RATE', '1.0'))
+
+_listener = None
+
 def setup_logging(log_file='app.log'):
-    # Create logs directory if it doesn't exist
-    log_dir = 'logs'
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir)
-    
-    log_path = os.path.join(log_dir, log_file)
-    
-    # Configure logging
-    logging.basicConfig(
-        level=logging.DEBUG,
-        format='%(asctime)s [%(levelname)s] %(message)s',
-        handlers=[
-            logging.FileHandler(log_path),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
-    
-    # Create logger
+    """Get the logger, starting the background log writer on first use.
+
+    Records are put on a queue by a QueueHandler and formatted and written to
+    logs/<log_file> and stdout by a QueueListener thread, so request threads
+    never wait on the disk. The first call in a process picks the file.
+    """
+    global _listener
     logger = logging.getLogger(__name__)
-    logger.setLevel(logging.DEBUG)
-    
+    if _listener is None:
+        # Create logs directory if it doesn't exist
+        log_dir = 'logs'
+        if not os.path.exists(log_dir):
+            os.makedirs(log_dir)
+
+        log_path = os.path.join(log_dir, log_file)
+        formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
+        file_handler = logging.FileHandler(log_path)
+        file_handler.setLevel(LOG_FILE_LEVEL)
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setLevel(LOG_CONSOLE_LEVEL)
+        for handler in (file_handler, console_handler):
+            handler.setFormatter(formatter)
+
+        log_queue = queue.SimpleQueue()
+        _listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler,
+                                                   respect_handler_level=True)
+        _listener.start()
+        # Flush what is still queued when the process exits
+        atexit.register(_listener.stop)
+
+        # On the root logger, so library logs go through the queue as well
+        root = logging.getLogger()
+        root.handlers = [logging.handlers.QueueHandler(log_queue)]
+        root.setLevel(LOG_LEVEL)
+    logger.setLevel(LOG_LEVEL)
     return logger
+
+def log_rows(logger, rows, label="  "):
+    """Log a sample of rows at DEBUG level when LOG_ROWS is on"""
+    if not LOG_ROWS or not logger.isEnabledFor(logging.DEBUG):
+        return
+    if LOG_ROW_SAMPLE_RATE < 1 and random.random() >= LOG_ROW_SAMPLE_RATE:
+        return
+    for row in rows[:LOG_ROW_SAMPLE]:
+        logger.debug(f"{label}{row}")
+    if len(rows) > LOG_ROW_SAMPLE:
+        logger.debug(f"{label}... {len(rows) - LOG_ROW_SAMPLE} more rows")
@@ -0,0 +1,195 @@
+import atexit
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from logging_config import setup_logging
+
+logger = setup_logging('app.log')
+
+# Seconds between writes of a worker's metrics to the shared database
+METRICS_FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', '5'))
+# Upper bounds (seconds) of the latency histogram buckets
+METRICS_BUCKETS = [float(b) for b in os.getenv(
+    'METRICS_BUCKETS', '0.001,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30').split(',')]
+
+HELP = {
+    'query_requests_total': 'Requests to /query',
+    'query_duration_seconds': 'Time spent handling /query requests',
+    'query_stage_seconds': 'Time spent in each stage of answering a question',
+    'query_template_hits_total': 'Questions answered by a local SQL template',
+    'query_cache_hits_total': 'Questions answered from the question -> SQL cache',
+    'query_cache_misses_total': 'Questions that needed the model',
+    'llm_errors_total': 'Failed calls to the OpenAI API',
+    'sqlite_errors_total': 'sqlite3 errors raised while running generated SQL',
+    'query_rejected_total': 'Generated SQL refused by the plan cost check',
+}
+
+
+def _label_text(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{value}"' for name, value in pairs) + '}'
+
+
+def _bound_text(bound):
+    return f"{bound:g}"
+
+
+class Metrics:
+    """Counters and latency histograms shared by all gunicorn workers.
+
+    Each worker counts in memory, so observing costs a dict update, and
+    every ``flush_seconds`` writes its totals as one snapshot row to a
+    SQLite side database. render() adds up the snapshots of every worker
+    (including ones that have exited, so counters never go backwards) into
+    the Prometheus text format.
+    """
+
+    def __init__(self, path, flush_seconds=METRICS_FLUSH_SECONDS, buckets=METRICS_BUCKETS):
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self.buckets = sorted(buckets)
+        self._conn = None
+        self._lock = threading.RLock()
+        self._reset()
+        atexit.register(self.flush)
+
+    def _reset(self):
+        # A worker is identified by its pid and start time, so a restarted
+        # worker reusing a pid does not overwrite its predecessor's totals
+        self._pid = os.getpid()
+        self._worker = f"{self._pid}:{time.time():.6f}"
+        self._counters = {}
+        self._histograms = {}
+        self._last_flush = time.monotonic()
+        self._conn = None
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            # Forked after counting: the parent's numbers are not ours
+            self._reset()
+
+    @contextmanager
+    def _connection(self):
+        with self._lock:
+            self._check_fork()
+            if self._conn is None:
+                self._conn = self._open()
+            yield self._conn
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS metric_snapshots (
+                worker TEXT PRIMARY KEY,
+                updated_at REAL NOT NULL,
+                data TEXT NOT NULL
+            )
+        ''')
+        conn.commit()
+        return conn
+
+    def inc(self, name, amount=1, **labels):
+        """Add to a counter"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_fork()
+            self._counters[key] = self._counters.get(key, 0) + amount
+        self._maybe_flush()
+
+    def observe(self, name, seconds, **labels):
+        """Record a duration in a histogram"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._check_fork()
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram["buckets"][i] += 1
+                    break
+            histogram["sum"] += seconds
+            histogram["count"] += 1
+        self._maybe_flush()
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Observe the time the block takes, also when it raises"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def _maybe_flush(self):
+        if time.monotonic() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        """Write this worker's totals to the shared database"""
+        try:
+            with self._connection() as conn, conn:
+                data = {
+                    "counters": [[name, dict(labels), value] for (name, labels), value in self._counters.items()],
+                    "histograms": [
+                        [name, dict(labels), {_bound_text(b): n for b, n in zip(self.buckets, h["buckets"]) if n},
+                         h["sum"], h["count"]]
+                        for (name, labels), h in self._histograms.items()
+                    ],
+                }
+                conn.execute(
+                    "INSERT OR REPLACE INTO metric_snapshots (worker, updated_at, data) VALUES (?, ?, ?)",
+                    (self._worker, time.time(), json.dumps(data))
+                )
+                self._last_flush = time.monotonic()
+        except sqlite3.Error as e:
+            logger.warning(f"Metrics flush failed: {str(e)}")
+
+    def render(self):
+        """All workers' metrics in the Prometheus text exposition format"""
+        self.flush()
+        with self._connection() as conn:
+            snapshots = [json.loads(row[0]) for row in conn.execute("SELECT data FROM metric_snapshots")]
+
+        counters, histograms = {}, {}
+        for snapshot in snapshots:
+            for name, labels, value in snapshot["counters"]:
+                key = (name, tuple(sorted(labels.items())))
+                counters[key] = counters.get(key, 0) + value
+            for name, labels, buckets, total, count in snapshot["histograms"]:
+                key = (name, tuple(sorted(labels.items())))
+                merged = histograms.setdefault(key, {"buckets": {}, "sum": 0.0, "count": 0})
+                for bound, n in buckets.items():
+                    merged["buckets"][float(bound)] = merged["buckets"].get(float(bound), 0) + n
+                merged["sum"] += total
+                merged["count"] += count
+
+        lines = []
+        for name in sorted({name for name, _ in counters}):
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} counter")
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_label_text(labels)} {value}")
+        for name in sorted({name for name, _ in histograms}):
+            lines.append(f"# HELP {name} {HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for (metric, labels), histogram in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                bounds = sorted(set(self.buckets) | set(histogram["buckets"]))
+                for bound in bounds:
+                    cumulative += histogram["buckets"].get(bound, 0)
+                    lines.append(f"{name}_bucket{_label_text(labels, ('le', _bound_text(bound)))} {cumulative}")
+                lines.append(f"{name}_bucket{_label_text(labels, ('le', '+Inf'))} {histogram['count']}")
+                lines.append(f"{name}_sum{_label_text(labels)} {histogram['sum']:.6f}")
+                lines.append(f"{name}_count{_label_text(labels)} {histogram['count']}")
+        return "\n".join(lines) + "\n"
@@ -34,7 +34,7 @@ class Row(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     row_index = db.Column(db.Integer, nullable=False)
-    sheet_id = db.Column(db.Integer, db.ForeignKey('sheets.id'), nullable=False)
+    sheet_id = db.Column(db.Integer, db.ForeignKey('sheets.id'), nullable=False, index=True)
     cells = db.relationship('Cell', backref='row', lazy=True, cascade='all, delete-orphan')
 
 class Cell(db.Model):
@@ -42,5 +42,5 @@ class Cell(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     value = db.Column(db.String(1000))
-    row_id = db.Column(db.Integer, db.ForeignKey('rows.id'), nullable=False)
-    column_id = db.Column(db.Integer, db.ForeignKey('columns.id'), nullable=False)
+    row_id = db.Column(db.Integer, db.ForeignKey('rows.id'), nullable=False, index=True)
+    column_id = db.Column(db.Integer, db.ForeignKey('columns.id'), nullable=False, index=True)
@@ -0,0 +1,137 @@
+import re
+from query_plan import table_aliases
+
+# Name-like columns given a trigram full-text index: table -> columns.
+# Generated SQL matches these with LIKE '%name%', which no B-tree index can
+# answer; an FTS5 trigram index can, for any pattern with a run of at least
+# three literal characters. Columns missing from the workbook are skipped.
+NAME_SEARCH_COLUMNS = {
+    'hardware': ['name', 'model'],
+    'cameras': ['name', 'shortname', 'hardware'],
+    'cameragroups': ['hardware', 'camera', 'group'],
+}
+
+# "[qualifier.]column [NOT] LIKE 'pattern' [ESCAPE ...]"
+_LIKE_RE = re.compile(
+    r'(?:["`\[]?(\w+)["`\]]?\.)?["`\[]?(\w+)["`\]]?\s+(NOT\s+)?LIKE\s+'
+    r"'((?:[^']|'')*)'(\s+ESCAPE\b)?",
+    re.IGNORECASE
+)
+_LITERAL_RUN_RE = re.compile(r'[^%_]{3,}')
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_SELECT_RE = re.compile(r'\bSELECT\b', re.IGNORECASE)
+_WITH_RE = re.compile(r'^\s*WITH\b', re.IGNORECASE)
+
+
+def fts_table(table_name):
+    """Name of the trigram index table for a data table (internal, hidden from the model)"""
+    return f"_fts_{table_name}"
+
+
+def create_name_search(conn, columns=None):
+    """Build a trigram FTS5 index over the name columns of each table.
+
+    The index is an external-content FTS5 table, so it stores only the
+    trigrams and reads the text from the data table itself; it is built once
+    the data is loaded and not kept up to date afterwards, which is fine for
+    a database that is rebuilt rather than modified.
+    """
+    created = {}
+    for table_name, wanted in (columns or NAME_SEARCH_COLUMNS).items():
+        existing = {row[1] for row in conn.execute(f'PRAGMA table_info("{table_name}")')}
+        indexed = [col for col in wanted if col in existing]
+        if not indexed:
+            continue
+        fts = fts_table(table_name)
+        column_list = ", ".join(f'"{col}"' for col in indexed)
+        conn.execute(f'DROP TABLE IF EXISTS "{fts}"')
+        conn.execute(
+            f'CREATE VIRTUAL TABLE "{fts}" USING fts5({column_list}, '
+            f"content='{table_name}', content_rowid='rowid', tokenize='trigram')"
+        )
+        conn.execute(f'INSERT INTO "{fts}"("{fts}") VALUES (\'rebuild\')')
+        created[table_name] = indexed
+    return created
+
+
+def available_columns(conn):
+    """table -> set of columns that have a trigram index in this database"""
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    available = {}
+    for table_name in NAME_SEARCH_COLUMNS:
+        fts = fts_table(table_name)
+        if fts in tables:
+            available[table_name] = {row[1] for row in conn.execute(f'PRAGMA table_info("{fts}")')}
+    return available
+
+
+def _inside_string(sql, position):
+    return sql.count("'", 0, position) % 2 == 1
+
+
+def _single_scope(sql, referenced, schema):
+    """True when every table the statement reads is a base table in one FROM scope"""
+    code = _STRING_RE.sub("''", sql)
+    # A derived table, subquery, compound SELECT or CTE puts columns in
+    # scopes table_aliases() cannot tell apart, and may hide the base table
+    if _WITH_RE.match(code) or len(_SELECT_RE.findall(code)) != 1:
+        return False
+    # Views are not in the schema and have no rowid of their own
+    if schema is not None:
+        tables = {t.lower() for t in schema}
+        return all(t in tables for t in referenced)
+    return True
+
+
+def rewrite_substring_search(sql, available, schema=None):
+    """Answer LIKE '%x%' on name columns from their trigram index.
+
+    Each such predicate becomes ``(t.rowid IN (SELECT rowid FROM _fts_t
+    WHERE col LIKE '%x%') AND t.col LIKE '%x%')``: the index narrows the
+    rows of t down and the original predicate still decides which of them
+    match. Only single SELECTs over base tables are rewritten; statements
+    with a subquery, CTE, compound SELECT or view are returned unchanged,
+    since the column might then belong to something other than the table
+    that owns the index. Prefix patterns are left alone (the NOCASE B-tree
+    indexes already serve them), as are patterns without three literal
+    characters in a row, NOT LIKE, ESCAPE and columns whose table cannot
+    be told apart. Returns the SQL unchanged when nothing applies.
+    """
+    # Already rewritten, e.g. SQL that came back from the query cache
+    if not available or '_fts_' in sql.lower():
+        return sql
+    aliases = table_aliases(sql)
+    referenced = set(aliases.values())
+    if not _single_scope(sql, referenced, schema):
+        return sql
+
+    def replace(match):
+        qualifier, column, negated, pattern, escape = match.groups()
+        if negated or escape or _inside_string(sql, match.start()):
+            return match.group(0)
+        if not pattern.startswith(('%', '_')) or not _LITERAL_RUN_RE.search(pattern):
+            return match.group(0)
+        column = column.lower()
+        if qualifier:
+            table_name = aliases.get(qualifier.lower())
+        else:
+            # Unqualified columns only when a single table in the statement has them
+            owners = [t for t in referenced
+                      if schema is None or column in {c.lower() for c in schema.get(t, ())}]
+            if schema is None and len(referenced) != 1:
+                owners = []
+            table_name = owners[0] if len(owners) == 1 else None
+        if table_name is None or column not in available.get(table_name, ()):
+            return match.group(0)
+        if not qualifier and len(referenced) > 1:
+            # An aliased table can only be referred to by its alias
+            names = [name for name, table in aliases.items() if table == table_name and name != table_name]
+            if len(names) > 1:
+                return match.group(0)
+            qualifier = names[0] if names else table_name
+        rowid = f"{qualifier}.rowid" if qualifier else "rowid"
+        fts = fts_table(table_name)
+        return (f'({rowid} IN (SELECT rowid FROM "{fts}" WHERE "{column}" LIKE \'{pattern}\') '
+                f'AND {match.group(0)})')
+
+    return _LIKE_RE.sub(replace, sql)
@@ -0,0 +1,282 @@
+import base64
+import hashlib
+import hmac
+import json
+import re
+import sqlite3
+from query_guard import is_interrupted
+
+# Splits SQL into quoted strings/identifiers and everything else, so keyword
+# searches only look at the parts outside quotes
+_SQL_TOKEN_RE = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|\[[^\]]*\]|`[^`]*`|[^'\"\[`]+|.", re.DOTALL)
+_COLUMN_REF_RE = re.compile(r'^(?:["\[`]?(\w+)["\]`]?\.)?["\[`]?(\w+)["\]`]?$')
+# Alias at the end of a SELECT list item, with or without AS
+_ALIAS_RE = re.compile(r'(?:\s+as)?\s+["\[`]?\w+["\]`]?$', re.IGNORECASE)
+
+
+class PageTokenError(ValueError):
+    """Raised for tampered, malformed or expired continuation tokens"""
+
+
+class NotPageable(ValueError):
+    """Raised for statements whose order cannot be reproduced from their output columns"""
+
+
+def _strip_sql(sql):
+    return sql.strip().rstrip(';').strip()
+
+
+def _top_level(sql):
+    """Copy of the SQL with quoted text and parenthesised parts blanked out"""
+    out = []
+    depth = 0
+    for match in _SQL_TOKEN_RE.finditer(sql):
+        token = match.group(0)
+        if token[0] in "'\"[`" and len(token) > 1:
+            out.append(' ' * len(token))
+            continue
+        for ch in token:
+            if ch == '(':
+                depth += 1
+                out.append(' ')
+            elif ch == ')':
+                depth -= 1
+                out.append(' ')
+            else:
+                out.append(ch if depth == 0 else ' ')
+    return ''.join(out)
+
+
+def _split_top_level(text, top):
+    parts, start = [], 0
+    for i, ch in enumerate(top):
+        if ch == ',':
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return parts
+
+
+def _column_ref(text):
+    """(table or None, column) for a plain column reference, lowercased, else None"""
+    ref = _COLUMN_REF_RE.match(text.strip())
+    if not ref:
+        return None
+    return (ref.group(1).lower() if ref.group(1) else None), ref.group(2).lower()
+
+
+def _select_items(sql, top):
+    """Expressions of the outermost SELECT list with their aliases removed"""
+    select = re.search(r'\bselect\s+(?:(?:distinct|all)\s+)?', top, re.IGNORECASE)
+    if not select:
+        return []
+    end = re.search(r'\bfrom\b', top[select.end():], re.IGNORECASE)
+    stop = select.end() + end.start() if end else len(sql)
+    items = _split_top_level(sql[select.end():stop], top[select.end():stop])
+    return [_ALIAS_RE.sub('', item.strip()) if _column_ref(item) is None else item.strip() for item in items]
+
+
+def _term_index(term, sql, top, columns):
+    """Output column an ORDER BY term refers to, or NotPageable"""
+    if term.isdigit() and 1 <= int(term) <= len(columns):
+        return int(term) - 1
+    ref = _column_ref(term)
+    if ref is None:
+        raise NotPageable(f"ORDER BY term {term!r} is not an output column")
+    table, name = ref
+    if table is None:
+        # A bare name sorts by the output column of that name; with two
+        # (c.name, h.name) the pages could follow the wrong one
+        matches = [i for i, column in enumerate(columns) if column.lower() == name]
+    else:
+        # The output names drop the table, so find the SELECT list item
+        # that spells out the same qualified column. An unqualified one
+        # will do: the statement runs, so its name belongs to one table only
+        items = _select_items(sql, top)
+        matches = []
+        if len(items) == len(columns):
+            matches = [i for i, item in enumerate(items) if _column_ref(item) == ref]
+            if not matches:
+                matches = [i for i, item in enumerate(items) if _column_ref(item) == (None, name)]
+    if len(matches) != 1:
+        raise NotPageable(f"ORDER BY term {term!r} does not name exactly one output column")
+    return matches[0]
+
+
+def order_key(sql, columns):
+    """Sort key for paging the rows of ``sql``: a list of (column index, descending).
+
+    Starts with the query's own outermost ORDER BY terms, then adds the
+    other output columns as the tiebreaker: a subquery exposes no rowid,
+    and together with the ``seen`` count of fetch_page() they order every
+    row. SQLite only sorts them within runs of equal leading terms. Raises
+    NotPageable when an ORDER BY term is not exactly one output column (an
+    expression, COLLATE, a column left out of the SELECT list, a name two
+    output columns share), since the pages could not keep that order.
+    """
+    top = _top_level(sql)
+    key = []
+    match = None
+    for match in re.finditer(r'\border\s+by\b', top, re.IGNORECASE):
+        pass
+    if match:
+        end = re.search(r'\b(limit|offset)\b', top[match.end():], re.IGNORECASE)
+        stop = match.end() + end.start() if end else len(sql)
+        clause, clause_top = sql[match.end():stop], top[match.end():stop]
+        for term in _split_top_level(clause, clause_top):
+            term = re.sub(r'\s+nulls\s+(first|last)\s*$', '', term.strip(), flags=re.IGNORECASE)
+            descending = bool(re.search(r'\s+desc$', term, re.IGNORECASE))
+            term = re.sub(r'\s+(asc|desc)$', '', term, flags=re.IGNORECASE).strip()
+            index = _term_index(term, sql, top, columns)
+            if index not in [k[0] for k in key]:
+                key.append((index, descending))
+    used = {k[0] for k in key}
+    key.extend((i, False) for i in range(len(columns)) if i not in used)
+    return key
+
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+def _seek(key, columns, values):
+    """Range condition on the leading sort column implied by _at_or_after().
+
+    It adds nothing logically, but unlike the OR of the full condition it
+    lets SQLite start an index scan at the page instead of the first row.
+    """
+    index, descending = key[0]
+    column, value = _quote(columns[index]), values[0]
+    if descending:
+        if value is None:
+            return f"{column} IS NULL", []
+        return f"({column} <= ? OR {column} IS NULL)", [value]
+    if value is None:
+        return None, []
+    return f"{column} >= ?", [value]
+
+
+def _at_or_after(key, columns, values):
+    """WHERE clause selecting rows at or after ``values`` in key order"""
+    clauses, params = [], []
+    for position, (index, descending) in enumerate(key):
+        column = _quote(columns[index])
+        value = values[position]
+        # SQLite sorts NULLs first ascending and last descending, so nothing
+        # comes after a NULL in a descending column
+        if descending and value is None:
+            continue
+        parts = [f"{_quote(columns[k[0]])} IS ?" for k in key[:position]]
+        params.extend(values[:position])
+        if descending:
+            parts.append(f"({column} < ? OR {column} IS NULL)")
+            params.append(value)
+        elif value is None:
+            parts.append(f"{column} IS NOT NULL")
+        else:
+            parts.append(f"{column} > ?")
+            params.append(value)
+        clauses.append("(" + " AND ".join(parts) + ")")
+    # ... or sitting exactly on the last key
+    clauses.append("(" + " AND ".join(f"{_quote(columns[index])} IS ?" for index, _ in key) + ")")
+    params.extend(values)
+    return " OR ".join(clauses), params
+
+
+def _encode_value(value):
+    if isinstance(value, bytes):
+        return {"b64": base64.b64encode(value).decode()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        return base64.b64decode(value["b64"])
+    return value
+
+
+def encode_token(state, secret):
+    """Serialize and sign the paging state into an opaque token"""
+    payload = base64.urlsafe_b64encode(json.dumps(state, separators=(',', ':')).encode())
+    signature = hmac.new(secret, payload, hashlib.sha256).digest()[:16]
+    return payload.decode() + '.' + base64.urlsafe_b64encode(signature).decode().rstrip('=')
+
+
+def decode_token(token, secret):
+    """Verify and deserialize a token produced by encode_token()"""
+    try:
+        payload, signature = token.encode().split(b'.')
+        expected = hmac.new(secret, payload, hashlib.sha256).digest()[:16]
+        if not hmac.compare_digest(base64.urlsafe_b64encode(expected).rstrip(b'='), signature):
+            raise PageTokenError("Invalid page token")
+        return json.loads(base64.urlsafe_b64decode(payload))
+    except PageTokenError:
+        raise
+    except Exception:
+        raise PageTokenError("Malformed page token")
+
+
+def fetch_page(conn, sql, params=(), page_size=100, after=None, seen=0):
+    """Fetch one page of the rows of ``sql`` using keyset pagination.
+
+    ``after`` holds the sort key of the last row already returned and
+    ``seen`` how many returned rows share exactly that key, so duplicate
+    rows split across a page boundary are neither lost nor repeated.
+    Returns (columns, rows, state, truncated_reason), where ``state`` is
+    None on the last page and otherwise the dict to put in the next
+    continuation token. When the time budget interrupts the query after
+    some rows of the page were read, those rows are returned with
+    truncated_reason 'timeout' and a token that continues after them; when
+    no row was read the interrupt is raised.
+    """
+    sql = _strip_sql(sql)
+    params = list(params)
+    columns = [d[0] for d in conn.execute(f"SELECT * FROM ({sql}) LIMIT 0", params).description]
+    key = order_key(sql, columns)
+
+    query = f"SELECT * FROM ({sql}) AS page_src"
+    query_params = list(params)
+    if after is not None:
+        values = [_decode_value(v) for v in after]
+        where, where_params = _at_or_after(key, columns, values)
+        seek, seek_params = _seek(key, columns, values)
+        if seek:
+            where, where_params = f"{seek} AND ({where})", seek_params + where_params
+        query += f" WHERE {where}"
+        query_params += where_params
+    order = ", ".join(_quote(columns[index]) + (" DESC" if descending else "") for index, descending in key)
+    query += f" ORDER BY {order} LIMIT ?"
+    query_params.append(page_size + seen + 1)
+
+    rows, truncated = [], None
+    cursor = conn.execute(query, query_params)
+    try:
+        # Row by row: fetchmany() drops the rows of a batch cut short by an interrupt
+        for row in cursor:
+            rows.append(row)
+    except sqlite3.OperationalError as e:
+        if not is_interrupted(e) or len(rows) <= seen:
+            raise
+        truncated = 'timeout'
+    rows = rows[seen:]
+    if truncated is None and len(rows) <= page_size:
+        return columns, rows, None, None
+
+    rows = rows[:page_size]
+    last_key = [rows[-1][index] for index, _ in key]
+    # Count the rows returned so far that sit exactly on the last key
+    same = 0
+    for row in reversed(rows):
+        if [row[index] for index, _ in key] != last_key:
+            break
+        same += 1
+    if after is not None and same == len(rows) and [_decode_value(v) for v in after] == last_key:
+        same += seen
+    state = {
+        "sql": sql,
+        "params": [_encode_value(p) for p in params],
+        "after": [_encode_value(v) for v in last_key],
+        "seen": same,
+        "page_size": page_size,
+    }
+    return columns, rows, state, truncated
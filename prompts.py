@@ -0,0 +1,13 @@
+def sql_system_message(schema_context):
+    """System message asking the model to translate questions into SQL for the given schema"""
+    return f"""You are a SQL query generator. Convert natural language queries into SQL based on this schema:
+{schema_context}
+
+Important notes:
+- Return ONLY the SQL query, no explanations
+- Make column names case-sensitive
+- Use LIKE with wildcards for partial matches
+- For name searches, use LIKE '%name%' to match partial names
+- For camera settings, filter camerageneralsettings_wide (one row per camera, one column per
+  setting, e.g. brightness = 52 or edgestorageenabled = 1) instead of joining camerageneralsettings to itself
+"""
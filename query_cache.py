@@ -0,0 +1,223 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from logging_config import setup_logging
+from question_index import QuestionIndex
+
+logger = setup_logging('app.log')
+
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv('QUERY_CACHE_MAX_ENTRIES', '1000'))
+QUERY_CACHE_TTL = int(os.getenv('QUERY_CACHE_TTL', str(24 * 60 * 60)))
+# Minimum shape similarity for reusing the SQL of a near-duplicate question;
+# anything above 1 disables fuzzy matching
+QUERY_CACHE_FUZZY_THRESHOLD = float(os.getenv('QUERY_CACHE_FUZZY_THRESHOLD', '0.9'))
+
+
+def normalize_question(question):
+    """Normalize a question so trivially different spellings share a cache entry"""
+    question = question.strip().lower()
+    question = re.sub(r'[?!.;]+$', '', question)
+    question = question.replace('"', '').replace("'", '')
+    return re.sub(r'\s+', ' ', question).strip()
+
+
+class QueryCache:
+    """Question -> generated SQL cache persisted in a SQLite side database.
+
+    All gunicorn workers open the same file, so an answer generated by one
+    worker is a hit for the others. Entries are keyed by the normalized
+    question and the schema fingerprint, expire after ``ttl`` seconds and
+    are evicted least-recently-used beyond ``max_entries``.
+
+    Questions without an exact entry are matched against a local
+    similarity index of the cached questions (see question_index.py).
+    Hit/miss counters are kept in the same database so the rates cover
+    all workers.
+    """
+
+    def __init__(self, path, max_entries=QUERY_CACHE_MAX_ENTRIES, ttl=QUERY_CACHE_TTL,
+                 fuzzy_threshold=QUERY_CACHE_FUZZY_THRESHOLD):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.fuzzy_threshold = fuzzy_threshold
+        # One connection per worker shared by its threads/greenlets; the
+        # statements are short, so serializing them is cheaper than opening
+        # a connection for every request
+        self._conn = None
+        self._lock = threading.RLock()
+        self._index = QuestionIndex(threshold=fuzzy_threshold)
+        self._index_signature = None
+
+    @contextmanager
+    def _connection(self):
+        with self._lock:
+            if self._conn is None:
+                self._conn = self._open()
+            yield self._conn
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        # WAL lets workers read while another one writes
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS query_cache (
+                question TEXT NOT NULL,
+                schema_fingerprint TEXT NOT NULL,
+                sql TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (question, schema_fingerprint)
+            )
+        ''')
+        conn.execute("CREATE INDEX IF NOT EXISTS query_cache_last_used ON query_cache(last_used)")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS query_cache_stats (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL DEFAULT 0
+            )
+        ''')
+        conn.commit()
+        return conn
+
+    def get(self, question, fingerprint):
+        """Return the cached SQL for a question, or None"""
+        key = normalize_question(question)
+        now = time.time()
+        try:
+            with self._connection() as conn:
+                row = conn.execute(
+                    "SELECT sql, created_at FROM query_cache WHERE question = ? AND schema_fingerprint = ?",
+                    (key, fingerprint)
+                ).fetchone()
+                if row is None:
+                    return None
+                if now - row[1] > self.ttl:
+                    with conn:
+                        conn.execute(
+                            "DELETE FROM query_cache WHERE question = ? AND schema_fingerprint = ?",
+                            (key, fingerprint)
+                        )
+                    return None
+                with conn:
+                    conn.execute(
+                        "UPDATE query_cache SET last_used = ?, hits = hits + 1 "
+                        "WHERE question = ? AND schema_fingerprint = ?",
+                        (now, key, fingerprint)
+                    )
+                return row[0]
+        except sqlite3.Error as e:
+            logger.warning(f"Query cache lookup failed: {str(e)}")
+            return None
+
+    def put(self, question, fingerprint, sql):
+        """Store the SQL generated for a question and evict stale entries"""
+        key = normalize_question(question)
+        now = time.time()
+        try:
+            with self._connection() as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO query_cache "
+                    "(question, schema_fingerprint, sql, created_at, last_used, hits) VALUES (?, ?, ?, ?, ?, 0)",
+                    (key, fingerprint, sql, now, now)
+                )
+                # SQL generated against an older schema is no longer valid
+                conn.execute("DELETE FROM query_cache WHERE schema_fingerprint != ?", (fingerprint,))
+                conn.execute("DELETE FROM query_cache WHERE created_at < ?", (now - self.ttl,))
+                conn.execute(
+                    "DELETE FROM query_cache WHERE rowid IN "
+                    "(SELECT rowid FROM query_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,)
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Query cache store failed: {str(e)}")
+
+    def find(self, question, fingerprint):
+        """Look a question up exactly, then by similarity.
+
+        Returns a dict with ``sql``, ``match`` ('exact' or 'fuzzy') and
+        ``score``, or None on a miss.
+        """
+        sql = self.get(question, fingerprint)
+        if sql is not None:
+            self._count("exact_hit")
+            return {"sql": sql, "match": "exact", "score": 1.0}
+
+        if self.fuzzy_threshold <= 1:
+            best = self._fuzzy_match(question, fingerprint)
+            if best is not None:
+                self._count(f"fuzzy_score_{int(best['score'] * 10) / 10:.1f}")
+                if best["sql"] is not None:
+                    logger.info(f"Fuzzy cache hit (score {best['score']:.2f}) for '{question}' "
+                                f"via '{best['question']}'")
+                    self._count("fuzzy_hit")
+                    return {"sql": best["sql"], "match": "fuzzy", "score": best["score"]}
+                logger.info(f"Fuzzy cache miss for '{question}', best score {best['score']:.2f}")
+
+        self._count("miss")
+        return None
+
+    def _fuzzy_match(self, question, fingerprint):
+        try:
+            with self._connection() as conn:
+                signature = conn.execute(
+                    "SELECT COUNT(*), MAX(created_at) FROM query_cache WHERE schema_fingerprint = ?",
+                    (fingerprint,)
+                ).fetchone() + (fingerprint,)
+                # Rebuild only when another worker (or this one) stored new entries
+                if signature != self._index_signature:
+                    rows = conn.execute(
+                        "SELECT question, sql FROM query_cache WHERE schema_fingerprint = ?",
+                        (fingerprint,)
+                    ).fetchall()
+                    self._index.build(rows)
+                    self._index_signature = signature
+                return self._index.match(question)
+        except sqlite3.Error as e:
+            logger.warning(f"Fuzzy cache lookup failed: {str(e)}")
+            return None
+
+    def _count(self, name):
+        try:
+            with self._connection() as conn, conn:
+                conn.execute(
+                    "INSERT INTO query_cache_stats (name, value) VALUES (?, 1) "
+                    "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+                    (name,)
+                )
+        except sqlite3.Error as e:
+            logger.warning(f"Query cache stats update failed: {str(e)}")
+
+    def stats(self):
+        """Hit/miss counters across all workers plus the fuzzy score distribution"""
+        with self._connection() as conn:
+            counters = dict(conn.execute("SELECT name, value FROM query_cache_stats").fetchall())
+            entries = conn.execute("SELECT COUNT(*) FROM query_cache").fetchone()[0]
+        exact = counters.get("exact_hit", 0)
+        fuzzy = counters.get("fuzzy_hit", 0)
+        lookups = exact + fuzzy + counters.get("miss", 0)
+        return {
+            "entries": entries,
+            "lookups": lookups,
+            "exact_hits": exact,
+            "fuzzy_hits": fuzzy,
+            "misses": counters.get("miss", 0),
+            "hit_rate": (exact + fuzzy) / lookups if lookups else 0.0,
+            "fuzzy_hit_rate": fuzzy / lookups if lookups else 0.0,
+            "fuzzy_threshold": self.fuzzy_threshold,
+            "fuzzy_score_distribution": {
+                name[len("fuzzy_score_"):]: value
+                for name, value in sorted(counters.items()) if name.startswith("fuzzy_score_")
+            },
+        }
+
+    def clear(self):
+        """Remove every cached entry"""
+        with self._connection() as conn, conn:
+            conn.execute("DELETE FROM query_cache")
+            conn.execute("DELETE FROM query_cache_stats")
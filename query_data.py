@@ -1,4 +1,7 @@
+import sys
 from flask import Flask
+from sqlalchemy import select, text
+from sqlalchemy.orm import selectinload
 from models import db, Workbook, Sheet, Column, Row, Cell
 
 app = Flask(__name__)
@@ -6,32 +9,127 @@ app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///excel_data.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db.init_app(app)
 
+# Prefix of the materialized one-row-per-record tables built from the cells
+WIDE_TABLE_PREFIX = 'wide_'
+
+# pandas dtype recorded for a column -> (SQLite type, expression turning the cell text into it)
+WIDE_TYPES = {
+    'int64': ('INTEGER', "CAST({value} AS INTEGER)"),
+    'float64': ('REAL', "CAST({value} AS REAL)"),
+    'bool': ('INTEGER', "CASE {value} WHEN 'True' THEN 1 WHEN 'False' THEN 0 END"),
+}
+
+def clean_name(name):
+    """Table/column name for a sheet or column, like the hardware.db loader makes them"""
+    return str(name).strip().lower().replace(' ', '_').replace('-', '_')
+
+def sheet_rows(sheet_id, limit=None):
+    """Rows of a sheet as (row_index, {column name: value}), read with one query.
+
+    Walking row.cells and cell.column lazily costs a query per row and per
+    cell; this joins rows, cells and columns once and groups in Python.
+    """
+    rows = select(Row.id).where(Row.sheet_id == sheet_id).order_by(Row.row_index, Row.id)
+    if limit is not None:
+        rows = rows.limit(limit)
+    rows = rows.subquery()
+    result = db.session.execute(
+        select(Row.id, Row.row_index, Column.name, Cell.value)
+        .join(rows, rows.c.id == Row.id)
+        .join(Cell, Cell.row_id == Row.id)
+        .join(Column, Column.id == Cell.column_id)
+        .order_by(Row.row_index, Row.id, Column.id)
+    )
+    records = {}
+    for row_id, row_index, column_name, value in result:
+        if row_id not in records:
+            records[row_id] = (row_index, {})
+        records[row_id][1][column_name] = value
+    return list(records.values())
+
+def ensure_eav_indexes():
+    """Create the indexes the EAV lookups need on databases made before they were declared"""
+    for table in (Row.__table__, Cell.__table__):
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+def materialize_wide_tables(flask_app=app):
+    """Rebuild one ordinary table per sheet from the cells, with a column per sheet column.
+
+    The table is named wide_<sheet> and holds the sheet's rows as they were
+    in the workbook: row_id and row_index followed by the sheet's columns,
+    typed from the pandas dtype recorded for each. Each table is filled by a
+    single INSERT ... SELECT that pivots the cells, so querying a sheet no
+    longer means joining cells once per column. When several workbooks have
+    a sheet of the same name, the most recently loaded one is used.
+
+    Returns {table name: row count}.
+    """
+    with flask_app.app_context():
+        db.create_all()
+        ensure_eav_indexes()
+        latest = {}
+        for sheet in Sheet.query.options(selectinload(Sheet.columns)).order_by(Sheet.id):
+            latest[WIDE_TABLE_PREFIX + clean_name(sheet.name)] = sheet
+
+        built = {}
+        for table_name, sheet in latest.items():
+            names, definitions, pivots = [], [], []
+            for column in sorted(sheet.columns, key=lambda c: c.id):
+                name = clean_name(column.name)
+                if name in names or name in ('row_id', 'row_index'):
+                    name = f"{name}_{column.id}"
+                names.append(name)
+                col_type, expression = WIDE_TYPES.get(column.data_type, ('TEXT', "{value}"))
+                definitions.append(f'"{name}" {col_type}')
+                value = f"MAX(CASE WHEN cells.column_id = {column.id} THEN cells.value END)"
+                pivots.append(expression.format(value=value))
+
+            db.session.execute(text(f'DROP TABLE IF EXISTS "{table_name}"'))
+            db.session.execute(text(
+                f'CREATE TABLE "{table_name}" (row_id INTEGER PRIMARY KEY, row_index INTEGER NOT NULL'
+                + "".join(f", {definition}" for definition in definitions) + ")"
+            ))
+            db.session.execute(text(
+                f'INSERT INTO "{table_name}" (row_id, row_index'
+                + "".join(f', "{name}"' for name in names) + ") "
+                f"SELECT rows.id, rows.row_index" + "".join(f", {pivot}" for pivot in pivots) + " "
+                "FROM rows LEFT JOIN cells ON cells.row_id = rows.id "
+                "WHERE rows.sheet_id = :sheet_id GROUP BY rows.id"
+            ), {"sheet_id": sheet.id})
+            db.session.execute(text(
+                f'CREATE INDEX "idx_{table_name}_row_index" ON "{table_name}" (row_index)'
+            ))
+            built[table_name] = db.session.execute(text(f'SELECT COUNT(*) FROM "{table_name}"')).scalar()
+            print(f"Materialized {table_name} ({built[table_name]} rows, {len(names)} columns)")
+        db.session.commit()
+        return built
+
 def show_database_contents():
     """Display the contents of the database"""
     with app.app_context():
-        # Show workbooks
-        workbooks = Workbook.query.all()
+        # Sheets and their columns come in with the workbooks: three queries in all
+        workbooks = Workbook.query.options(
+            selectinload(Workbook.sheets).selectinload(Sheet.columns)
+        ).all()
         print("\n=== Workbooks ===")
         for wb in workbooks:
             print(f"\nWorkbook: {wb.name}")
-            
+
             # Show sheets in workbook
             for sheet in wb.sheets:
                 print(f"\n  Sheet: {sheet.name}")
                 print("  Columns:")
                 for col in sheet.columns:
                     print(f"    - {col.name} ({col.data_type})")
-                
+
                 # Show first 5 rows of data
                 print("\n  First 5 rows of data:")
-                rows = Row.query.filter_by(sheet_id=sheet.id).limit(5).all()
-                for row in rows:
-                    row_data = []
-                    for cell in row.cells:
-                        col_name = cell.column.name
-                        value = cell.value
-                        row_data.append(f"{col_name}: {value}")
-                    print(f"    Row {row.row_index}: {', '.join(row_data)}")
+                for row_index, values in sheet_rows(sheet.id, limit=5):
+                    row_data = [f"{col_name}: {value}" for col_name, value in values.items()]
+                    print(f"    Row {row_index}: {', '.join(row_data)}")
 
 if __name__ == "__main__":
+    if '--materialize' in sys.argv[1:]:
+        materialize_wide_tables()
     show_database_contents()
@@ -0,0 +1,137 @@
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from query_plan import table_aliases
+
+# Wall-clock budget for running one generated query, well under gunicorn's
+# 120 s worker timeout
+QUERY_TIMEOUT_MS = int(os.getenv('QUERY_TIMEOUT_MS', '10000'))
+# Rows returned by an unpaged or streamed query before it is cut off
+QUERY_MAX_ROWS = int(os.getenv('QUERY_MAX_ROWS', '10000'))
+# Rows the plan's nested loops may visit, estimated from the table sizes,
+# before the query is refused without running it
+QUERY_MAX_PLAN_ROWS = int(os.getenv('QUERY_MAX_PLAN_ROWS', str(10 * 1000 * 1000)))
+
+# SQLite VM instructions between deadline checks
+_PROGRESS_INTERVAL = 10000
+_SCAN_RE = re.compile(r'^(SCAN|SEARCH) (?:TABLE )?(\S+)')
+_MATERIALIZE_RE = re.compile(r'^(?:MATERIALIZE|CO-ROUTINE) (\S+)')
+
+
+class QueryRejected(ValueError):
+    """Raised for generated SQL whose plan is too expensive to run"""
+
+
+def is_interrupted(error):
+    """Whether a sqlite3 error was raised by the deadline stopping the statement"""
+    return isinstance(error, sqlite3.OperationalError) and 'interrupted' in str(error)
+
+
+def estimate_plan_rows(plan_rows, row_counts, sql=''):
+    """Rough number of rows the nested loops of a query plan visit.
+
+    Sibling SCANs in the plan tree are nested loops, so their table sizes
+    multiply; index SEARCHes count as single lookups. Correlated
+    subqueries run once per outer row and multiply too, other subqueries,
+    materialized CTEs and compound parts add up. Tables without a known
+    row count (CTEs excepted) count as 1000 rows.
+
+    Only loops multiplying two or more tables (joins without a usable
+    index, cross joins, correlated scans) count: the largest such product
+    is returned, 0 when there is none. A single-table scan reads each row
+    once, however big the table, and is left to the time budget.
+    """
+    aliases = table_aliases(sql)
+    children = {}
+    for node_id, parent, _, detail in plan_rows:
+        children.setdefault(parent, []).append((node_id, detail))
+    materialized = {}
+    products = [0]
+
+    def level(parent):
+        loop, extra, factors = 1, 0, 0
+        for node_id, detail in children.get(parent, []):
+            scan = _SCAN_RE.match(detail)
+            if scan:
+                if scan.group(1) == 'SCAN':
+                    name = aliases.get(scan.group(2).lower(), scan.group(2).lower())
+                    rows = materialized.get(name, row_counts.get(name, 1000))
+                    loop *= max(rows, 1)
+                    factors += rows > 1
+                extra += level(node_id)
+                continue
+            sub = level(node_id)
+            materialize = _MATERIALIZE_RE.match(detail)
+            if materialize:
+                materialized[materialize.group(1).lower()] = sub
+            if detail.startswith('CORRELATED'):
+                loop *= max(sub, 1)
+                factors += sub > 1
+            else:
+                extra += sub
+        if factors > 1:
+            products.append(loop)
+        return loop + extra
+
+    level(0)
+    return max(products)
+
+
+def check_plan(conn, sql, params=(), row_counts=None, max_rows=QUERY_MAX_PLAN_ROWS):
+    """Refuse a statement whose nested loops would visit more than max_rows rows.
+
+    Returns the estimate; raises QueryRejected above the limit, e.g. for
+    an accidental cross join between two large tables.
+    """
+    plan_rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    lowered = {name.lower(): count for name, count in (row_counts or {}).items()}
+    estimate = estimate_plan_rows([tuple(row) for row in plan_rows], lowered, sql)
+    if estimate > max_rows:
+        raise QueryRejected(
+            f"Query refused: its plan would read about {estimate:,} rows (limit {max_rows:,}). "
+            f"Add join conditions or filters and try again."
+        )
+    return estimate
+
+
+@contextmanager
+def time_budget(conn, timeout_ms=QUERY_TIMEOUT_MS):
+    """Interrupt statements on conn that run past timeout_ms while the block is active"""
+    deadline = time.monotonic() + timeout_ms / 1000
+    conn.set_progress_handler(lambda: 1 if time.monotonic() > deadline else 0, _PROGRESS_INTERVAL)
+    try:
+        yield
+    finally:
+        conn.set_progress_handler(None, 0)
+
+
+def start_budget(conn, timeout_ms=QUERY_TIMEOUT_MS):
+    """Like time_budget(), for statements consumed after the caller returns (streaming).
+
+    The pool clears the handler when the connection is released.
+    """
+    deadline = time.monotonic() + timeout_ms / 1000
+    conn.set_progress_handler(lambda: 1 if time.monotonic() > deadline else 0, _PROGRESS_INTERVAL)
+
+
+def fetch_limited(cursor, max_rows=QUERY_MAX_ROWS, chunk_size=500):
+    """Fetch up to max_rows rows from an executing cursor.
+
+    Returns (rows, truncated_reason): the reason is None when all rows were
+    read, 'max_rows' when more rows were left and 'timeout' when the time
+    budget ran out part way, in which case the rows read so far are kept.
+    """
+    rows = []
+    try:
+        while len(rows) <= max_rows:
+            batch = cursor.fetchmany(min(chunk_size, max_rows + 1 - len(rows)))
+            if not batch:
+                return rows, None
+            rows.extend(batch)
+    except sqlite3.OperationalError as e:
+        if not is_interrupted(e):
+            raise
+        return rows, 'timeout'
+    return rows[:max_rows], 'max_rows'
@@ -0,0 +1,340 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from logging_config import setup_logging
+from query_guard import QUERY_TIMEOUT_MS, time_budget
+from query_plan import explain, table_aliases
+
+logger = setup_logging('app.log')
+
+# Queries slower than this are reported as slow
+SLOW_QUERY_MS = float(os.getenv('SLOW_QUERY_MS', '100'))
+QUERY_LOG_MAX_ENTRIES = int(os.getenv('QUERY_LOG_MAX_ENTRIES', '10000'))
+# Logged executions a column needs in full-scan plans before an index is proposed
+QUERY_ADVISOR_MIN_SCANS = int(os.getenv('QUERY_ADVISOR_MIN_SCANS', '3'))
+
+# "[alias.]column <op>" and "<op> alias.column" in WHERE/ON/HAVING clauses
+_PREDICATE_RE = re.compile(
+    r'(?:["`\[]?(\w+)["`\]]?\.)?["`\[]?(\w+)["`\]]?\s*'
+    r'(=|==|!=|<>|<=|>=|<|>|\bLIKE\b|\bGLOB\b|\bIN\b|\bBETWEEN\b|\bIS\b)\s*'
+    r"('(?:[^']|'')*'|\?)?",
+    re.IGNORECASE
+)
+_RIGHT_SIDE_RE = re.compile(r'(?:=|<|>)\s*["`\[]?(\w+)["`\]]?\.["`\[]?(\w+)["`\]]?')
+_SORT_RE = re.compile(r'\b(?:ORDER|GROUP)\s+BY\s+(.*?)(?:\bLIMIT\b|\bHAVING\b|\bORDER\b|$)', re.IGNORECASE | re.DOTALL)
+
+
+def predicate_columns(sql):
+    """(qualifier, column, nocase) for each filtered, joined or sorted column of a statement.
+
+    ``nocase`` marks LIKE prefix matches, which need a NOCASE index.
+    LIKE '%x%' cannot use a B-tree index at all and is left out.
+    """
+    found = []
+    from_clause = re.split(r'\bFROM\b', sql, maxsplit=1, flags=re.IGNORECASE)
+    body = from_clause[1] if len(from_clause) > 1 else sql
+    for qualifier, column, op, literal in _PREDICATE_RE.findall(body):
+        op = op.upper()
+        if op in ('LIKE', 'GLOB'):
+            if literal.startswith("'%") or literal.startswith("'_") or not literal:
+                continue
+            found.append((qualifier.lower(), column.lower(), op == 'LIKE'))
+        else:
+            found.append((qualifier.lower(), column.lower(), False))
+    for qualifier, column in _RIGHT_SIDE_RE.findall(body):
+        found.append((qualifier.lower(), column.lower(), False))
+    for clause in _SORT_RE.findall(body):
+        for term in clause.split(','):
+            ref = re.match(r'\s*(?:["`\[]?(\w+)["`\]]?\.)?["`\[]?(\w+)["`\]]?', term)
+            if ref:
+                found.append(((ref.group(1) or '').lower(), ref.group(2).lower(), False))
+    return found
+
+
+def _index_name(table, column, nocase):
+    return f"idx_auto_{table}_{column}{'_nocase' if nocase else ''}"
+
+
+def _time_query(conn, sql, params=(), repeat=3, timeout_ms=QUERY_TIMEOUT_MS):
+    """Best-of-n execution time of a statement in milliseconds.
+
+    All runs share one timeout_ms budget, since the statements timed
+    are the slowest ones logged; an interrupted run raises sqlite3.Error.
+    """
+    best = None
+    with time_budget(conn, timeout_ms):
+        for _ in range(repeat):
+            started = time.perf_counter()
+            conn.execute(sql, params).fetchall()
+            elapsed = (time.perf_counter() - started) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+class QueryLog:
+    """Log of executed SQL with timings and query plans, plus an index advisor.
+
+    Every query the app runs is recorded with its duration, row count and
+    ``EXPLAIN QUERY PLAN`` summary in a SQLite side database shared by all
+    workers. The advisor looks for columns that keep being filtered, joined
+    or sorted on in tables the plans scan in full and proposes an index for
+    each. Accepted proposals are passed to the loader as extra indexes, so
+    they are built on the next rebuild, after which the sample queries are
+    timed again to record the before/after effect.
+    """
+
+    def __init__(self, path, slow_ms=SLOW_QUERY_MS, max_entries=QUERY_LOG_MAX_ENTRIES,
+                 min_scans=QUERY_ADVISOR_MIN_SCANS):
+        self.path = path
+        self.slow_ms = slow_ms
+        self.max_entries = max_entries
+        self.min_scans = min_scans
+        self._conn = None
+        self._lock = threading.RLock()
+        # EXPLAIN output per statement, for the data version in _plans_version
+        self._plans = {}
+        self._plans_version = None
+
+    @contextmanager
+    def _connection(self):
+        with self._lock:
+            if self._conn is None:
+                self._conn = self._open()
+            yield self._conn
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS query_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sql TEXT NOT NULL,
+                params TEXT NOT NULL,
+                source TEXT,
+                duration_ms REAL NOT NULL,
+                row_count INTEGER,
+                plan TEXT NOT NULL,
+                indexes TEXT NOT NULL,
+                full_scans TEXT NOT NULL,
+                slow INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            )
+        ''')
+        conn.execute("CREATE INDEX IF NOT EXISTS query_log_slow ON query_log(slow, created_at)")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS index_advice (
+                index_name TEXT PRIMARY KEY,
+                table_name TEXT NOT NULL,
+                column_name TEXT NOT NULL,
+                nocase INTEGER NOT NULL,
+                occurrences INTEGER NOT NULL,
+                sample_sql TEXT NOT NULL,
+                sample_params TEXT NOT NULL,
+                status TEXT NOT NULL,
+                before_ms REAL,
+                after_ms REAL,
+                proposed_at REAL NOT NULL,
+                created_at REAL
+            )
+        ''')
+        conn.commit()
+        return conn
+
+    def record(self, conn, sql, params, duration_ms, row_count=None, source=None, version=None):
+        """Log one execution; ``conn`` is used for EXPLAIN QUERY PLAN.
+
+        ``version`` identifies the database the plan was made for (the schema
+        cache's ``data_version``); cached plans of another version are dropped.
+        """
+        try:
+            if version != self._plans_version:
+                self._plans.clear()
+                self._plans_version = version
+            key = (sql, tuple(params))
+            summary = self._plans.get(key)
+            if summary is None:
+                summary = explain(conn, sql, params)
+                if len(self._plans) > 1000:
+                    self._plans.clear()
+                self._plans[key] = summary
+            slow = duration_ms >= self.slow_ms
+            if slow:
+                logger.warning(f"Slow query ({duration_ms:.1f} ms, full scans: "
+                               f"{', '.join(summary['full_scans']) or 'none'}): {sql}")
+            with self._connection() as log, log:
+                log.execute(
+                    "INSERT INTO query_log (sql, params, source, duration_ms, row_count, plan, indexes, "
+                    "full_scans, slow, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (sql, json.dumps(list(params)), source, duration_ms, row_count,
+                     json.dumps(summary["plan"]), json.dumps(summary["indexes"]),
+                     json.dumps(summary["full_scans"]), int(slow), time.time())
+                )
+                log.execute(
+                    "DELETE FROM query_log WHERE id <= (SELECT MAX(id) FROM query_log) - ?",
+                    (self.max_entries,)
+                )
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.warning(f"Query log update failed: {str(e)}")
+
+    def forget_plans(self):
+        """Drop cached plans, e.g. after the database was rebuilt with new indexes"""
+        self._plans.clear()
+
+    def slow_queries(self, limit=50):
+        """Most recent slow queries"""
+        with self._connection() as log:
+            rows = log.execute(
+                "SELECT sql, params, source, duration_ms, row_count, plan, full_scans, created_at "
+                "FROM query_log WHERE slow = 1 ORDER BY created_at DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [{
+            "sql": sql,
+            "params": json.loads(params),
+            "source": source,
+            "duration_ms": duration_ms,
+            "row_count": row_count,
+            "plan": json.loads(plan),
+            "full_scans": json.loads(full_scans),
+            "created_at": created_at,
+        } for sql, params, source, duration_ms, row_count, plan, full_scans, created_at in rows]
+
+    def _existing_indexes(self, conn):
+        """(table, leading column, nocase) of every index in the served database"""
+        existing = set()
+        tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+        for table in tables:
+            for index in conn.execute(f'PRAGMA index_list("{table}")').fetchall():
+                info = conn.execute(f'PRAGMA index_xinfo("{index[1]}")').fetchall()
+                if info and info[0][2] is not None:
+                    existing.add((table.lower(), info[0][2].lower(), info[0][4].upper() == 'NOCASE'))
+        return existing
+
+    def advise(self, conn):
+        """Propose indexes for columns that keep showing up in full-scan plans.
+
+        ``conn`` is a connection to the served database, used to look up
+        columns and existing indexes and to time the sample query. Returns
+        every proposal, old and new.
+        """
+        columns = {}
+        for (table,) in conn.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall():
+            columns[table.lower()] = {row[1].lower() for row in conn.execute(f'PRAGMA table_info("{table}")')}
+        existing = self._existing_indexes(conn)
+
+        with self._connection() as log:
+            rows = log.execute(
+                "SELECT sql, params, full_scans, COUNT(*) FROM query_log "
+                "WHERE full_scans != '[]' GROUP BY sql, params"
+            ).fetchall()
+            known = {row[0] for row in log.execute("SELECT index_name FROM index_advice")}
+
+        candidates = defaultdict(lambda: {"occurrences": 0, "sample": None})
+        for sql, params, full_scans, count in rows:
+            scanned = set(json.loads(full_scans))
+            aliases = table_aliases(sql)
+            seen = set()
+            for qualifier, column, nocase in predicate_columns(sql):
+                if qualifier:
+                    tables = [aliases.get(qualifier, qualifier)]
+                else:
+                    tables = [t for t in scanned if column in columns.get(t, ())]
+                for table in tables:
+                    key = (table, column, nocase)
+                    if table not in scanned or column not in columns.get(table, ()) or key in seen:
+                        continue
+                    seen.add(key)
+                    candidates[key]["occurrences"] += count
+                    if candidates[key]["sample"] is None:
+                        candidates[key]["sample"] = (sql, params)
+
+        for (table, column, nocase), candidate in candidates.items():
+            index_name = _index_name(table, column, nocase)
+            if (candidate["occurrences"] < self.min_scans or index_name in known
+                    or (table, column, nocase) in existing):
+                continue
+            sql, params = candidate["sample"]
+            try:
+                before_ms = _time_query(conn, sql, json.loads(params))
+            except sqlite3.Error as e:
+                logger.warning(f"Could not time the sample query of {index_name}: {str(e)}")
+                before_ms = None
+            logger.info(f"Index advisor proposes {index_name} ({candidate['occurrences']} full scans, "
+                        f"sample query {before_ms if before_ms is None else round(before_ms, 2)} ms)")
+            with self._connection() as log, log:
+                log.execute(
+                    "INSERT OR IGNORE INTO index_advice (index_name, table_name, column_name, nocase, occurrences, "
+                    "sample_sql, sample_params, status, before_ms, proposed_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, 'proposed', ?, ?)",
+                    (index_name, table, column, int(nocase), candidate["occurrences"], sql, params,
+                     before_ms, time.time())
+                )
+        return self.advice()
+
+    def advice(self):
+        """All index proposals with their status and timings"""
+        with self._connection() as log:
+            rows = log.execute(
+                "SELECT index_name, table_name, column_name, nocase, occurrences, sample_sql, status, "
+                "before_ms, after_ms, proposed_at, created_at FROM index_advice ORDER BY occurrences DESC"
+            ).fetchall()
+        return [{
+            "index_name": index_name,
+            "table": table,
+            "column": column,
+            "nocase": bool(nocase),
+            "occurrences": occurrences,
+            "sample_sql": sample_sql,
+            "status": status,
+            "before_ms": before_ms,
+            "after_ms": after_ms,
+            "proposed_at": proposed_at,
+            "created_at": created_at,
+        } for (index_name, table, column, nocase, occurrences, sample_sql, status,
+               before_ms, after_ms, proposed_at, created_at) in rows]
+
+    def advised_indexes(self):
+        """Proposed indexes in the loader's name -> (table, columns) form"""
+        try:
+            with self._connection() as log:
+                rows = log.execute(
+                    "SELECT index_name, table_name, column_name, nocase FROM index_advice "
+                    "WHERE status IN ('proposed', 'created')"
+                ).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read index advice: {str(e)}")
+            return {}
+        return {
+            index_name: (table, [f'"{column}"' + (' COLLATE NOCASE' if nocase else '')])
+            for index_name, table, column, nocase in rows
+        }
+
+    def record_created(self, conn):
+        """Mark proposals whose index now exists and time their sample query again"""
+        existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='index'")}
+        with self._connection() as log:
+            pending = log.execute(
+                "SELECT index_name, sample_sql, sample_params FROM index_advice WHERE after_ms IS NULL"
+            ).fetchall()
+        for index_name, sql, params in pending:
+            if index_name not in existing:
+                continue
+            try:
+                after_ms = _time_query(conn, sql, json.loads(params))
+            except sqlite3.Error as e:
+                logger.warning(f"Could not time {index_name}: {str(e)}")
+                continue
+            with self._connection() as log, log:
+                log.execute(
+                    "UPDATE index_advice SET status = 'created', after_ms = ?, created_at = ? "
+                    "WHERE index_name = ? AND after_ms IS NULL",
+                    (after_ms, time.time(), index_name)
+                )
+            logger.info(f"Index {index_name} created, sample query now {after_ms:.2f} ms")
+        self.forget_plans()
@@ -0,0 +1,66 @@
+import re
+
+_USING_INDEX_RE = re.compile(r'USING (?:COVERING )?INDEX (\S+)')
+_SCAN_RE = re.compile(r'^SCAN (?:TABLE )?(\S+)(?: AS (\S+))?')
+_TABLE_REF_RE = re.compile(
+    r'\b(?:FROM|JOIN)\s+["`\[]?(\w+)["`\]]?(?:\s+(?:AS\s+)?["`\[]?(\w+)["`\]]?)?',
+    re.IGNORECASE
+)
+_NOT_ALIASES = {
+    'where', 'join', 'inner', 'left', 'right', 'full', 'cross', 'natural', 'outer', 'on',
+    'using', 'group', 'order', 'limit', 'union', 'except', 'intersect', 'having', 'window',
+}
+
+
+_FROM_LIST_RE = re.compile(
+    r'\bFROM\s+(.*?)(?=\bWHERE\b|\bJOIN\b|\bINNER\b|\bLEFT\b|\bCROSS\b|\bNATURAL\b|\bGROUP\b|'
+    r'\bORDER\b|\bLIMIT\b|\bHAVING\b|\bUNION\b|\bEXCEPT\b|\bINTERSECT\b|\bWINDOW\b|\)|;|$)',
+    re.IGNORECASE | re.DOTALL
+)
+_LIST_ITEM_RE = re.compile(r'^\s*["`\[]?(\w+)["`\]]?(?:\s+(?:AS\s+)?["`\[]?(\w+)["`\]]?)?\s*$', re.IGNORECASE)
+
+
+def table_aliases(sql):
+    """Map the aliases (and names) used in a statement's FROM/JOIN clauses to table names"""
+    refs = _TABLE_REF_RE.findall(sql)
+    # Comma-separated tables after FROM ("FROM cameras c, hardware h")
+    for from_list in _FROM_LIST_RE.findall(sql):
+        for item in from_list.split(',')[1:]:
+            ref = _LIST_ITEM_RE.match(item)
+            if ref:
+                refs.append(ref.groups(''))
+    aliases = {}
+    for table, alias in refs:
+        aliases[table.lower()] = table.lower()
+        if alias and alias.lower() not in _NOT_ALIASES:
+            aliases[alias.lower()] = table.lower()
+    return aliases
+
+
+def explain(conn, sql, params=()):
+    """Run EXPLAIN QUERY PLAN for a statement and summarize it.
+
+    Returns a dict with the plan lines (``plan``), the indexes the plan uses
+    (``indexes``) and the tables it reads in full (``full_scans``, by table
+    name rather than alias). Scans that go through an index, e.g. a
+    covering index for COUNT(*), are not counted as full scans.
+    """
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    aliases = table_aliases(sql)
+    plan, indexes, full_scans = [], [], []
+    for row in rows:
+        detail = row[-1]
+        plan.append(detail)
+        using = _USING_INDEX_RE.search(detail)
+        if using:
+            if using.group(1) not in indexes:
+                indexes.append(using.group(1))
+            continue
+        scan = _SCAN_RE.match(detail)
+        if not scan or 'USING' in detail or scan.group(1).startswith('(') or scan.group(1) == 'CONSTANT':
+            continue
+        # Newer SQLite reports the alias, older ones "TABLE name AS alias"
+        table = aliases.get(scan.group(1).lower(), scan.group(1).lower())
+        if table not in full_scans:
+            full_scans.append(table)
+    return {"plan": plan, "indexes": indexes, "full_scans": full_scans}
@@ -1,6 +1,8 @@
 import sqlite3
+import sys
 import pandas as pd
 from tabulate import tabulate
+from query_plan import explain
 
 def run_query(query, description):
     print(f"\n=== {description} ===")
@@ -77,7 +79,32 @@ queries = [
      "20. Cameras with highest motion sensitivity")
 ]
 
+def index_report():
+    """Show which index (if any) SQLite picks for each test query"""
+    print("Index usage of the 20 test queries:")
+    conn = sqlite3.connect('hardware.db')
+    rows = []
+    try:
+        for query, description in queries:
+            try:
+                plan = explain(conn, query)
+            except sqlite3.Error as e:
+                rows.append([description, f"Error: {str(e)}", "", ""])
+                continue
+            rows.append([
+                description,
+                ", ".join(plan["indexes"]) or "-",
+                ", ".join(plan["full_scans"]) or "-",
+                "; ".join(plan["plan"]),
+            ])
+    finally:
+        conn.close()
+    print(tabulate(rows, headers=["Query", "Indexes used", "Full scans", "Plan"], tablefmt='psql'))
+
 def main():
+    if '--plans' in sys.argv[1:]:
+        index_report()
+        return
     print("Running 20 test queries on the camera database...")
     for query, description in queries:
         run_query(query, description)
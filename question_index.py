@@ -0,0 +1,207 @@
+import difflib
+import math
+import re
+from collections import Counter, defaultdict
+
+STOPWORDS = {
+    'a', 'about', 'all', 'an', 'and', 'any', 'are', 'at', 'can', 'display', 'do', 'does',
+    'each', 'find', 'for', 'from', 'get', 'give', 'i', 'in', 'is', 'list', 'me', 'my',
+    'of', 'on', 'please', 'show', 'tell', 'the', 'there', 'to', 'what', 'whats', 'which', 'with',
+}
+
+ENTITY = '<e>'
+
+# Words, allowing dots/dashes inside so IPs and firmware versions stay one token
+TOKEN_RE = re.compile(r"[A-Za-z0-9]+(?:[.\-][A-Za-z0-9]+)*")
+LIKE_LITERAL_RE = re.compile(r"LIKE\s+'((?:[^']|'')*)'", re.IGNORECASE)
+
+
+def tokenize(question):
+    """Split a question into (lowercase token, start, end) tuples"""
+    return [(m.group(0).lower(), m.start(), m.end()) for m in TOKEN_RE.finditer(question)]
+
+
+def stem(token):
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+def char_ngrams(text, n=3):
+    text = f" {text} "
+    return Counter(text[i:i + n] for i in range(len(text) - n + 1))
+
+
+def make_shape(tokens, span=None):
+    """Content words of a question with the entity span replaced by a placeholder"""
+    shape = []
+    for i, (token, _, _) in enumerate(tokens):
+        if span and span[0] <= i < span[1]:
+            if i == span[0]:
+                shape.append(ENTITY)
+        elif token not in STOPWORDS:
+            shape.append(stem(token))
+    return shape
+
+
+def find_entity(question, tokens, sql):
+    """Locate the LIKE literal of the SQL that the question spells out.
+
+    Returns (literal, (first token, last token + 1)) or (None, None).
+    """
+    words = [t[0] for t in tokens]
+    for match in LIKE_LITERAL_RE.finditer(sql):
+        literal = match.group(1).replace("''", "'").strip('%')
+        literal_words = [t[0] for t in tokenize(literal)]
+        if not literal_words:
+            continue
+        size = len(literal_words)
+        for start in range(len(words) - size + 1):
+            if words[start:start + size] == literal_words:
+                return literal, (start, start + size)
+    return None, None
+
+
+def substitute_literal(sql, old, new):
+    """Replace an entity inside the SQL's LIKE patterns"""
+    old = old.replace("'", "''")
+    new = new.replace("'", "''")
+
+    def replace(match):
+        pattern = match.group(1)
+        core = pattern.strip('%')
+        if core.lower() != old.lower():
+            return match.group(0)
+        prefix = pattern[:len(pattern) - len(pattern.lstrip('%'))]
+        suffix = pattern[len(pattern.rstrip('%')):]
+        return match.group(0).replace(f"'{pattern}'", f"'{prefix}{new}{suffix}'")
+
+    return LIKE_LITERAL_RE.sub(replace, sql)
+
+
+class QuestionIndex:
+    """Local similarity index over previously answered questions.
+
+    Candidates are retrieved by TF-IDF cosine over character trigrams and
+    then scored by comparing the "shape" of the questions, i.e. their
+    content words with the entity (the LIKE literal of the cached SQL)
+    replaced by a placeholder. The cached SQL is reused only when the
+    shapes are identical, with the new question's entity substituted in.
+    """
+
+    def __init__(self, threshold=0.9, candidates=5):
+        self.threshold = threshold
+        self.candidates = candidates
+        self._entries = []
+        self._postings = defaultdict(list)
+        self._idf = {}
+        self._norms = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def build(self, questions):
+        """(Re)build the index from (question, sql) pairs"""
+        self._entries = []
+        self._postings = defaultdict(list)
+        vectors = []
+        for question, sql in questions:
+            tokens = tokenize(question)
+            literal, span = find_entity(question, tokens, sql)
+            self._entries.append({
+                "question": question,
+                "sql": sql,
+                "literal": literal,
+                "literal_size": span[1] - span[0] if span else 0,
+                "shape": make_shape(tokens, span),
+            })
+            vectors.append(char_ngrams(" ".join(t[0] for t in tokens)))
+
+        document_frequency = Counter()
+        for vector in vectors:
+            document_frequency.update(vector.keys())
+        total = len(vectors)
+        self._idf = {gram: math.log((1 + total) / (1 + df)) + 1 for gram, df in document_frequency.items()}
+
+        self._norms = []
+        for doc_id, vector in enumerate(vectors):
+            weights = {gram: count * self._idf[gram] for gram, count in vector.items()}
+            self._norms.append(math.sqrt(sum(w * w for w in weights.values())) or 1.0)
+            for gram, weight in weights.items():
+                self._postings[gram].append((doc_id, weight))
+
+    def _nearest(self, tokens):
+        vector = char_ngrams(" ".join(t[0] for t in tokens))
+        scores = defaultdict(float)
+        norm = 0.0
+        for gram, count in vector.items():
+            idf = self._idf.get(gram)
+            if idf is None:
+                continue
+            weight = count * idf
+            norm += weight * weight
+            for doc_id, doc_weight in self._postings[gram]:
+                scores[doc_id] += weight * doc_weight
+        norm = math.sqrt(norm) or 1.0
+        ranked = sorted(scores.items(), key=lambda item: item[1] / (norm * self._norms[item[0]]), reverse=True)
+        return [doc_id for doc_id, _ in ranked[:self.candidates]]
+
+    def _align(self, question, tokens, entry):
+        """Shape of the new question relative to a cached entry, plus its entity text.
+
+        The words the cached question does not share become the entity, so
+        they must fill the literal's place exactly: as many words, with no
+        template word inside. Entries without a literal have no slot and
+        return the plain shape with no entity.
+        """
+        if entry["literal"] is None:
+            return make_shape(tokens), None
+
+        template_words = set(entry["shape"]) - {ENTITY}
+        leftover = [i for i, (token, _, _) in enumerate(tokens)
+                    if token not in STOPWORDS and stem(token) not in template_words]
+        if not leftover:
+            return None, None
+        span = (leftover[0], leftover[-1] + 1)
+        # Words that belong to the template must not sit inside the entity
+        inside = [tokens[i][0] for i in range(*span)]
+        if any(stem(t) in template_words for t in inside):
+            return None, None
+        if span[1] - span[0] != entry["literal_size"]:
+            return None, None
+        entity = question[tokens[span[0]][1]:tokens[span[1] - 1][2]]
+        return make_shape(tokens, span), entity
+
+    def match(self, question):
+        """Return the best near-duplicate as a dict with sql and score, or None.
+
+        The returned dict always carries the best score seen (``score``) so
+        misses can be reported too; ``sql`` is None when nothing cleared
+        the threshold.
+        """
+        if not self._entries:
+            return None
+        tokens = tokenize(question)
+        if not tokens:
+            return None
+
+        best = {"sql": None, "score": 0.0, "question": None}
+        for doc_id in self._nearest(tokens):
+            entry = self._entries[doc_id]
+            shape, entity = self._align(question, tokens, entry)
+            if shape is None:
+                continue
+            score = difflib.SequenceMatcher(None, shape, entry["shape"]).ratio()
+            # Only the entity may change: an entry without a literal, or any
+            # other content word that differs (a number, "above" for
+            # "below"), means different SQL, so the score is only reported
+            sql = None
+            if entity is not None and shape == entry["shape"]:
+                sql = substitute_literal(entry["sql"], entry["literal"], entity)
+            if (sql is not None, score) <= (best["sql"] is not None, best["score"]):
+                continue
+            best = {"sql": sql, "score": score, "question": entry["question"]}
+
+        if best["score"] < self.threshold:
+            best["sql"] = None
+        return best
@@ -0,0 +1,115 @@
+import hashlib
+import os
+import sqlite3
+import threading
+from logging_config import log_rows, setup_logging
+from name_search import available_columns
+
+logger = setup_logging('app.log')
+
+
+def is_internal_table(table_name):
+    """Tables the loader keeps for itself and never shows to the model"""
+    return table_name.startswith('sqlite_') or table_name.startswith('_')
+
+
+class SchemaCache:
+    """Per-worker cache of the schema and prompt context of a SQLite database.
+
+    The context is built once and only rebuilt when the database file is
+    replaced (different inode/size/mtime) or modified in place, which is
+    detected through ``PRAGMA data_version`` on a connection held open for
+    that purpose.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = None
+        self._file_id = None
+        self._data_version = None
+        self._context = None
+
+    def _file_identity(self):
+        stat = os.stat(self.db_path)
+        return (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def _reopen(self):
+        if self._conn is not None:
+            self._conn.close()
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+
+    def get(self):
+        """Return the schema context, rebuilding it if the database changed"""
+        with self._lock:
+            file_id = self._file_identity()
+            # A new inode means the file was replaced, so the held connection
+            # still points at the old one
+            if self._conn is None or file_id[:2] != self._file_id[:2]:
+                self._reopen()
+            data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+            if (self._context is None or file_id != self._file_id
+                    or data_version != self._data_version):
+                self._context = self._build()
+                # Changes with every swap or write, unlike the fingerprint,
+                # so plans and timings can be tied to the data they came from
+                self._context["data_version"] = f"{file_id}:{data_version}"
+                self._file_id = file_id
+                self._data_version = data_version
+            return self._context
+
+    def invalidate(self):
+        """Force a rebuild on the next call to get()"""
+        with self._lock:
+            self._context = None
+
+    def _build(self):
+        logger.info(f"Building schema context for {self.db_path}")
+        cursor = self._conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY rowid")
+        tables = [row[0] for row in cursor.fetchall() if not is_internal_table(row[0])]
+
+        schema = {}
+        row_counts = {}
+        query_context = []
+        logger.info("\nCurrent Database Schema and Samples:")
+        for table_name in tables:
+            cursor.execute(f'PRAGMA table_info("{table_name}")')
+            column_names = [col[1] for col in cursor.fetchall()]
+
+            # Get row count and sample data
+            cursor.execute(f'SELECT COUNT(*) FROM "{table_name}"')
+            row_count = cursor.fetchone()[0]
+            cursor.execute(f'SELECT * FROM "{table_name}" LIMIT 3')
+            sample_rows = cursor.fetchall()
+
+            logger.info(f"\nTable '{table_name}':")
+            logger.info(f"  Columns: {', '.join(column_names)}")
+            logger.info(f"  Total rows: {row_count}")
+            log_rows(logger, [dict(zip(column_names, row)) for row in sample_rows], "    ")
+
+            schema[table_name] = column_names
+            row_counts[table_name] = row_count
+            query_context.append(f"Table '{table_name}' ({row_count} rows) with columns: {', '.join(column_names)}")
+
+        schema_text = "Database tables and their columns:\n"
+        for table_name, columns in schema.items():
+            schema_text += f"\nTable '{table_name}':\n"
+            schema_text += "Columns: " + ", ".join(columns) + "\n"
+
+        # Identifies the table/column layout only, so a reload that keeps the
+        # same schema keeps the same fingerprint
+        fingerprint = hashlib.sha256(
+            repr(sorted((t.lower(), [c.lower() for c in cols]) for t, cols in schema.items())).encode()
+        ).hexdigest()
+
+        return {
+            "schema": schema,
+            "row_counts": row_counts,
+            "query_context": "\n".join(query_context),
+            "schema_text": schema_text,
+            "fingerprint": fingerprint,
+            # Name columns with a trigram index, for rewriting LIKE '%x%'
+            "name_search": available_columns(self._conn),
+        }
@@ -0,0 +1,91 @@
+import re
+from excel_reader import FALSE_STRINGS, FLOAT_RE, INT_RE, TRUE_STRINGS
+
+# Key/value sheets turned into one row per entity and one column per setting:
+# wide table -> (source table, key columns, setting column, value column).
+# "Which cameras have X set to Y" then is a lookup on an indexed column
+# instead of a self-join of the key/value rows per setting. The key includes
+# the channel, since two channels of one device may share a camera name.
+PIVOT_TABLES = {
+    'camerageneralsettings_wide': ('camerageneralsettings', ['recordingserver', 'hardware', 'camera', 'channel'],
+                                   'setting', 'value'),
+}
+
+
+def setting_column(setting):
+    """Column name for a setting, e.g. 'Daynight+Color+Mode' -> 'daynight_color_mode'"""
+    return re.sub(r'[^0-9a-z]+', '_', str(setting).lower()).strip('_') or 'setting'
+
+
+def setting_type(values):
+    """Column type and cast for a setting given its distinct non-empty values"""
+    values = [str(v) for v in values]
+    if values and all(v in TRUE_STRINGS or v in FALSE_STRINGS for v in values):
+        true_list = ", ".join(f"'{v}'" for v in sorted(TRUE_STRINGS))
+        return 'INTEGER', f"CASE WHEN {{value}} IN ({true_list}) THEN 1 WHEN {{value}} IS NOT NULL THEN 0 END"
+    if values and all(INT_RE.match(v) for v in values):
+        return 'INTEGER', "CAST({value} AS INTEGER)"
+    if values and all(FLOAT_RE.match(v) for v in values):
+        return 'REAL', "CAST({value} AS REAL)"
+    return 'TEXT', "{value}"
+
+
+def create_pivot_tables(conn, pivots=None):
+    """Build the wide settings tables from their key/value tables.
+
+    Each setting becomes a column typed from its values, filled by one
+    INSERT ... SELECT that groups the key/value rows by entity, and gets a
+    partial index over the entities that have it set. Tables whose source
+    or columns are missing from the workbook are skipped.
+    Returns {wide table: row count}.
+    """
+    built = {}
+    for wide_table, (source, keys, setting_col, value_col) in (pivots or PIVOT_TABLES).items():
+        existing = {row[1]: row[2] for row in conn.execute(f'PRAGMA table_info("{source}")')}
+        if not existing or not set(keys + [setting_col, value_col]) <= set(existing):
+            continue
+        # Distinct values per setting, to type its column
+        settings = {}
+        for setting, value in conn.execute(
+                f'SELECT DISTINCT "{setting_col}", "{value_col}" FROM "{source}" '
+                f'WHERE "{setting_col}" IS NOT NULL ORDER BY "{setting_col}"'):
+            values = settings.setdefault(setting, [])
+            if value is not None and value != '':
+                values.append(value)
+
+        columns = []
+        used = set(keys)
+        for setting, values in settings.items():
+            name = setting_column(setting)
+            while name in used:
+                name += '_'
+            used.add(name)
+            col_type, cast = setting_type(values)
+            columns.append((setting, name, col_type, cast))
+
+        key_list = ", ".join(f'"{key}"' for key in keys)
+        definitions = ([f'"{key}" {existing[key] or "TEXT"}' for key in keys] +
+                       [f'"{name}" {col_type}' for _, name, col_type, _ in columns])
+        conn.execute(f'DROP TABLE IF EXISTS "{wide_table}"')
+        conn.execute(f'CREATE TABLE "{wide_table}" (\n  ' + ",\n  ".join(definitions) + '\n)')
+
+        # Empty values count as not set
+        value = f"NULLIF(\"{value_col}\", '')"
+        selects = [
+            f"MAX(CASE WHEN \"{setting_col}\" = ? THEN {cast.format(value=value)} END)"
+            for _, _, _, cast in columns
+        ]
+        conn.execute(
+            f'INSERT INTO "{wide_table}" ({key_list}, ' + ", ".join(f'"{name}"' for _, name, _, _ in columns) + ') '
+            f'SELECT {key_list}, ' + ", ".join(selects) + f' FROM "{source}" GROUP BY {key_list}',
+            [setting for setting, _, _, _ in columns]
+        )
+
+        conn.execute(f'CREATE UNIQUE INDEX "idx_{wide_table}_key" ON "{wide_table}" ({key_list})')
+        if 'camera' in keys:
+            conn.execute(f'CREATE INDEX "idx_{wide_table}_camera" ON "{wide_table}" ("camera")')
+        for _, name, _, _ in columns:
+            conn.execute(f'CREATE INDEX "idx_{wide_table}_{name}" ON "{wide_table}" ("{name}") '
+                         f'WHERE "{name}" IS NOT NULL')
+        built[wide_table] = conn.execute(f'SELECT COUNT(*) FROM "{wide_table}"').fetchone()[0]
+    return built
@@ -13,6 +13,7 @@ setup(
         'openai>=1.0.0',
         'python-dotenv>=1.0.0',
         'gunicorn>=21.2.0',
+        'gevent>=23.9.1',
         'SQLAlchemy>=2.0.21',
         'Flask-SQLAlchemy>=3.1.1'
     ],
@@ -0,0 +1,50 @@
+import importlib
+import os
+import sys
+import tempfile
+import types
+import pytest
+
+# The app's modules live in the repository root
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The modules write logs/ and their side databases to the working
+# directory; run in a scratch one so the checkout is left alone
+WORKDIR = tempfile.mkdtemp(prefix='hardware-query-tests-')
+os.chdir(WORKDIR)
+
+
+class FakeCompletions:
+    """Stands in for client.chat.completions, answering every question with ``sql``"""
+
+    def __init__(self):
+        self.sql = "SELECT name FROM cameras"
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        message = types.SimpleNamespace(content=self.sql)
+        usage = types.SimpleNamespace(prompt_tokens=100, completion_tokens=20, total_tokens=120)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)], usage=usage)
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    """app.py, with hardware.db built from hardware_data.xlsx in the scratch directory"""
+    os.environ.setdefault('OPENAI_API_KEY', 'test')
+    os.environ['TRACE_ENABLED'] = '0'
+    return importlib.import_module('app')
+
+
+@pytest.fixture
+def llm(app_module, monkeypatch):
+    completions = FakeCompletions()
+    monkeypatch.setattr(app_module, 'client',
+                        types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions)))
+    return completions
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
@@ -0,0 +1,71 @@
+import json
+import sqlite3
+import sys
+import pandas as pd
+import pytest
+import benchmark_pipeline
+from benchmark_pipeline import compare, measure, scaled_workbook
+from generate_workbook import write_sqlite, write_xlsx
+
+
+@pytest.fixture(scope='module')
+def database(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('benchmark') / 'synthetic.db')
+    assert write_sqlite(path, 20)
+    return path
+
+
+def run_main(monkeypatch, *args):
+    monkeypatch.setattr(sys, 'argv', ['benchmark_pipeline.py', *args])
+    benchmark_pipeline.main()
+
+
+def test_measure_summarizes_every_run():
+    calls = []
+    result = measure(lambda: calls.append(1), 5)
+    assert len(calls) == 5 and result["runs"] == 5
+    assert 0 <= result["min_ms"] <= result["median_ms"] <= result["p95_ms"]
+
+
+def test_compare_ignores_noise_and_new_benchmarks():
+    baseline = {"results": {"schema.warm": {"median_ms": 0.01}, "execute.q01": {"median_ms": 10.0},
+                            "format": {"median_ms": 10.0}}}
+    results = {"schema.warm": {"median_ms": 0.03}, "execute.q01": {"median_ms": 13.0},
+               "format": {"median_ms": 11.0}, "serialize": {"median_ms": 5.0}}
+    # schema.warm tripled, but by less than min_delta_ms
+    assert compare(results, baseline, tolerance=0.2) == ['execute.q01']
+
+
+def test_scaled_workbook_renames_the_copies(tmp_path):
+    excel_path, out_path = str(tmp_path / 'small.xlsx'), str(tmp_path / 'scaled.xlsx')
+    write_xlsx(excel_path, 10, events_per_camera=1)
+    scaled_workbook(excel_path, 2, out_path)
+    original = pd.read_excel(excel_path, 'Cameras')
+    scaled = pd.read_excel(out_path, 'Cameras')
+    assert len(scaled) == 2 * len(original)
+    assert scaled["Name"].is_unique
+    assert set(scaled["Hardware"][len(original):]) == {f"{name} #1" for name in original["Hardware"]}
+
+
+def test_baseline_round_trip(database, tmp_path, monkeypatch, capsys):
+    baseline = str(tmp_path / 'baseline.json')
+    run_main(monkeypatch, '--database', database, '--repeat', '2', '--baseline', baseline, '--save')
+    with open(baseline) as f:
+        report = json.load(f)
+    with sqlite3.connect(database) as conn:
+        cameras = conn.execute("SELECT COUNT(*) FROM cameras").fetchone()[0]
+    assert report["meta"]["cameras"] == cameras and report["meta"]["repeat"] == 2
+    assert {"schema.cold", "schema.warm", "prompt", "execute.total", "format", "serialize"} <= set(report["results"])
+    assert "build" not in report["results"]
+
+    # A baseline far faster than anything measurable makes every stage a regression
+    for result in report["results"].values():
+        result["median_ms"] = 0
+    with open(baseline, 'w') as f:
+        json.dump(report, f)
+    capsys.readouterr()
+    with pytest.raises(SystemExit) as exited:
+        run_main(monkeypatch, '--database', database, '--repeat', '2', '--baseline', baseline, '--check',
+                 '--min-delta-ms', '0')
+    assert exited.value.code == 1
+    assert 'REGRESSION' in capsys.readouterr().out
@@ -0,0 +1,141 @@
+import glob
+import os
+import sqlite3
+import pytest
+import create_db
+from create_db import build_database, create_and_load_database, is_up_to_date, read_build_meta, workbook_hash
+from generate_workbook import generated_sheets, write_xlsx
+
+
+@pytest.fixture(scope='module')
+def workbooks(tmp_path_factory):
+    """Two small generated workbooks with different contents"""
+    folder = tmp_path_factory.mktemp('workbooks')
+    paths = []
+    for seed in (1, 2):
+        path = str(folder / f"hardware_{seed}.xlsx")
+        write_xlsx(path, 20, seed=seed, events_per_camera=3)
+        paths.append(path)
+    return paths
+
+
+@pytest.fixture
+def builds(monkeypatch):
+    """Workbook hashes of the builds create_and_load_database() starts"""
+    started = []
+    build = create_db.build_database
+
+    def record(excel_path, db_path, workbook_sha256, **kwargs):
+        started.append(workbook_sha256)
+        return build(excel_path, db_path, workbook_sha256, **kwargs)
+    monkeypatch.setattr(create_db, 'build_database', record)
+    return started
+
+
+def test_unchanged_workbook_is_not_rebuilt(workbooks, tmp_path, builds):
+    db_path = str(tmp_path / 'hardware.db')
+    assert create_and_load_database(workbooks[0], db_path)
+    assert read_build_meta(db_path)["workbook_sha256"] == workbook_hash(workbooks[0])
+    assert create_and_load_database(workbooks[0], db_path)
+    assert builds == [workbook_hash(workbooks[0])]
+
+
+def test_changed_workbook_or_force_rebuilds(workbooks, tmp_path, builds):
+    db_path = str(tmp_path / 'hardware.db')
+    create_and_load_database(workbooks[0], db_path)
+    assert create_and_load_database(workbooks[1], db_path)
+    assert create_and_load_database(workbooks[1], db_path, force=True)
+    assert builds == [workbook_hash(workbooks[0])] + [workbook_hash(workbooks[1])] * 2
+
+
+def test_other_build_parameters_are_out_of_date(workbooks, tmp_path):
+    db_path = str(tmp_path / 'hardware.db')
+    create_and_load_database(workbooks[0], db_path)
+    assert is_up_to_date(workbooks[0], db_path)
+    assert not is_up_to_date(workbooks[0], db_path, extra_indexes={'idx_cameras_storage': ('cameras', ['storage'])})
+
+
+def test_database_missing_a_table_is_out_of_date(workbooks, tmp_path):
+    db_path = str(tmp_path / 'hardware.db')
+    create_and_load_database(workbooks[0], db_path)
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("DROP TABLE cameragroups")
+    assert not is_up_to_date(workbooks[0], db_path)
+    assert not is_up_to_date(workbooks[0], str(tmp_path / 'missing.db'))
+
+
+def camera_names(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM cameras")}
+
+
+def test_open_readers_keep_the_old_database_until_the_swap(workbooks, tmp_path):
+    db_path = str(tmp_path / 'hardware.db')
+    create_and_load_database(workbooks[0], db_path)
+    reader = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    before = camera_names(reader)
+    assert create_and_load_database(workbooks[1], db_path)
+    # The old file stays whole for connections opened before the rename
+    assert camera_names(reader) == before
+    reader.close()
+    with sqlite3.connect(db_path) as conn:
+        assert camera_names(conn) != before
+    assert glob.glob(f"{db_path}.build-*") == []
+    assert read_build_meta(f"{db_path}.backup")["workbook_sha256"] == workbook_hash(workbooks[1])
+
+
+def test_failed_build_leaves_the_live_database_alone(workbooks, tmp_path):
+    db_path = str(tmp_path / 'hardware.db')
+    create_and_load_database(workbooks[0], db_path)
+    live_sha256 = read_build_meta(db_path)["workbook_sha256"]
+
+    def broken_sheets(part_prefix):
+        sheets = generated_sheets(part_prefix, 20, workers=1)
+        yield next(sheets)
+        raise RuntimeError("workbook went away")
+    assert not build_database(None, db_path, 'other', read_sheets=broken_sheets)
+    assert read_build_meta(db_path)["workbook_sha256"] == live_sha256
+    assert glob.glob(f"{db_path}.build-*") == []
+
+
+def test_leftover_build_files_are_removed(workbooks, tmp_path):
+    db_path = str(tmp_path / 'hardware.db')
+    leftover = f"{db_path}.build-999999"
+    with open(leftover, 'w') as f:
+        f.write('killed build')
+    assert create_and_load_database(workbooks[0], db_path)
+    if create_db.fcntl is not None:
+        assert not os.path.exists(leftover)
+
+
+def dump(db_path):
+    """Schema and rows of every data table in a database"""
+    with sqlite3.connect(db_path) as conn:
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' "
+            "AND name NOT LIKE '\\_%' ESCAPE '\\' ORDER BY name")]
+        return {table: (conn.execute("SELECT sql FROM sqlite_master WHERE name = ?", (table,)).fetchone(),
+                        sorted(map(repr, conn.execute(f'SELECT * FROM "{table}"'))))
+                for table in tables}
+
+
+@pytest.mark.parametrize('bulk', [True, False])
+def test_bulk_mode_builds_the_same_database(tmp_path, bulk):
+    db_path = str(tmp_path / 'hardware.db')
+    sheets = lambda prefix: generated_sheets(prefix, 20, events_per_camera=3, workers=1)
+    assert build_database(None, db_path, 'generated', bulk=bulk, read_sheets=sheets)
+    reference = str(tmp_path / 'reference.db')
+    build_database(None, reference, 'generated', bulk=not bulk, read_sheets=sheets)
+    assert dump(db_path) == dump(reference)
+    # The pragmas only applied to the build connection
+    with sqlite3.connect(db_path) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'delete'
+        assert conn.execute("PRAGMA integrity_check").fetchone()[0] == 'ok'
+
+
+def test_verification_catches_missing_rows(tmp_path):
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE cameras (name TEXT)")
+    conn.executemany("INSERT INTO cameras VALUES (?)", [("a",), ("b",)])
+    create_db.verify_database(conn, {"cameras": 2})
+    with pytest.raises(sqlite3.DatabaseError, match="has 2 rows, expected 3"):
+        create_db.verify_database(conn, {"cameras": 3})
@@ -0,0 +1,85 @@
+import os
+import sqlite3
+import pytest
+from db_pool import ReadOnlyConnectionPool
+
+
+def write_database(path, names):
+    """Write a database the way the loader does: into a new file renamed over the old one"""
+    build_path = f"{path}.build"
+    with sqlite3.connect(build_path) as conn:
+        conn.execute("CREATE TABLE cameras (name TEXT)")
+        conn.executemany("INSERT INTO cameras VALUES (?)", [(name,) for name in names])
+    os.replace(build_path, path)
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'hardware.db')
+    write_database(path, ['Camp East 1', 'Camp East 2'])
+    return path
+
+
+def names(conn):
+    return sorted(row[0] for row in conn.execute("SELECT name FROM cameras"))
+
+
+def test_connections_are_reused(db_path):
+    pool = ReadOnlyConnectionPool(db_path)
+    with pool.connection() as conn:
+        first = conn
+    with pool.connection() as conn:
+        assert conn is first
+
+
+def test_connections_cannot_write(db_path):
+    pool = ReadOnlyConnectionPool(db_path)
+    with pool.connection() as conn, pytest.raises(sqlite3.OperationalError):
+        conn.execute("DELETE FROM cameras")
+
+
+def test_pool_reopens_after_the_database_is_swapped(db_path):
+    pool = ReadOnlyConnectionPool(db_path)
+    with pool.connection() as conn:
+        old = conn
+        assert names(conn) == ['Camp East 1', 'Camp East 2']
+    write_database(db_path, ['Unit 5 1'])
+    with pool.connection() as conn:
+        assert conn is not old
+        assert names(conn) == ['Unit 5 1']
+    # The old connection was closed, not kept around
+    with pytest.raises(sqlite3.ProgrammingError):
+        old.execute("SELECT 1")
+
+
+def test_connection_released_after_a_swap_is_closed(db_path):
+    pool = ReadOnlyConnectionPool(db_path)
+    conn = pool.acquire()
+    write_database(db_path, ['Unit 5 1'])
+    # A request that started before the swap finishes on the old file
+    assert names(conn) == ['Camp East 1', 'Camp East 2']
+    pool.release(conn)
+    with pool.connection() as fresh:
+        assert fresh is not conn
+        assert names(fresh) == ['Unit 5 1']
+
+
+def test_release_clears_what_a_request_left_behind(db_path):
+    pool = ReadOnlyConnectionPool(db_path)
+    conn = pool.acquire()
+    conn.set_progress_handler(lambda: 1, 1)
+    pool.release(conn)
+    with pool.connection() as again:
+        assert again is conn
+        assert names(again)
+
+
+def test_idle_connections_are_bounded(db_path):
+    pool = ReadOnlyConnectionPool(db_path, max_idle=2)
+    held = [pool.acquire() for _ in range(3)]
+    for conn in held:
+        pool.release(conn)
+    with pytest.raises(sqlite3.ProgrammingError):
+        held[2].execute("SELECT 1")
+    reused = [pool.acquire() for _ in range(3)]
+    assert sum(conn in held for conn in reused) == 2
@@ -0,0 +1,63 @@
+import datetime
+import sqlite3
+import pytest
+from openpyxl import Workbook
+from excel_reader import header_names, parse_workbook, sheet_names, write_part
+from generate_workbook import write_xlsx
+
+
+def part_rows(sheet):
+    with sqlite3.connect(sheet["part_path"]) as conn:
+        return conn.execute(f'SELECT * FROM "{sheet["table_name"]}"').fetchall()
+
+
+def describe(sheets):
+    """Sheet descriptions and part contents, without the per-run fields"""
+    return [({k: v for k, v in sheet.items() if k not in ('part_path', 'parse_seconds')}, part_rows(sheet))
+            for sheet in sheets]
+
+
+def test_parallel_parse_matches_the_serial_one(tmp_path):
+    path = str(tmp_path / 'hardware.xlsx')
+    write_xlsx(path, 20, events_per_camera=3)
+    serial = list(parse_workbook(path, str(tmp_path / 'serial'), workers=1))
+    parallel = list(parse_workbook(path, str(tmp_path / 'parallel'), workers=4))
+    assert [sheet["sheet_name"] for sheet in parallel] == sheet_names(path)
+    assert describe(parallel) == describe(serial)
+
+
+def test_header_names_follow_pandas():
+    assert header_names(["Name", None, "Name", "Value", None, None]) == ["Name", "Unnamed: 1", "Name.1", "Value"]
+
+
+def test_column_types_follow_what_pandas_read(tmp_path):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = 'Mixed Sheet'
+    sheet.append(['Count', 'Gaps', 'Ratio', 'Flag', 'Text Flag', 'Numeric Text', 'Seen', 'Empty', 'Label'])
+    sheet.append([1, 1, 1.5, True, 'True', '12', datetime.datetime(2022, 12, 22, 14, 43), None, 'a'])
+    sheet.append([2, None, 2, False, 'false', '13', datetime.datetime(2022, 12, 23), 'N/A', 'NULL'])
+    sheet.append([None] * 9)
+    path = str(tmp_path / 'mixed.xlsx')
+    workbook.save(path)
+
+    parsed, = parse_workbook(path, str(tmp_path / 'mixed'), workers=1)
+    assert parsed["table_name"] == 'mixed_sheet'
+    assert parsed["columns"] == ['count', 'gaps', 'ratio', 'flag', 'text_flag', 'numeric_text', 'seen',
+                                 'empty', 'label']
+    assert parsed["types"] == ['INTEGER', 'REAL', 'REAL', 'INTEGER', 'INTEGER', 'INTEGER', 'TIMESTAMP',
+                               'REAL', 'TEXT']
+    # Text true/false is converted when the table is filled from the part
+    assert 'CASE' in parsed["expressions"][4]
+    # The empty row is dropped, NA strings become NULL
+    assert parsed["row_count"] == 2
+    assert part_rows(parsed)[1] == (2, None, 2, 0, 'false', '13', '2022-12-23 00:00:00', None, None)
+
+
+@pytest.mark.parametrize('batch_size', [1, 7, 5000])
+def test_rows_are_written_in_batches(tmp_path, batch_size):
+    rows = ((i, f"camera {i}") if i % 10 else (i,) for i in range(25))
+    sheet = write_part('Cameras', ['Id', 'Name'], rows, str(tmp_path / 'cameras.part'), batch_size)
+    assert sheet["row_count"] == 25
+    assert len(sheet["samples"]) == 3
+    assert part_rows(sheet)[10] == (10, None)
@@ -0,0 +1,56 @@
+import sqlite3
+import pytest
+from openpyxl import load_workbook
+from create_db import create_and_load_database
+from generate_workbook import SHEET_COLUMNS, devices, parse_count, sheet_rows, write_sqlite, write_xlsx
+
+
+def test_parse_count():
+    assert [parse_count(text) for text in ('5000', '1k', '2.5K', '1M', ' 100k ')] == [
+        5000, 1000, 2500, 1000000, 100000]
+
+
+def test_devices_cover_the_cameras_asked_for():
+    generated = list(devices(250, seed=7))
+    assert sum(len(device["cameras"]) for device in generated) == 250
+    assert [camera["index"] for device in generated for camera in device["cameras"]] == list(range(250))
+    assert generated == list(devices(250, seed=7))
+    assert generated != list(devices(250, seed=8))
+
+
+def test_sheets_refer_to_names_the_others_define():
+    hardware = {row[0] for row in sheet_rows('Hardware', 200)}
+    cameras = {(row[5], row[0]) for row in sheet_rows('Cameras', 200)}
+    assert len(cameras) == 200 and {name for name, _ in cameras} <= hardware
+    for sheet_name, columns in SHEET_COLUMNS.items():
+        if 'Camera' in columns:
+            hardware_column, camera_column = columns.index('Hardware'), columns.index('Camera')
+            rows = list(sheet_rows(sheet_name, 200))
+            assert all(len(row) == len(columns) for row in rows)
+            assert {(row[hardware_column], row[camera_column]) for row in rows} <= cameras
+
+
+def test_xlsx_row_limit_fails_before_writing(tmp_path):
+    path = tmp_path / 'too_big.xlsx'
+    with pytest.raises(ValueError, match='--format sqlite'):
+        write_xlsx(str(path), 40000)
+    assert not path.exists()
+
+
+def table_counts(db_path):
+    with sqlite3.connect(db_path) as conn:
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' "
+            "AND name NOT LIKE '\\_%' ESCAPE '\\' ORDER BY name")]
+        return {table: conn.execute(f'SELECT COUNT(*) FROM "{table}"').fetchone()[0] for table in tables}
+
+
+def test_sqlite_output_matches_a_build_from_the_workbook(tmp_path):
+    excel_path = str(tmp_path / 'synthetic.xlsx')
+    counts = write_xlsx(excel_path, 30, events_per_camera=3)
+    assert load_workbook(excel_path, read_only=True).sheetnames == list(SHEET_COLUMNS)
+    from_workbook, generated = str(tmp_path / 'from_workbook.db'), str(tmp_path / 'generated.db')
+    assert create_and_load_database(excel_path, from_workbook, force=True)
+    assert write_sqlite(generated, 30, events_per_camera=3)
+    assert table_counts(generated) == table_counts(from_workbook)
+    assert table_counts(generated)['cameraevents'] == counts['CameraEvents'] == 90
@@ -0,0 +1,50 @@
+import sqlite3
+import pytest
+from create_db import TABLE_INDEXES, create_indexes
+from query_plan import explain, table_aliases
+
+
+@pytest.fixture
+def conn(app_module):
+    conn = sqlite3.connect(app_module.DATABASE_PATH)
+    yield conn
+    conn.close()
+
+
+def test_loader_creates_the_indexes_and_statistics(conn):
+    created = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert set(TABLE_INDEXES) <= created
+    assert conn.execute("SELECT COUNT(*) FROM sqlite_stat1").fetchone()[0] > 0
+
+
+def test_prefix_search_uses_the_nocase_index(conn):
+    plan = explain(conn, "SELECT name FROM cameras WHERE hardware LIKE 'Camp East%'")
+    assert plan["indexes"] == ['idx_cameras_hardware_nocase']
+    assert plan["full_scans"] == []
+
+
+def test_join_looks_cameras_up_by_hardware(conn):
+    plan = explain(conn, "SELECT c.name FROM hardware h JOIN cameras c ON c.hardware = h.name "
+                         "WHERE h.model = 'Pelco IME229'")
+    assert 'idx_hardware_model' in plan["indexes"]
+    assert 'idx_cameras_hardware' in plan["indexes"]
+    assert plan["full_scans"] == []
+
+
+def test_indexes_on_missing_columns_are_skipped():
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE cameras (name TEXT)")
+    create_indexes(conn, {
+        'idx_cameras_name_nocase': ('cameras', ['name COLLATE NOCASE']),
+        'idx_cameras_hardware': ('cameras', ['hardware']),
+    })
+    created = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")]
+    assert created == ['idx_cameras_name_nocase']
+
+
+def test_plan_reports_tables_rather_than_aliases():
+    assert table_aliases("SELECT * FROM cameras c, hardware AS h WHERE c.hardware = h.name") == {
+        'cameras': 'cameras', 'c': 'cameras', 'hardware': 'hardware', 'h': 'hardware'}
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE cameras (name TEXT, storage TEXT)")
+    assert explain(conn, "SELECT c.name FROM cameras c WHERE c.storage = 'x'")["full_scans"] == ['cameras']
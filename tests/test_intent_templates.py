@@ -0,0 +1,29 @@
+from intent_templates import match_template
+
+SCHEMA = {
+    'hardware': ['name', 'address', 'firmwareversion'],
+    'cameras': ['name', 'channel', 'hardware'],
+}
+
+
+def test_site_question_uses_the_template():
+    match = match_template("show me all cameras in Camp East", SCHEMA)
+    assert match["name"] == 'site_cameras'
+    assert match["params"] == ('Camp East%',)
+
+
+def test_entity_may_contain_clause_words_inside_other_words():
+    assert match_template("cameras in Camp Withers", SCHEMA)["params"] == ('Camp Withers%',)
+
+
+def test_extra_condition_goes_to_the_model():
+    assert match_template("show me all cameras in Camp East with motion enabled", SCHEMA) is None
+    assert match_template("what is the ip of Intake and Medical", SCHEMA) is None
+    assert match_template("firmware for Camp East that is outdated", SCHEMA) is None
+
+
+def test_extra_condition_is_not_answered_with_an_empty_result(llm, client):
+    llm.sql = "SELECT name FROM cameras WHERE hardware LIKE 'Camp East%' AND motionenabled = 1"
+    response = client.post('/query', json={"query": "show me all cameras in Camp East with motion enabled"})
+    assert llm.calls == 1
+    assert response.get_json()["query"] == llm.sql
@@ -0,0 +1,64 @@
+import os
+import sqlite3
+import pytest
+from openpyxl import Workbook
+from create_linked_db import CAMERA_CHILDREN, create_database, strict_type
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='module')
+def linked(tmp_path_factory):
+    db_path = str(tmp_path_factory.mktemp('linked') / 'hardware_linked.db')
+    assert create_database(os.path.join(ROOT, 'hardware_data.xlsx'), db_path)
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA foreign_keys=ON")
+    yield conn
+    conn.close()
+
+
+def test_every_table_is_strict_and_its_keys_hold(linked):
+    tables = linked.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table' "
+                            "AND name NOT LIKE 'sqlite_%'").fetchall()
+    assert {name for name, _ in tables} >= {'hardware', 'cameras'} | set(CAMERA_CHILDREN)
+    assert all(sql.rstrip().endswith('STRICT') for _, sql in tables)
+    assert linked.execute("PRAGMA foreign_key_check").fetchall() == []
+
+
+def test_ids_link_the_same_rows_as_the_names(linked, app_module):
+    by_id = linked.execute("SELECT h.name, c.name FROM cameras c JOIN hardware h USING (hardware_id)").fetchall()
+    with sqlite3.connect(app_module.DATABASE_PATH) as conn:
+        by_name = conn.execute("SELECT hardware, name FROM cameras").fetchall()
+    assert sorted(by_id) == sorted(by_name)
+    orphans = linked.execute("SELECT COUNT(*) FROM cameraevents WHERE camera_id IS NULL").fetchone()[0]
+    assert orphans == 0
+
+
+def test_flags_are_integers(linked):
+    kinds = {row[0] for row in linked.execute("SELECT DISTINCT typeof(enabled) FROM cameras")}
+    assert kinds == {'integer'}
+    with pytest.raises(sqlite3.IntegrityError):
+        linked.execute("UPDATE cameras SET enabled = 2")
+
+
+def test_unknown_device_fails_the_build(tmp_path):
+    workbook = Workbook()
+    hardware = workbook.active
+    hardware.title = 'Hardware'
+    hardware.append(['Name', 'Address'])
+    hardware.append(['Camp East 100 (10.101.0.1)', 'http://10.101.0.1/'])
+    cameras = workbook.create_sheet('Cameras')
+    cameras.append(['Name', 'Hardware', 'Channel'])
+    cameras.append(['Camp East 100', 'Camp West 101 (10.101.0.2)', 1])
+    excel_path = str(tmp_path / 'broken.xlsx')
+    workbook.save(excel_path)
+
+    db_path = str(tmp_path / 'hardware_linked.db')
+    assert not create_database(excel_path, db_path)
+    assert os.listdir(tmp_path) == ['broken.xlsx']
+
+
+def test_integer_columns_with_gaps_stay_integers():
+    assert strict_type(['int']) == ('INTEGER', False)
+    assert strict_type(['bool', 'text_bool']) == ('INTEGER', True)
+    assert strict_type(['int', 'text']) == ('TEXT', False)
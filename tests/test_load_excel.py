@@ -0,0 +1,42 @@
+import pytest
+from models import db
+from benchmark_load_excel import contents_digest, generate_workbook, make_app
+from load_excel import bulk_load_excel_to_db, load_excel_to_db
+
+
+@pytest.fixture(scope='module')
+def workbook(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('eav') / 'benchmark.xlsx')
+    generate_workbook(path, sheets=2, rows=60)
+    return path
+
+
+@pytest.fixture
+def load(workbook, tmp_path):
+    """Load the workbook ``times`` times into a new database; returns its counts and digest"""
+    apps = []
+
+    def run(loader, name, times=1, **kwargs):
+        flask_app = make_app(str(tmp_path / name))
+        apps.append(flask_app)
+        for _ in range(times):
+            assert loader(workbook, flask_app=flask_app, **kwargs)
+        return contents_digest(flask_app)
+    yield run
+    for flask_app in apps:
+        with flask_app.app_context():
+            db.engine.dispose()
+
+
+def test_bulk_loader_writes_what_the_orm_loader_wrote(load):
+    orm = load(load_excel_to_db, 'orm.db')
+    bulk = load(bulk_load_excel_to_db, 'bulk.db', batch_size=7)
+    assert orm[0] == {'sheets': 2, 'columns': 16, 'rows': 120, 'cells': 960}
+    assert bulk == orm
+
+
+def test_bulk_loader_continues_after_existing_records(load):
+    orm = load(load_excel_to_db, 'orm.db', times=2)
+    bulk = load(bulk_load_excel_to_db, 'bulk.db', times=2)
+    assert bulk[0]['cells'] == 1920
+    assert bulk == orm
@@ -0,0 +1,62 @@
+import logging
+import logging.handlers
+import os
+import subprocess
+import sys
+import pytest
+import logging_config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = """
+import logging
+from logging_config import setup_logging
+logger = setup_logging('levels.log')
+logger.info('info line')
+logger.warning('warning line')
+logger.error('error line')
+logging.getLogger('some.library').warning('library line')
+"""
+
+
+def run_script(tmp_path, **levels):
+    env = dict(os.environ, PYTHONPATH=ROOT, **levels)
+    result = subprocess.run([sys.executable, '-c', SCRIPT], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, check=True)
+    with open(tmp_path / 'logs' / 'levels.log') as f:
+        return f.read(), result.stdout
+
+
+def test_file_and_console_levels_are_separate(tmp_path):
+    written, printed = run_script(tmp_path, LOG_LEVEL='INFO', LOG_FILE_LEVEL='WARNING', LOG_CONSOLE_LEVEL='ERROR')
+    # Everything queued is flushed by the time the process exits
+    assert 'info line' not in written
+    assert 'warning line' in written and 'error line' in written and 'library line' in written
+    assert 'error line' in printed and 'warning line' not in printed
+
+
+def test_records_go_through_the_queue():
+    logging_config.setup_logging('app.log')
+    # pytest adds capture handlers of its own
+    handlers = [h for h in logging.getLogger().handlers if not type(h).__module__.startswith('_pytest')]
+    assert len(handlers) == 1 and isinstance(handlers[0], logging.handlers.QueueHandler)
+
+
+@pytest.fixture
+def debug_rows(monkeypatch, caplog):
+    monkeypatch.setattr(logging_config, 'LOG_ROWS', True)
+    monkeypatch.setattr(logging_config, 'LOG_ROW_SAMPLE', 2)
+    caplog.set_level(logging.DEBUG, logger='logging_config')
+    return caplog
+
+
+def test_rows_are_sampled(debug_rows):
+    logging_config.log_rows(logging.getLogger('logging_config'), [{"n": i} for i in range(5)])
+    assert [record.getMessage() for record in debug_rows.records] == [
+        "  {'n': 0}", "  {'n': 1}", "  ... 3 more rows"]
+
+
+def test_rows_are_not_logged_by_default(monkeypatch, debug_rows):
+    monkeypatch.setattr(logging_config, 'LOG_ROWS', False)
+    logging_config.log_rows(logging.getLogger('logging_config'), [{"n": 1}])
+    assert debug_rows.records == []
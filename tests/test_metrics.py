@@ -0,0 +1,63 @@
+import pytest
+from metrics import Metrics
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'metrics.db')
+
+
+def test_render_writes_prometheus_text(path):
+    metrics = Metrics(path, buckets=[0.1, 1])
+    metrics.inc('query_requests_total')
+    metrics.inc('query_requests_total')
+    metrics.inc('llm_errors_total', kind='timeout')
+    for seconds in (0.05, 0.5, 3):
+        metrics.observe('query_stage_seconds', seconds, stage='execute')
+    assert metrics.render().splitlines() == [
+        '# HELP llm_errors_total Failed calls to the OpenAI API',
+        '# TYPE llm_errors_total counter',
+        'llm_errors_total{kind="timeout"} 1',
+        '# HELP query_requests_total Requests to /query',
+        '# TYPE query_requests_total counter',
+        'query_requests_total 2',
+        '# HELP query_stage_seconds Time spent in each stage of answering a question',
+        '# TYPE query_stage_seconds histogram',
+        'query_stage_seconds_bucket{stage="execute",le="0.1"} 1',
+        'query_stage_seconds_bucket{stage="execute",le="1"} 2',
+        'query_stage_seconds_bucket{stage="execute",le="+Inf"} 3',
+        'query_stage_seconds_sum{stage="execute"} 3.550000',
+        'query_stage_seconds_count{stage="execute"} 3',
+    ]
+
+
+def test_workers_add_up(path):
+    first, second = Metrics(path, buckets=[1]), Metrics(path, buckets=[1])
+    first.inc('query_requests_total')
+    second.inc('query_requests_total', 2)
+    second.observe('query_duration_seconds', 0.5)
+    first.flush()
+    text = second.render()
+    assert 'query_requests_total 3' in text.splitlines()
+    assert 'query_duration_seconds_count 1' in text.splitlines()
+    # A worker that is gone keeps its last snapshot, so totals never drop
+    del first
+    assert 'query_requests_total 3' in Metrics(path).render().splitlines()
+
+
+def test_timer_observes_failed_blocks(path):
+    metrics = Metrics(path, buckets=[10])
+    with pytest.raises(ValueError), metrics.timer('query_stage_seconds', stage='llm'):
+        raise ValueError
+    assert 'query_stage_seconds_count{stage="llm"} 1' in metrics.render().splitlines()
+
+
+def test_metrics_endpoint_reports_the_query_stages(llm, client):
+    llm.sql = "SELECT name FROM hardware"
+    client.post('/query', json={"query": "list the hardware names for the metrics test"})
+    response = client.get('/metrics')
+    assert response.mimetype == 'text/plain'
+    lines = response.get_data(as_text=True).splitlines()
+    assert any(line.startswith('query_requests_total ') for line in lines)
+    for stage in ('schema', 'llm', 'execute'):
+        assert any(line.startswith(f'query_stage_seconds_count{{stage="{stage}"}}') for line in lines)
@@ -0,0 +1,58 @@
+import sqlite3
+import pytest
+from name_search import available_columns, create_name_search, rewrite_substring_search
+
+SCHEMA = {'hardware': ['name', 'model'], 'cameras': ['name', 'hardware']}
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE hardware (name TEXT, model TEXT)")
+    conn.execute("CREATE TABLE cameras (name TEXT, hardware TEXT)")
+    conn.executemany("INSERT INTO hardware VALUES (?, ?)",
+                     [(f"Camp East {i}", 'Pelco IME229') for i in range(19)] + [('Intake 1', 'AXIS P3247')])
+    conn.executemany("INSERT INTO cameras VALUES (?, ?)", [(f"Cam {i}", f"Camp East {i}") for i in range(19)])
+    create_name_search(conn, {'hardware': ['name', 'model'], 'cameras': ['name', 'hardware']})
+    yield conn
+    conn.close()
+
+
+def rewrite(conn, sql):
+    return rewrite_substring_search(sql, available_columns(conn), SCHEMA)
+
+
+def test_plain_select_uses_the_index(conn):
+    sql = "SELECT name FROM hardware WHERE name LIKE '%Camp%'"
+    rewritten = rewrite(conn, sql)
+    assert '_fts_hardware' in rewritten
+    assert conn.execute(rewritten).fetchall() == conn.execute(sql).fetchall()
+
+
+def test_derived_table_is_left_alone(conn):
+    sql = "SELECT name FROM (SELECT * FROM hardware) WHERE name LIKE '%Camp%'"
+    assert rewrite(conn, sql) == sql
+    assert len(conn.execute(rewrite(conn, sql)).fetchall()) == 19
+
+
+def test_cte_is_left_alone(conn):
+    sql = "WITH h AS (SELECT * FROM hardware) SELECT h.name FROM h WHERE h.name LIKE '%Camp%'"
+    assert rewrite(conn, sql) == sql
+    assert len(conn.execute(rewrite(conn, sql)).fetchall()) == 19
+
+
+def test_subquery_in_where_is_left_alone(conn):
+    sql = ("SELECT name FROM cameras WHERE hardware IN "
+           "(SELECT name FROM hardware WHERE name LIKE '%East%')")
+    assert rewrite(conn, sql) == sql
+
+
+def test_view_is_left_alone(conn):
+    conn.execute("CREATE VIEW hardware_view AS SELECT * FROM hardware")
+    sql = "SELECT name FROM hardware_view WHERE name LIKE '%Camp%'"
+    assert rewrite(conn, sql) == sql
+
+
+def test_select_inside_a_string_does_not_count(conn):
+    sql = "SELECT name FROM hardware WHERE name LIKE '%Camp%' AND model != 'select'"
+    assert '_fts_hardware' in rewrite(conn, sql)
@@ -0,0 +1,83 @@
+import sqlite3
+import pytest
+from pagination import NotPageable, fetch_page, order_key
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE cameras (name TEXT, hardware TEXT, channel INTEGER)")
+    conn.execute("CREATE INDEX idx_cameras_hardware ON cameras (hardware)")
+    conn.executemany("INSERT INTO cameras VALUES (?, ?, ?)",
+                     [(f"cam {i}", f"hw {i // 4:03d}" if i % 50 else None, i % 4) for i in range(400)])
+    yield conn
+    conn.close()
+
+
+def all_pages(conn, sql, page_size):
+    columns, rows, state, _ = fetch_page(conn, sql, page_size=page_size)
+    pages = [rows]
+    while state:
+        _, rows, state, _ = fetch_page(conn, state["sql"], state["params"], page_size, state["after"], state["seen"])
+        pages.append(rows)
+    return pages
+
+
+@pytest.mark.parametrize('sql, sort_column', [
+    ("SELECT name, hardware FROM cameras ORDER BY hardware", 1),
+    ("SELECT name, hardware FROM cameras ORDER BY hardware DESC", 1),
+    ("SELECT hardware, channel FROM cameras ORDER BY 1, channel DESC", 0),
+    ("SELECT hardware FROM cameras", None),
+])
+def test_pages_add_up_to_the_query(conn, sql, sort_column):
+    rows = [row for page in all_pages(conn, sql, 7) for row in page]
+    expected = conn.execute(sql).fetchall()
+    assert sorted(map(repr, rows)) == sorted(map(repr, expected))
+    if sort_column is not None:
+        assert [row[sort_column] for row in rows] == [row[sort_column] for row in expected]
+
+
+def test_later_pages_seek_with_the_index(conn):
+    sql = "SELECT name, hardware FROM cameras ORDER BY hardware"
+    _, _, state, _ = fetch_page(conn, sql, page_size=10)
+    plans = []
+    conn.set_trace_callback(plans.append)
+    fetch_page(conn, state["sql"], state["params"], 10, state["after"], state["seen"])
+    conn.set_trace_callback(None)
+    page_query = plans[-1]
+    detail = " ".join(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {page_query}"))
+    assert 'SEARCH cameras USING INDEX idx_cameras_hardware (hardware>?)' in detail
+
+
+def test_order_by_an_expression_is_not_pageable():
+    with pytest.raises(NotPageable):
+        order_key("SELECT name, channel FROM cameras ORDER BY channel, length(name)", ['name', 'channel'])
+    with pytest.raises(NotPageable):
+        order_key("SELECT name FROM cameras ORDER BY hardware", ['name'])
+
+
+def test_qualified_order_follows_its_own_column(conn):
+    conn.execute("CREATE TABLE hardware (name TEXT, address TEXT)")
+    conn.executemany("INSERT INTO hardware VALUES (?, ?)", [(f"hw {i:03d}", f"10.0.0.{i}") for i in range(100)])
+    sql = ("SELECT c.name, h.name FROM cameras c JOIN hardware h ON c.hardware = h.name "
+           "ORDER BY h.name DESC")
+    assert order_key(sql, ['name', 'name'])[0] == (1, True)
+    rows = [row for page in all_pages(conn, sql, 7) for row in page]
+    assert [row[1] for row in rows] == [row[1] for row in conn.execute(sql)]
+
+
+def test_ambiguous_order_is_not_pageable():
+    columns = ['name', 'name']
+    with pytest.raises(NotPageable):
+        order_key("SELECT c.name, h.name FROM cameras c JOIN hardware h ORDER BY name DESC", columns)
+    with pytest.raises(NotPageable):
+        order_key("SELECT c.name, h.address FROM cameras c JOIN hardware h ORDER BY h.name", ['name', 'address'])
+    with pytest.raises(NotPageable):
+        order_key("SELECT c.* FROM cameras c ORDER BY c.name", ['name', 'hardware', 'channel'])
+
+
+def test_unpageable_query_gets_a_single_response(llm, client):
+    llm.sql = "SELECT name FROM cameras ORDER BY length(name), name"
+    body = client.post('/query', json={"query": "cameras by name length", "page_size": 5}).get_json()
+    assert "next_page" not in body
+    assert len(body["results"]) > 5
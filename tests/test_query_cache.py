@@ -0,0 +1,128 @@
+import pytest
+import query_cache
+from query_cache import QueryCache
+
+FINGERPRINT = 'test'
+SITE_SQL = "SELECT name FROM cameras WHERE hardware LIKE 'Camp East%'"
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = QueryCache(str(tmp_path / 'query_cache.db'))
+    cache.put("show me the cameras in Camp East", FINGERPRINT, SITE_SQL)
+    return cache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(query_cache.time, 'time', clock)
+    return clock
+
+
+def exact_cache(tmp_path, **kwargs):
+    # A threshold above 1 turns the fuzzy lookup off
+    return QueryCache(str(tmp_path / 'query_cache.db'), fuzzy_threshold=2, **kwargs)
+
+
+def test_question_spellings_share_an_entry(tmp_path):
+    cache = exact_cache(tmp_path)
+    cache.put("How many cameras are there?", FINGERPRINT, "SELECT COUNT(*) FROM cameras")
+    assert cache.get("  how many  cameras are there", FINGERPRINT) == "SELECT COUNT(*) FROM cameras"
+
+
+def test_entries_expire_after_the_ttl(tmp_path, clock):
+    cache = exact_cache(tmp_path, ttl=60)
+    cache.put("how many cameras", FINGERPRINT, "SELECT COUNT(*) FROM cameras")
+    clock.now += 59
+    assert cache.get("how many cameras", FINGERPRINT) is not None
+    clock.now += 2
+    assert cache.get("how many cameras", FINGERPRINT) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted(tmp_path, clock):
+    cache = exact_cache(tmp_path, max_entries=2)
+    for i, question in enumerate(["first", "second"]):
+        clock.now += 1
+        cache.put(question, FINGERPRINT, f"SELECT {i}")
+    clock.now += 1
+    cache.get("first", FINGERPRINT)
+    clock.now += 1
+    cache.put("third", FINGERPRINT, "SELECT 2")
+    assert cache.get("second", FINGERPRINT) is None
+    assert cache.get("first", FINGERPRINT) == "SELECT 0"
+    assert cache.get("third", FINGERPRINT) == "SELECT 2"
+
+
+def test_new_schema_fingerprint_drops_old_entries(tmp_path):
+    cache = exact_cache(tmp_path)
+    cache.put("how many cameras", "old schema", "SELECT COUNT(*) FROM cameras")
+    assert cache.get("how many cameras", "new schema") is None
+    cache.put("how many hardware", "new schema", "SELECT COUNT(*) FROM hardware")
+    assert cache.get("how many cameras", "old schema") is None
+    assert cache.stats()["entries"] == 1
+
+
+def test_workers_share_the_cache_file(tmp_path):
+    worker = exact_cache(tmp_path)
+    worker.put("how many cameras", FINGERPRINT, "SELECT COUNT(*) FROM cameras")
+    other_worker = exact_cache(tmp_path)
+    assert other_worker.find("how many cameras", FINGERPRINT)["match"] == 'exact'
+    # The hit rates cover every worker too
+    assert worker.stats()["exact_hits"] == 1
+
+
+def test_repeated_question_skips_the_model(llm, client):
+    llm.sql = "SELECT name FROM hardware ORDER BY name"
+    question = "list the hardware names in order for the cache test"
+    first = client.post('/query', json={"query": question}).get_json()
+    second = client.post('/query', json={"query": question + "?"}).get_json()
+    assert llm.calls == 1
+    assert second["results"] == first["results"]
+
+
+def test_same_question_for_another_site_reuses_the_sql(cache):
+    hit = cache.find("show me the cameras in Unit Five", FINGERPRINT)
+    assert hit["match"] == 'fuzzy'
+    assert hit["sql"] == "SELECT name FROM cameras WHERE hardware LIKE 'Unit Five%'"
+
+
+def test_extra_condition_misses_the_cache(cache):
+    assert cache.find("show me the cameras in Camp East with firmware 2.1", FINGERPRINT) is None
+    assert cache.find("show me the cameras in Intake with motion", FINGERPRINT) is None
+
+
+def test_entity_of_another_length_misses_the_cache(cache):
+    assert cache.find("show me the cameras in Camp East Dayroom", FINGERPRINT) is None
+
+
+def test_sql_without_a_literal_is_only_reused_for_the_same_question(tmp_path):
+    cache = QueryCache(str(tmp_path / 'query_cache.db'))
+    question = ("show me the enabled cameras with recording enabled, motion detection enabled, "
+                "privacy masking disabled and edge storage enabled above framerate {}")
+    cache.put(question.format(10), FINGERPRINT,
+              "SELECT name FROM cameras WHERE enabled = 'True' AND recordingenabled = 'True' "
+              "AND motionenabled = 'True' AND privacymaskenabled = 'False' "
+              "AND edgestorageenabled = 'True' AND recordingframerate > 10")
+    assert cache.find(question.format(25), FINGERPRINT) is None
+    assert cache.find(question.format(10).replace('above', 'below'), FINGERPRINT) is None
+
+
+def test_other_words_around_the_entity_must_match(tmp_path):
+    cache = QueryCache(str(tmp_path / 'query_cache.db'))
+    cache.put("show me the cameras in Camp East above framerate 10", FINGERPRINT,
+              "SELECT name FROM cameras WHERE hardware LIKE 'Camp East%' AND recordingframerate > 10")
+    assert cache.find("show me the cameras in Unit Five above framerate 25", FINGERPRINT) is None
+    assert cache.find("show me the cameras in Unit Five below framerate 10", FINGERPRINT) is None
+    hit = cache.find("show me the cameras in Unit Five above framerate 10", FINGERPRINT)
+    assert hit["sql"] == ("SELECT name FROM cameras WHERE hardware LIKE 'Unit Five%' "
+                          "AND recordingframerate > 10")
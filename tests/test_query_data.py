@@ -0,0 +1,59 @@
+import pandas as pd
+import pytest
+from sqlalchemy import event, text
+from models import db, Sheet
+from benchmark_load_excel import generate_workbook, make_app
+from load_excel import bulk_load_excel_to_db
+from query_data import materialize_wide_tables, sheet_rows
+
+
+@pytest.fixture(scope='module')
+def workbook(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('eav') / 'benchmark.xlsx')
+    generate_workbook(path, sheets=2, rows=60)
+    return path
+
+
+@pytest.fixture
+def loaded(workbook, tmp_path):
+    flask_app = make_app(str(tmp_path / 'excel_data.db'))
+    assert bulk_load_excel_to_db(workbook, flask_app=flask_app)
+    yield flask_app
+    with flask_app.app_context():
+        db.engine.dispose()
+
+
+def count_statements(engine):
+    statements = []
+    event.listen(engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    return statements
+
+
+def test_sheet_rows_read_in_one_query(workbook, loaded):
+    with loaded.app_context():
+        sheet = Sheet.query.filter_by(name='Sheet1').one()
+        statements = count_statements(db.engine)
+        rows = sheet_rows(sheet.id, limit=5)
+    assert len(statements) == 1
+    expected = pd.read_excel(workbook, 'Sheet1').head(5)
+    assert [row_index for row_index, _ in rows] == list(range(5))
+    assert list(rows[0][1]) == list(expected.columns)
+    assert rows[0][1]["Name"] == expected["Name"][0]
+
+
+def test_wide_tables_hold_the_sheet_rows_typed(workbook, loaded):
+    assert materialize_wide_tables(loaded) == {'wide_sheet1': 60, 'wide_sheet2': 60}
+    expected = pd.read_excel(workbook, 'Sheet2')
+    with loaded.app_context():
+        types = {row[1]: row[2] for row in db.session.execute(text('PRAGMA table_info("wide_sheet2")'))}
+        rows = db.session.execute(text(
+            'SELECT name, enabled, channel, threshold FROM wide_sheet2 ORDER BY row_index')).fetchall()
+    assert types["enabled"] == 'INTEGER' and types["channel"] == 'INTEGER' and types["threshold"] == 'REAL'
+    assert [tuple(row) for row in rows] == [
+        (name, int(enabled), channel, threshold) for name, enabled, channel, threshold
+        in expected[["Name", "Enabled", "Channel", "Threshold"]].itertuples(index=False)]
+
+
+def test_latest_workbook_wins(workbook, loaded):
+    assert bulk_load_excel_to_db(workbook, flask_app=loaded)
+    assert materialize_wide_tables(loaded)['wide_sheet1'] == 60
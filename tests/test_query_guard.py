@@ -0,0 +1,84 @@
+import sqlite3
+from contextlib import contextmanager
+import pytest
+from pagination import fetch_page
+from query_guard import QueryRejected, check_plan
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.executemany("INSERT INTO items VALUES (?, ?)", [(i, f"item {i}") for i in range(1000)])
+    yield conn
+    conn.close()
+
+
+# Sizes of a generated workbook of about a million cameras
+BIG = {'items': 35 * 1000 * 1000, 'groups': 1000 * 1000}
+
+
+def test_single_table_scans_pass_the_plan_check(conn):
+    assert check_plan(conn, "SELECT COUNT(*) FROM items", row_counts=BIG) == 0
+    assert check_plan(conn, "SELECT * FROM items WHERE name LIKE '%7%'", row_counts=BIG) == 0
+    assert check_plan(conn, "SELECT name FROM items UNION ALL SELECT name FROM items", row_counts=BIG) == 0
+
+
+def test_cross_products_fail_the_plan_check(conn):
+    conn.execute("CREATE TABLE groups (item_id INTEGER, name TEXT)")
+    with pytest.raises(QueryRejected):
+        check_plan(conn, "SELECT * FROM items, groups", row_counts=BIG)
+    with pytest.raises(QueryRejected):
+        check_plan(conn, "SELECT name, (SELECT COUNT(*) FROM groups g WHERE g.name = i.name) FROM items i",
+                   row_counts=BIG)
+    # Joined through the primary key, each group costs one lookup
+    assert check_plan(conn, "SELECT * FROM groups g JOIN items i ON i.id = g.item_id", row_counts=BIG) == 0
+
+
+def interrupt_after(conn, steps):
+    """Interrupt statements on conn once ``steps`` progress callbacks have run"""
+    calls = [0]
+
+    def handler():
+        calls[0] += 1
+        return 1 if calls[0] > steps else 0
+    conn.set_progress_handler(handler, 1)
+
+
+def test_interrupted_page_keeps_the_rows_read(conn):
+    interrupt_after(conn, 2000)
+    columns, rows, state, truncated = fetch_page(conn, "SELECT id, name FROM items ORDER BY id", page_size=500)
+    conn.set_progress_handler(None, 0)
+    assert truncated == 'timeout'
+    assert 0 < len(rows) < 500
+    assert [row[0] for row in rows] == list(range(len(rows)))
+    # The token continues right after the rows that made it out
+    _, more, _, truncated = fetch_page(conn, state["sql"], state["params"], 10, state["after"], state["seen"])
+    assert truncated is None
+    assert [row[0] for row in more] == list(range(len(rows), len(rows) + 10))
+
+
+def test_page_interrupted_before_any_row_raises(conn):
+    interrupt_after(conn, 0)
+    with pytest.raises(sqlite3.OperationalError, match='interrupted'):
+        fetch_page(conn, "SELECT id, name FROM items ORDER BY id", page_size=500)
+
+
+@contextmanager
+def no_time_left(conn):
+    conn.set_progress_handler(lambda: 1, 1)
+    try:
+        yield
+    finally:
+        conn.set_progress_handler(None, 0)
+
+
+def test_timeout_on_a_follow_up_page_is_an_error_not_a_crash(app_module, llm, client, monkeypatch):
+    llm.sql = "SELECT name FROM cameras ORDER BY name"
+    first = client.post('/query', json={"query": "list every camera by name", "page_size": 5}).get_json()
+    assert first["next_page"]
+
+    monkeypatch.setattr(app_module, 'time_budget', no_time_left)
+    response = client.post('/query', json={"page_token": first["next_page"]})
+    assert response.status_code == 200
+    assert "time budget" in response.get_json()["error"]
@@ -0,0 +1,38 @@
+import sqlite3
+import pytest
+from query_log import QueryLog, _time_query
+
+SQL = "SELECT * FROM items WHERE name = 'item 7'"
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)")
+    conn.executemany("INSERT INTO items VALUES (?, ?)", [(i, f"item {i}") for i in range(100)])
+    yield conn
+    conn.close()
+
+
+def test_timing_a_sample_query_is_bounded(conn):
+    slow = ("WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) "
+            "SELECT COUNT(*) FROM n")
+    with pytest.raises(sqlite3.OperationalError, match='interrupted'):
+        _time_query(conn, slow, timeout_ms=50)
+
+
+def test_plans_are_not_reused_across_database_versions(conn, tmp_path):
+    log = QueryLog(str(tmp_path / 'query_log.db'))
+    log.record(conn, SQL, (), 1.0, version='v1')
+    assert log._plans[(SQL, ())]["full_scans"] == ['items']
+
+    conn.execute("CREATE INDEX items_name ON items(name)")
+    log.record(conn, SQL, (), 1.0, version='v1')
+    assert log._plans[(SQL, ())]["full_scans"] == ['items']
+    log.record(conn, SQL, (), 1.0, version='v2')
+    assert log._plans[(SQL, ())]["full_scans"] == []
+
+
+def test_getting_advice_runs_no_queries(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module.query_log, 'advise', lambda conn: pytest.fail("advise() ran on GET"))
+    assert client.get('/query-log/advice').status_code == 200
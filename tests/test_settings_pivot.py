@@ -0,0 +1,26 @@
+import sqlite3
+import pytest
+from settings_pivot import create_pivot_tables
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE camerageneralsettings "
+                 "(recordingserver TEXT, hardware TEXT, camera TEXT, channel REAL, setting TEXT, value TEXT)")
+    conn.executemany("INSERT INTO camerageneralsettings VALUES (?, ?, ?, ?, ?, ?)", [
+        ('NVR-1', 'Dome 1', 'Dome 1', 1.0, 'Brightness', '50'),
+        ('NVR-1', 'Dome 1', 'Dome 1', 1.0, 'EdgeStorageEnabled', 'False'),
+        # A second channel of the same device under the same camera name
+        ('NVR-1', 'Dome 1', 'Dome 1', 2.0, 'Brightness', '52'),
+        ('NVR-1', 'Dome 1', 'Dome 1', 2.0, 'EdgeStorageEnabled', 'True'),
+    ])
+    yield conn
+    conn.close()
+
+
+def test_cameras_sharing_a_name_keep_their_own_settings(conn):
+    assert create_pivot_tables(conn) == {'camerageneralsettings_wide': 2}
+    rows = conn.execute("SELECT channel, brightness, edgestorageenabled FROM camerageneralsettings_wide "
+                        "ORDER BY channel").fetchall()
+    assert rows == [(1.0, 50, 0), (2.0, 52, 1)]
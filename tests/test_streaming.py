@@ -0,0 +1,72 @@
+import json
+import pytest
+
+
+@pytest.fixture
+def releases(app_module, monkeypatch):
+    """Connections handed back to the pool during the test"""
+    released = []
+    release = app_module.release_db_connection
+
+    def record(conn):
+        released.append(conn)
+        release(conn)
+    monkeypatch.setattr(app_module, 'release_db_connection', record)
+    return released
+
+
+def stream(client, question, **kwargs):
+    return client.post('/query', json={"query": question, "stream": True}, **kwargs)
+
+
+def lines(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_stream_ends_with_a_trailer(llm, client, releases):
+    llm.sql = "SELECT name FROM cameras"
+    response = stream(client, "stream every camera name")
+    body = lines(response)
+    response.close()
+    assert body[0]["columns"] == ["name"]
+    assert body[-1] == {"done": True, "row_count": len(body) - 2, "truncated": False}
+    assert len(releases) == 1
+
+
+def test_stream_cut_at_max_rows_says_so(app_module, llm, client, monkeypatch):
+    monkeypatch.setattr(app_module, 'QUERY_MAX_ROWS', 3)
+    llm.sql = "SELECT name FROM cameras"
+    body = lines(stream(client, "stream three camera names"))
+    assert len(body) == 5
+    assert body[-1] == {"done": True, "row_count": 3, "truncated": True, "truncated_reason": "max_rows"}
+
+
+def test_connection_is_released_when_the_stream_is_never_read(app_module, llm, releases):
+    llm.sql = "SELECT name FROM cameras"
+    app = app_module.app
+    # What the server holds when the client leaves before the first chunk
+    with app.test_request_context('/query', method='POST',
+                                  json={"query": "stream camera names nobody reads", "stream": True}):
+        response = app.full_dispatch_request()
+    assert releases == []
+    response.close()
+    assert len(releases) == 1
+
+
+def test_sql_failing_mid_stream_is_not_cached(app_module, llm, client, releases):
+    # Overflows on the sixth row, after the cursor was opened and the header sent
+    llm.sql = ("SELECT CASE WHEN rowid > 5 THEN abs(-9223372036854775807 - (rowid > 5)) ELSE name END AS name "
+               "FROM cameras ORDER BY rowid")
+    question = "stream camera names until it overflows"
+    response = stream(client, question)
+    body = lines(response)
+    response.close()
+    assert "columns" in body[0] and "integer overflow" in body[-1]["error"]
+    assert len(releases) == 1
+    fingerprint = app_module.schema_cache.get()["fingerprint"]
+    assert app_module.query_cache.get(question, fingerprint) is None
+
+    llm.sql = "SELECT name FROM cameras"
+    question = "stream camera names that all fit"
+    lines(stream(client, question))
+    assert app_module.query_cache.get(question, fingerprint) == llm.sql
@@ -0,0 +1,70 @@
+import json
+import os
+import pytest
+from tracing import Trace, TraceExporter
+
+
+def read_lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+
+def test_spans_record_offsets_and_errors():
+    trace = Trace('abc', question='q')
+    with trace.span('schema', cached=True):
+        pass
+    with pytest.raises(ValueError), trace.span('llm') as span:
+        span["model"] = 'test'
+        raise ValueError('no answer')
+    trace.add('fetch', 0.25, rows=3)
+    record = trace.to_dict()
+    assert record["request_id"] == 'abc' and record["question"] == 'q'
+    schema, llm, fetch = record["spans"]
+    assert schema["name"] == 'schema' and schema["cached"] is True
+    assert llm["model"] == 'test' and llm["error"] == 'no answer'
+    assert fetch["duration_ms"] == 250.0 and fetch["rows"] == 3
+    assert 0 <= schema["start_ms"] <= llm["start_ms"]
+
+
+def test_exporter_rotates_at_max_bytes(tmp_path):
+    path = str(tmp_path / 'logs' / 'traces.jsonl')
+    exporter = TraceExporter(path, max_bytes=300, backup_count=2, enabled=True)
+    for i in range(12):
+        exporter.export(Trace(f'request-{i:02d}', padding='x' * 100))
+    newest, older, oldest = read_lines(path), read_lines(f'{path}.1'), read_lines(f'{path}.2')
+    assert not (tmp_path / 'logs' / 'traces.jsonl.3').exists()
+    # Rotation keeps whole lines, newest in the live file
+    ids = [t["request_id"] for t in oldest + older + newest]
+    assert ids == sorted(ids) and ids[-1] == 'request-11'
+    assert all(os.path.getsize(p) <= 300 for p in (path, f'{path}.1', f'{path}.2'))
+
+
+def test_exporter_without_backups_starts_over(tmp_path):
+    path = str(tmp_path / 'traces.jsonl')
+    exporter = TraceExporter(path, max_bytes=300, backup_count=0, enabled=True)
+    for i in range(5):
+        exporter.export(Trace(f'request-{i}', padding='x' * 100))
+    assert [t["request_id"] for t in read_lines(path)] == ['request-4']
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['traces.jsonl', 'traces.jsonl.lock']
+
+
+def test_disabled_exporter_writes_nothing(tmp_path):
+    path = str(tmp_path / 'logs' / 'traces.jsonl')
+    TraceExporter(path, enabled=False).export(Trace())
+    assert not (tmp_path / 'logs').exists()
+
+
+def test_query_trace_keeps_the_request_id(app_module, llm, client, tmp_path, monkeypatch):
+    path = str(tmp_path / 'traces.jsonl')
+    monkeypatch.setattr(app_module, 'tracer', TraceExporter(path, enabled=True))
+    llm.sql = "SELECT name FROM hardware"
+    response = client.post('/query', json={"query": "list the hardware names for the trace test"},
+                           headers={'X-Request-ID': 'trace-test-1'})
+    assert response.headers['X-Request-ID'] == 'trace-test-1'
+    response.get_data()
+    response.close()
+    [record] = read_lines(path)
+    assert record["request_id"] == 'trace-test-1' and record["status"] == 200
+    assert record["sql"] == "SELECT name FROM hardware"
+    names = [span["name"] for span in record["spans"]]
+    assert names[:3] == ['schema', 'prompt', 'llm'] and 'execute' in names
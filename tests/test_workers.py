@@ -0,0 +1,53 @@
+import importlib.util
+import os
+import runpy
+import threading
+from query_cache import QueryCache
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def gunicorn_settings():
+    return runpy.run_path(os.path.join(ROOT, 'gunicorn.conf.py'))
+
+
+def test_workers_are_cooperative_by_default(monkeypatch):
+    monkeypatch.delenv('GUNICORN_WORKER_CLASS', raising=False)
+    settings = gunicorn_settings()
+    expected = 'gevent' if importlib.util.find_spec('gevent') else 'gthread'
+    assert settings['worker_class'] == expected
+    assert settings['worker_connections'] == 1000
+    assert settings['threads'] == 32
+
+
+def test_sync_workers_can_be_restored(monkeypatch):
+    monkeypatch.setenv('GUNICORN_WORKER_CLASS', 'sync')
+    monkeypatch.setenv('GUNICORN_WORKERS', '2')
+    settings = gunicorn_settings()
+    assert settings['worker_class'] == 'sync'
+    assert settings['workers'] == 2
+
+
+def test_openai_calls_are_bounded(app_module):
+    assert app_module.client.timeout == 30
+    assert app_module.client.max_retries == 2
+
+
+def test_concurrent_requests_share_the_cache_connection(tmp_path):
+    cache = QueryCache(str(tmp_path / 'query_cache.db'), fuzzy_threshold=2)
+    errors = []
+
+    def worker(n):
+        try:
+            for i in range(20):
+                cache.put(f"question {n} {i}", 'test', f"SELECT {n}, {i}")
+                assert cache.get(f"question {n} {i}", 'test') == f"SELECT {n}, {i}"
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert cache.stats()["entries"] == 160
@@ -0,0 +1,112 @@
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from logging_config import setup_logging
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = setup_logging('app.log')
+
+# One JSON line per traced request, rotated like a log file
+TRACE_ENABLED = os.getenv('TRACE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+TRACE_PATH = os.getenv('TRACE_PATH', os.path.join('logs', 'traces.jsonl'))
+TRACE_MAX_BYTES = int(os.getenv('TRACE_MAX_BYTES', str(10 * 1024 * 1024)))
+TRACE_BACKUP_COUNT = int(os.getenv('TRACE_BACKUP_COUNT', '5'))
+
+
+class Trace:
+    """Spans and attributes of one request, exported as a single JSON line"""
+
+    def __init__(self, request_id=None, **attrs):
+        self.request_id = request_id or uuid.uuid4().hex
+        self.attrs = attrs
+        self.spans = []
+        self._wall_start = time.time()
+        self._start = time.perf_counter()
+
+    def set(self, **attrs):
+        """Add attributes to the request"""
+        self.attrs.update(attrs)
+
+    def add(self, name, seconds, started=None, **attrs):
+        """Record a span measured elsewhere; started is a perf_counter() value"""
+        offset = (started if started is not None else time.perf_counter() - seconds) - self._start
+        self.spans.append({"name": name, "start_ms": round(offset * 1000, 3),
+                           "duration_ms": round(seconds * 1000, 3), **attrs})
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """Time the block as a span; the yielded dict takes attributes known only inside it"""
+        started = time.perf_counter()
+        try:
+            yield attrs
+        except Exception as e:
+            attrs["error"] = str(e)
+            raise
+        finally:
+            self.add(name, time.perf_counter() - started, started, **attrs)
+
+    def to_dict(self):
+        return {
+            "request_id": self.request_id,
+            "timestamp": self._wall_start,
+            "duration_ms": round((time.perf_counter() - self._start) * 1000, 3),
+            **self.attrs,
+            "spans": self.spans,
+        }
+
+
+class TraceExporter:
+    """Append finished traces to a JSONL file, rotating it at max_bytes.
+
+    Workers share the file: each write takes an exclusive lock on
+    <path>.lock, rotates if the file is full (path -> path.1 -> ... ->
+    path.<backup_count>) and appends one line, so lines never interleave.
+    """
+
+    def __init__(self, path=TRACE_PATH, max_bytes=TRACE_MAX_BYTES, backup_count=TRACE_BACKUP_COUNT,
+                 enabled=TRACE_ENABLED):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if enabled and directory and not os.path.exists(directory):
+            os.makedirs(directory, exist_ok=True)
+
+    def export(self, trace):
+        """Write a finished trace"""
+        if not self.enabled:
+            return
+        line = json.dumps(trace.to_dict(), default=str) + "\n"
+        try:
+            with self._lock, open(f"{self.path}.lock", 'a') as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) > self.max_bytes:
+                        self._rotate()
+                    with open(self.path, 'a', encoding='utf-8') as f:
+                        f.write(line)
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        except OSError as e:
+            logger.warning(f"Trace export failed: {str(e)}")
+
+    def _rotate(self):
+        if self.backup_count < 1:
+            os.remove(self.path)
+            return
+        for i in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")